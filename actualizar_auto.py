@@ -4,20 +4,17 @@ import requests
 import io
 import sys
 
+from pipeline import medir
+from indice_nombres import construir_indice, alias_desde_pares, guardar_indice
+
 # --- CONFIGURACIÓN ---
 ARCHIVO_FINAL = "atp_tennis.csv"
 # Descargamos desde 2015 para tener una base sólida reciente
-YEARS_HISTORIA = range(2015, 2026) 
+YEARS_HISTORIA = range(2015, 2026)
 
 # Fuente de datos: Tennis My Life (GitHub)
 URL_TML = "https://raw.githubusercontent.com/Tennismylife/TML-Database/master/{year}.csv"
 
-print("==========================================================")
-print("   🛡️ ACTUALIZADOR TENIS QUANT (FULL STATS) 🛡️")
-print("==========================================================")
-
-dfs = []
-
 def limpiar_nombre(nombre):
     if pd.isna(nombre): return "Unknown"
     nombre = str(nombre).strip()
@@ -27,98 +24,111 @@ def limpiar_nombre(nombre):
         return f"{parts[-1]} {parts[0][0]}."
     return nombre
 
-# --- 1. DESCARGA ---
-for year in YEARS_HISTORIA:
-    print(f"⬇️ Descargando temporada {year}...", end="\r")
+def descargar_tenis():
+    """Descarga TML, normaliza columnas y guarda el CSV maestro. Devuelve el DataFrame."""
+    print("==========================================================")
+    print("   🛡️ ACTUALIZADOR TENIS QUANT (FULL STATS) 🛡️")
+    print("==========================================================")
+
+    dfs = []
+    pares_nombres = [] # (nombre corto, nombre original de TML) para los alias del buscador
+
+    # --- 1. DESCARGA ---
+    for year in YEARS_HISTORIA:
+        print(f"⬇️ Descargando temporada {year}...", end="\r")
+        try:
+            with medir("http"):
+                r = requests.get(URL_TML.format(year=year))
+            if r.status_code == 200:
+                df = pd.read_csv(io.StringIO(r.text))
+
+                # --- MAPEO CRÍTICO PARA EL MOTOR MONTE CARLO ---
+                # Necesitamos estadísticas detalladas de saque y resto
+                mapa = {
+                    'tourney_date': 'Date',
+                    'surface': 'Surface',
+                    'winner_name': 'Player_1',
+                    'loser_name': 'Player_2',
+                    'winner_rank': 'Rank_1',
+                    'loser_rank': 'Rank_2',
+                    'score': 'Score',
+                    'best_of': 'Best of',
+
+                    # Stats J1 (Ganador)
+                    'w_ace': 'P1_Ace',
+                    'w_df': 'P1_DF',
+                    'w_svpt': 'P1_SvPt',
+                    'w_1stIn': 'P1_1stIn',
+                    'w_1stWon': 'P1_1stWon',
+                    'w_2ndWon': 'P1_2ndWon', # <--- IMPORTANTE PARA % SAQUE REAL
+                    'w_svgms': 'P1_SvGms',   # <--- IMPORTANTE
+                    'w_bpSaved': 'P1_BpSaved',
+                    'w_bpFaced': 'P1_BpFaced',
+
+                    # Stats J2 (Perdedor)
+                    'l_ace': 'P2_Ace',
+                    'l_df': 'P2_DF',
+                    'l_svpt': 'P2_SvPt',
+                    'l_1stIn': 'P2_1stIn',
+                    'l_1stWon': 'P2_1stWon',
+                    'l_2ndWon': 'P2_2ndWon', # <--- IMPORTANTE PARA % SAQUE REAL
+                    'l_svgms': 'P2_SvGms',   # <--- IMPORTANTE
+                    'l_bpSaved': 'P2_BpSaved',
+                    'l_bpFaced': 'P2_BpFaced'
+                }
+
+                # Renombrar columnas que existan en el CSV descargado
+                cols_ok = {k:v for k,v in mapa.items() if k in df.columns}
+                df.rename(columns=cols_ok, inplace=True)
+
+                # Formatear nombres de jugadores
+                for col in ['Player_1', 'Player_2']:
+                    originales = df[col]
+                    df[col] = originales.apply(limpiar_nombre)
+                    pares_nombres.append(pd.DataFrame({'corto': df[col], 'completo': originales}).drop_duplicates())
+
+                # Filtrar solo las columnas útiles mapeadas
+                final_cols = [c for c in list(mapa.values()) if c in df.columns]
+                dfs.append(df[final_cols])
+
+        except Exception as e:
+            print(f"   ❌ Error descargando {year}: {e}")
+
+    # --- 2. FUSIÓN Y GUARDADO ---
+    if not dfs:
+        raise RuntimeError("No se han podido descargar datos.")
+
+    print("\n--- 🔄 Fusionando y Guardando CSV Maestro... ---")
+    df_total = pd.concat(dfs, ignore_index=True)
+
+    # Asegurar formato fecha
+    df_total['Date'] = pd.to_datetime(df_total['Date'], format='%Y%m%d', errors='coerce')
+    df_total.sort_values(by='Date', inplace=True)
+
+    df_total.to_csv(ARCHIVO_FINAL, index=False)
+    print(f"✅ Base de datos actualizada: {len(df_total)} partidos.")
+
+    # --- 3. ÍNDICE DE NOMBRES (buscador de la app y de buscar_jugador.py) ---
+    with medir("indice_nombres"):
+        pares = pd.concat(pares_nombres).drop_duplicates()
+        nombres = pd.concat([df_total['Player_1'], df_total['Player_2']]).unique()
+        guardar_indice(construir_indice(nombres, alias_desde_pares(pares['corto'], pares['completo'])))
+    return df_total
+
+if __name__ == "__main__":
     try:
-        r = requests.get(URL_TML.format(year=year))
-        if r.status_code == 200:
-            df = pd.read_csv(io.StringIO(r.text))
-            
-            # --- MAPEO CRÍTICO PARA EL MOTOR MONTE CARLO ---
-            # Necesitamos estadísticas detalladas de saque y resto
-            mapa = {
-                'tourney_date': 'Date', 
-                'surface': 'Surface',
-                'winner_name': 'Player_1', 
-                'loser_name': 'Player_2',
-                'winner_rank': 'Rank_1', 
-                'loser_rank': 'Rank_2',
-                'score': 'Score', 
-                'best_of': 'Best of',
-                
-                # Stats J1 (Ganador)
-                'w_ace': 'P1_Ace', 
-                'w_df': 'P1_DF', 
-                'w_svpt': 'P1_SvPt', 
-                'w_1stIn': 'P1_1stIn', 
-                'w_1stWon': 'P1_1stWon', 
-                'w_2ndWon': 'P1_2ndWon', # <--- IMPORTANTE PARA % SAQUE REAL
-                'w_svgms': 'P1_SvGms',   # <--- IMPORTANTE
-                'w_bpSaved': 'P1_BpSaved', 
-                'w_bpFaced': 'P1_BpFaced',
-                
-                # Stats J2 (Perdedor)
-                'l_ace': 'P2_Ace', 
-                'l_df': 'P2_DF', 
-                'l_svpt': 'P2_SvPt', 
-                'l_1stIn': 'P2_1stIn', 
-                'l_1stWon': 'P2_1stWon', 
-                'l_2ndWon': 'P2_2ndWon', # <--- IMPORTANTE PARA % SAQUE REAL
-                'l_svgms': 'P2_SvGms',   # <--- IMPORTANTE
-                'l_bpSaved': 'P2_BpSaved', 
-                'l_bpFaced': 'P2_BpFaced'
-            }
-            
-            # Renombrar columnas que existan en el CSV descargado
-            cols_ok = {k:v for k,v in mapa.items() if k in df.columns}
-            df.rename(columns=cols_ok, inplace=True)
-            
-            # Formatear nombres de jugadores
-            df['Player_1'] = df['Player_1'].apply(limpiar_nombre)
-            df['Player_2'] = df['Player_2'].apply(limpiar_nombre)
-            
-            # Filtrar solo las columnas útiles mapeadas
-            final_cols = [c for c in list(mapa.values()) if c in df.columns]
-            dfs.append(df[final_cols])
-            
-    except Exception as e:
-        print(f"   ❌ Error descargando {year}: {e}")
-
-# --- 2. FUSIÓN Y GUARDADO ---
-if not dfs:
-    print("\n❌ Error Crítico: No se han podido descargar datos.")
-    sys.exit()
-
-print("\n--- 🔄 Fusionando y Guardando CSV Maestro... ---")
-df_total = pd.concat(dfs, ignore_index=True)
-
-# Asegurar formato fecha
-df_total['Date'] = pd.to_datetime(df_total['Date'], format='%Y%m%d', errors='coerce')
-df_total.sort_values(by='Date', inplace=True)
-
-df_total.to_csv(ARCHIVO_FINAL, index=False)
-print(f"✅ Base de datos actualizada: {len(df_total)} partidos.")
-
-# --- 3. AUTOMATIZACIÓN DEL RE-ENTRENAMIENTO ---
-print("\n--- 🧠 Ejecutando Procesamiento IA... ---")
-
-# Ejecutar crear_ia.py para calcular Elo, EWMA y Stats Reales
-if os.path.exists("crear_ia.py"):
-    print("> Ejecutando crear_ia.py...")
-    if os.system("python crear_ia.py") != 0:
-        print("❌ Fallo en crear_ia.py")
-        sys.exit()
-else:
-    print("⚠️ No encuentro crear_ia.py")
-
-# Ejecutar entrenar_ia.py para calibrar modelos
-if os.path.exists("entrenar_ia.py"):
-    print("> Ejecutando entrenar_ia.py...")
-    if os.system("python entrenar_ia.py") != 0:
-        print("❌ Fallo en entrenar_ia.py")
+        df_total = descargar_tenis()
+    except RuntimeError as e:
+        print(f"\n❌ Error Crítico: {e}")
         sys.exit()
-else:
-    print("⚠️ No encuentro entrenar_ia.py")
 
-print("\n🎉 ¡SISTEMA DE TENIS ACTUALIZADO Y LISTO!")
\ No newline at end of file
+    # --- 4. RE-ENTRENAMIENTO (EN PROCESO, SIN RELEER CSVs) ---
+    # Nota: actualizar_todo.py usa pipeline.py y solo llama a descargar_tenis(),
+    # así que el tenis ya no se entrena dos veces por noche.
+    print("\n--- 🧠 Ejecutando Procesamiento IA... ---")
+    from crear_ia import procesar_tenis
+    from entrenar_ia import entrenar_tenis
+
+    entrenar_tenis(procesar_tenis(df_total))
+
+    print("\n🎉 ¡SISTEMA DE TENIS ACTUALIZADO Y LISTO!")
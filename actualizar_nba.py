@@ -1,9 +1,11 @@
 import os
 import json
 import pandas as pd
-import glob
 import sys
 
+from pipeline import medir
+from ingesta_kaggle import obtener_archivo, fuente_por_defecto, leer_miembro
+
 # --- DICCIONARIO OFICIAL ID -> NOMBRE ---
 # Esto garantiza que salgan nombres reales aunque el CSV solo traiga números
 NBA_TEAMS = {
@@ -19,82 +21,27 @@ NBA_TEAMS = {
     1610612764: "Washington Wizards", 1610612765: "Detroit Pistons", 1610612766: "Charlotte Hornets"
 }
 
-# --- 1. AUTENTICACIÓN PREVIA ---
-if "KAGGLE_JSON" in os.environ:
-    try:
-        creds = json.loads(os.environ["KAGGLE_JSON"])
-        os.environ['KAGGLE_USERNAME'] = creds['username']
-        os.environ['KAGGLE_KEY'] = creds['key']
-        print("✅ Credenciales de Kaggle inyectadas.")
-    except Exception as e:
-        print(f"⚠️ Error leyendo KAGGLE_JSON: {e}")
-
-# --- 2. IMPORTAR KAGGLE ---
-try:
-    from kaggle.api.kaggle_api_extended import KaggleApi
-except ImportError:
-    print("❌ Error: Instala kaggle con 'pip install kaggle'")
-    sys.exit()
-except OSError:
-    # Si falla en local sin variables, intenta seguir si ya hay archivo
-    pass
-
 # --- CONFIGURACIÓN ---
 DATASET_KAGGLE = "nathanlauga/nba-games"
+MIEMBRO_PARTIDOS = "games.csv"  # Dentro del zip: el resto del bundle (jugadores, detalles...) no se toca
 ARCHIVO_SALIDA = "nba_games.csv"
 
-print("==========================================================")
-print("   🏀 ACTUALIZADOR NBA (CON NOMBRES REALES) 🏀")
-print("==========================================================")
-
-try:
-    print(f"⬇️  Descargando {DATASET_KAGGLE}...")
-    api = KaggleApi()
-    api.authenticate()
-    api.dataset_download_files(DATASET_KAGGLE, path=".", unzip=True)
-    print("✅ Descarga completada.")
-
-    # --- SELECCIÓN DE ARCHIVO ---
-    csv_files = glob.glob("*.csv")
-    target_file = None
-    candidates = [f for f in csv_files if 'games' in f.lower() and 'player' not in f.lower()]
-    if candidates: target_file = sorted(candidates, key=len)[0]
-    
-    if not target_file:
-        # Fallback
-        non_players = [f for f in csv_files if 'player' not in f.lower()]
-        if non_players: target_file = max(non_players, key=os.path.getsize)
-        elif csv_files: target_file = max(csv_files, key=os.path.getsize)
-
-    if not target_file: raise FileNotFoundError("No CSV found.")
-    print(f"📂 Procesando: {target_file}")
-    
-    df = pd.read_csv(target_file, low_memory=False)
-    df.columns = [c.upper() for c in df.columns]
-    
-    # --- RENOMBRADO ---
-    mapa_cols = {
-        'GAME_DATE': ['GAME_DATE_EST', 'DATE', 'GAMEDATE'],
-        'MATCHUP': ['MATCHUP', 'MATCH_UP'],
-        'WL': ['HOME_TEAM_WINS', 'W_L', 'WL'],
-        'PTS': ['PTS_home', 'PTS', 'POINTS'],
-        'TEAM_ID': ['HOME_TEAM_ID', 'TEAM_ID'],
-        'GAME_ID': ['GAME_ID']
-    }
-    
-    rename_dict = {}
-    for std_col, candidates in mapa_cols.items():
-        for cand in candidates:
-            if cand in df.columns:
-                rename_dict[cand] = std_col
-                break
-    df.rename(columns=rename_dict, inplace=True)
-
-    # --- TRANSFORMACIÓN ANCHO -> LARGO ---
-    if 'HOME_TEAM_ID' in [c.upper() for c in pd.read_csv(target_file, nrows=0).columns]:
+# --- 1. AUTENTICACIÓN PREVIA ---
+def inyectar_credenciales():
+    if "KAGGLE_JSON" in os.environ:
+        try:
+            creds = json.loads(os.environ["KAGGLE_JSON"])
+            os.environ['KAGGLE_USERNAME'] = creds['username']
+            os.environ['KAGGLE_KEY'] = creds['key']
+            print("✅ Credenciales de Kaggle inyectadas.")
+        except Exception as e:
+            print(f"⚠️ Error leyendo KAGGLE_JSON: {e}")
+
+def normalizar(df_raw):
+    """CSV de Kaggle (ancho: una fila por partido, o largo: una por equipo) -> formato largo con nombres."""
+    if 'HOME_TEAM_ID' in [c.upper() for c in df_raw.columns]:
         print("🔄 Normalizando estructura...")
-        df_raw = pd.read_csv(target_file, low_memory=False)
-        
+    
         # Local
         df_h = df_raw.copy()
         df_h['TEAM_ID'] = df_h['HOME_TEAM_ID']
@@ -106,7 +53,7 @@ try:
         df_h['FTA'] = df_h.get('FTA_home', 22)
         df_h['TOV'] = df_h.get('TOV_home', 14)
         df_h['OREB'] = df_h.get('OREB_home', 10)
-        
+    
         # Visitante
         df_a = df_raw.copy()
         df_a['TEAM_ID'] = df_a['VISITOR_TEAM_ID']
@@ -121,6 +68,26 @@ try:
         df = pd.concat([df_h, df_a], ignore_index=True)
         df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE_EST'], format='mixed', errors='coerce')
     else:
+        df = df_raw.copy()
+        df.columns = [c.upper() for c in df.columns]
+
+        # --- RENOMBRADO ---
+        mapa_cols = {
+            'GAME_DATE': ['GAME_DATE_EST', 'DATE', 'GAMEDATE'],
+            'MATCHUP': ['MATCHUP', 'MATCH_UP'],
+            'WL': ['HOME_TEAM_WINS', 'W_L', 'WL'],
+            'PTS': ['PTS_home', 'PTS', 'POINTS'],
+            'TEAM_ID': ['HOME_TEAM_ID', 'TEAM_ID'],
+            'GAME_ID': ['GAME_ID']
+        }
+        rename_dict = {}
+        for std_col, candidates in mapa_cols.items():
+            for cand in candidates:
+                if cand in df.columns:
+                    rename_dict[cand] = std_col
+                    break
+        df.rename(columns=rename_dict, inplace=True)
+
         df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'], format='mixed', errors='coerce')
         for c in ['FGA', 'FTA', 'TOV', 'OREB']: 
             if c not in df.columns: df[c] = 0
@@ -128,7 +95,7 @@ try:
     # --- TRADUCCIÓN DE ID A NOMBRE (LA CLAVE DE LA SOLUCIÓN) ---
     print("📝 Traduciendo IDs a Nombres de Equipos...")
     df['TEAM_NAME'] = df['TEAM_ID'].map(NBA_TEAMS)
-    
+
     # Rellenar desconocidos (por si acaso hay All-Star teams u otros IDs raros)
     df['TEAM_NAME'] = df['TEAM_NAME'].fillna("Unknown Team (" + df['TEAM_ID'].astype(str) + ")")
 
@@ -136,16 +103,43 @@ try:
     cols = ['GAME_ID', 'TEAM_ID', 'TEAM_NAME', 'GAME_DATE', 'MATCHUP', 'WL', 'PTS', 'FGA', 'FTA', 'TOV', 'OREB', 'IS_HOME']
     for c in cols:
         if c not in df.columns: df[c] = 0
-    
+
     df = df[cols]
     df = df.dropna(subset=['GAME_DATE'])
     df = df[df['GAME_DATE'].dt.year >= 2015]
-    df.sort_values('GAME_DATE', inplace=True)
+    return df.sort_values('GAME_DATE')
+
+def descargar_nba():
+    """Trae el dataset de Kaggle (solo si cambió de versión), lo normaliza a formato largo y guarda el CSV.
+    Devuelve el DataFrame."""
+    inyectar_credenciales()
 
-    df.to_csv(ARCHIVO_SALIDA, index=False)
-    print(f"✅ Base de datos NBA guardada: {len(df)} registros.")
+    print("==========================================================")
+    print("   🏀 ACTUALIZADOR NBA (CON NOMBRES REALES) 🏀")
+    print("==========================================================")
 
-except Exception as e:
-    print(f"❌ Error: {e}")
-    cols = ['GAME_ID', 'TEAM_ID', 'TEAM_NAME', 'GAME_DATE', 'MATCHUP', 'WL', 'PTS', 'FGA', 'FTA', 'TOV', 'OREB']
-    pd.DataFrame(columns=cols).to_csv(ARCHIVO_SALIDA, index=False)
\ No newline at end of file
+    try:
+        # Zip en caché (cache/kaggle) y lectura del CSV de partidos directamente desde él: ver ingesta_kaggle.py
+        ruta_zip, _, _ = obtener_archivo(fuente_por_defecto(DATASET_KAGGLE))
+        df_raw = leer_miembro(ruta_zip, MIEMBRO_PARTIDOS, low_memory=False)
+        with medir("normalizado"):
+            df = normalizar(df_raw)
+
+        df.to_csv(ARCHIVO_SALIDA, index=False)
+        print(f"✅ Base de datos NBA guardada: {len(df)} registros.")
+        return df
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        cols = ['GAME_ID', 'TEAM_ID', 'TEAM_NAME', 'GAME_DATE', 'MATCHUP', 'WL', 'PTS', 'FGA', 'FTA', 'TOV', 'OREB']
+        pd.DataFrame(columns=cols).to_csv(ARCHIVO_SALIDA, index=False)
+        raise
+
+if __name__ == "__main__":
+    try:
+        descargar_nba()
+    except ImportError:
+        print("❌ Error: Instala kaggle con 'pip install kaggle'")
+        sys.exit()
+    except Exception:
+        pass
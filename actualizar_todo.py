@@ -1,19 +1,7 @@
 import os
-import time
 import sys
 
-def ejecutar_paso(comando, descripcion):
-    print(f"\n🚀 INICIANDO: {descripcion}...")
-    print("-" * 50)
-    start = time.time()
-    ret = os.system(comando)
-    end = time.time()
-    
-    if ret == 0:
-        print(f"✅ {descripcion} COMPLETADO ({end-start:.2f}s)")
-    else:
-        print(f"❌ ERROR CRÍTICO en {descripcion}.")
-        sys.exit(1) # Salir con código de error para que GitHub avise
+from pipeline import Etapa, ejecutar_pipeline
 
 print("""
 ===================================================
@@ -22,25 +10,97 @@ print("""
 Este script actualizará las bases de datos de:
    1. 🎾 Tenis ATP (Historia + Stats Avanzadas)
    2. 🏀 NBA (Regular Season + Playoffs)
-   
+
 Y re-entrenará las IAs correspondientes.
+Las ramas Tenis y NBA corren en paralelo y se saltan
+las etapas cuyas entradas no han cambiado (--forzar para repetirlas).
 """)
 
-# --- FASE 1: TENIS ---
-if os.path.exists("actualizar_auto.py"):
-    ejecutar_paso("python actualizar_auto.py", "Descarga Datos Tenis")
-    ejecutar_paso("python crear_ia.py", "Procesado Elo Tenis")
-    ejecutar_paso("python entrenar_ia.py", "Entrenamiento IA Tenis")
-else:
-    print("⚠️ Saltando Tenis (Falta actualizar_auto.py)")
-
-# --- FASE 2: NBA ---
-if os.path.exists("actualizar_nba.py"):
-    ejecutar_paso("python actualizar_nba.py", "Descarga Datos NBA")
-    ejecutar_paso("python crear_ia_nba.py", "Ingeniería de Datos NBA")
-    ejecutar_paso("python entrenar_ia_nba.py", "Entrenamiento IA NBA")
-else:
-    print("⚠️ Saltando NBA (Falta actualizar_nba.py)")
+def construir_etapas():
+    etapas = []
+
+    # --- RAMA 1: TENIS ---
+    if os.path.exists("actualizar_auto.py"):
+        from actualizar_auto import descargar_tenis
+        from crear_ia import procesar_tenis
+        from entrenar_ia import entrenar_tenis
+        from matriz_enfrentamientos import generar_matriz, ruta_curvas, ARCHIVO_INDICE, ARCHIVO_MATRIZ
+        from inferencia import FORMATOS
+        from indice_h2h import construir_h2h, ARCHIVO_H2H
+        from almacen_features import construir_almacen_tenis, ALMACENES
+        from compilador_modelos import compilar_tenis, COMPILADOS
+        from ratings_saque import ajustar_ratings, ARCHIVO_RATINGS
+        etapas += [
+            Etapa("descarga_tenis", descargar_tenis, "Descarga Datos Tenis",
+                  salidas=["atp_tennis.csv", "indice_nombres.joblib"], siempre=True),
+            Etapa("procesado_tenis", procesar_tenis, "Procesado Elo Tenis",
+                  depende=["descarga_tenis"], entradas=["atp_tennis.csv"],
+                  salidas=["atp_matches_procesados.csv"]),
+            Etapa("entrenamiento_tenis", entrenar_tenis, "Entrenamiento IA Tenis",
+                  depende=["procesado_tenis"], entradas=["atp_matches_procesados.csv"],
+                  salidas=["modelo_calibrado.joblib", "features.joblib", "db_players.joblib",
+                           "modelo_base_tenis.joblib", "cache_predicciones_tenis.joblib", "estado_entrenamiento_tenis.json"]),
+            Etapa("compilado_tenis", compilar_tenis, "Compilación Modelo Tenis (NumPy)",
+                  depende=["entrenamiento_tenis"], entradas=["modelo_calibrado.joblib"],
+                  salidas=[COMPILADOS['modelo_calibrado.joblib']]),
+            Etapa("ratings_tenis", ajustar_ratings, "Ratings Saque/Resto Ajustados por Rival",
+                  depende=["descarga_tenis"], entradas=["atp_tennis.csv"],
+                  salidas=[ARCHIVO_RATINGS]),
+            Etapa("h2h_tenis", construir_h2h, "Índice Head-to-Head Tenis",
+                  depende=["procesado_tenis"], entradas=["atp_matches_procesados.csv"],
+                  salidas=[ARCHIVO_H2H]),
+            Etapa("almacen_tenis", construir_almacen_tenis, "Almacén Features As-Of Tenis",
+                  depende=["procesado_tenis"], entradas=["atp_matches_procesados.csv"],
+                  salidas=[ALMACENES['tenis']['archivo']]),
+            Etapa("matriz_tenis", generar_matriz, "Matriz de Enfrentamientos Tenis",
+                  depende=["entrenamiento_tenis"],
+                  entradas=["db_players.joblib", "modelo_calibrado.joblib", "features.joblib"],
+                  salidas=[ARCHIVO_INDICE, ARCHIVO_MATRIZ] + [ruta_curvas(bo) for bo in FORMATOS]),
+        ]
+    else:
+        print("⚠️ Saltando Tenis (Falta actualizar_auto.py)")
+
+    # --- RAMA 2: NBA ---
+    if os.path.exists("actualizar_nba.py"):
+        from actualizar_nba import descargar_nba
+        from crear_ia_nba import procesar_nba
+        from entrenar_ia_nba import entrenar_nba
+        from almacen_features import construir_almacen_nba, ALMACENES
+        from compilador_modelos import compilar_nba, COMPILADOS
+        etapas += [
+            Etapa("descarga_nba", descargar_nba, "Descarga Datos NBA",
+                  salidas=["nba_games.csv"], siempre=True),
+            Etapa("procesado_nba", procesar_nba, "Ingeniería de Datos NBA",
+                  depende=["descarga_nba"], entradas=["nba_games.csv"],
+                  salidas=["nba_processed.csv"]),
+            Etapa("entrenamiento_nba", entrenar_nba, "Entrenamiento IA NBA",
+                  depende=["procesado_nba"], entradas=["nba_processed.csv"],
+                  salidas=["nba_model_win.joblib", "nba_model_pts.joblib", "nba_features.joblib", "nba_db_teams.joblib",
+                           "estado_entrenamiento_nba.json"]),
+            Etapa("compilado_nba", compilar_nba, "Compilación Modelos NBA (NumPy)",
+                  depende=["entrenamiento_nba"], entradas=["nba_model_win.joblib", "nba_model_pts.joblib"],
+                  salidas=[COMPILADOS['nba_model_win.joblib'], COMPILADOS['nba_model_pts.joblib']]),
+            Etapa("almacen_nba", construir_almacen_nba, "Almacén Features As-Of NBA",
+                  depende=["procesado_nba"], entradas=["nba_processed.csv"],
+                  salidas=[ALMACENES['nba']['archivo']]),
+        ]
+    else:
+        print("⚠️ Saltando NBA (Falta actualizar_nba.py)")
+
+    return etapas
+
+etapas = construir_etapas()
+situacion = ejecutar_pipeline(etapas, forzar="--forzar" in sys.argv)
+
+if any(s in ('error', 'cancelada') for s in situacion.values()):
+    print(f"\n❌ ERROR CRÍTICO: etapas fallidas -> {[n for n, s in situacion.items() if s in ('error', 'cancelada')]}")
+    sys.exit(1) # Salir con código de error para que GitHub avise
+
+# --- PUBLICAR LA VERSIÓN DE ESTA NOCHE ---
+# Solo si todo fue bien: la app resuelve "latest" y nunca ve una mezcla de noches
+if "--sin-publicar" not in sys.argv:
+    from almacen_artefactos import publicar
+    publicar([s for e in etapas for s in e.salidas])
 
 print("\n" + "="*50)
 print("       🎉 TODO ACTUALIZADO: APP LISTA 🎉")
@@ -52,4 +112,4 @@ if "GITHUB_ACTIONS" not in os.environ:
     try:
         input("\nPresiona Enter para salir...")
     except EOFError:
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import urllib.request
+from functools import lru_cache
+
+from pipeline import hash_archivo
+from artefactos import escribir_atomico
+
+# ==============================================================================
+#         ALMACÉN DE ARTEFACTOS DIRECCIONADO POR CONTENIDO (VERSIONES POR NOCHE)
+# ==============================================================================
+# En vez de subir al repo cada noche todos los .joblib / CSV regenerados (git los guarda enteros
+# aunque no hayan cambiado), el job publica:
+#
+#   almacen_artefactos/                    <- EN GIT: solo texto, pocos KB por noche
+#     manifiestos/20250101T070000.json     <- {nombre lógico: hash} de cada noche + URL de los objetos
+#     LATEST                               <- id de la última noche publicada
+#     PIN                                  <- (opcional) versión fijada: la app usa esa y no LATEST
+#
+#   objetos (FUERA DE GIT): un fichero por CONTENIDO, ab12...ef.joblib (sha256 + extensión)
+#     - remoto: URL_OBJETOS_ARTEFACTOS, en el job los assets de la release 'artefactos' de GitHub
+#       (el workflow sube solo los nuevos de la noche: `pendientes`)
+#     - local:  ALMACEN_OBJETOS (cache/objetos_artefactos), caché de lo ya descargado
+#
+# La app resuelve cada nombre lógico ('db_players.joblib') con ruta_artefacto(): leer LATEST/PIN y
+# un manifiesto pequeño; si el objeto no está en la caché local se descarga del remoto que anota el
+# manifiesto (y se comprueba su sha256). Las rutas de los objetos cambian con el contenido, así que
+# también sirven de clave de caché. Volver atrás = fijar(version); VERSION_ARTEFACTOS en el entorno
+# tiene prioridad. Sin almacén (desarrollo local) se usan los ficheros de la carpeta de trabajo.
+# Repos privados: TOKEN_ARTEFACTOS se envía como cabecera Authorization en las descargas.
+
+CARPETA = os.environ.get("ALMACEN_ARTEFACTOS", "almacen_artefactos")
+CARPETA_OBJETOS = os.environ.get("ALMACEN_OBJETOS", os.path.join("cache", "objetos_artefactos"))
+URL_OBJETOS = os.environ.get("URL_OBJETOS_ARTEFACTOS")
+CONSERVAR = 30  # Noches que se guardan al limpiar (más la fijada)
+TIMEOUT_DESCARGA = 60
+
+def _rutas(almacen):
+    return (os.path.join(almacen, "manifiestos"), os.path.join(almacen, "LATEST"), os.path.join(almacen, "PIN"))
+
+def _escribir_texto(ruta, texto):
+    def escribir(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f: f.write(texto)
+    escribir_atomico(ruta, escribir)
+
+def _leer_texto(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f: return f.read().strip() or None
+    except OSError:
+        return None
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- OBJETOS ---
+def nombre_objeto(entrada):
+    # Manifiestos antiguos guardaban 'objetos/ab/<hash>.ext' dentro del almacén: vale el nombre base
+    return os.path.basename(entrada['objeto'])
+
+def ruta_local(entrada, objetos=CARPETA_OBJETOS):
+    nombre = nombre_objeto(entrada)
+    return os.path.join(objetos, nombre[:2], nombre)
+
+def descargar_objeto(entrada, remoto, destino):
+    """Baja el objeto del remoto a `destino` y comprueba que el contenido es el del manifiesto."""
+    peticion = urllib.request.Request(f"{remoto.rstrip('/')}/{nombre_objeto(entrada)}")
+    if os.environ.get("TOKEN_ARTEFACTOS"): peticion.add_header("Authorization", f"Bearer {os.environ['TOKEN_ARTEFACTOS']}")
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    def escribir(tmp):
+        with urllib.request.urlopen(peticion, timeout=TIMEOUT_DESCARGA) as r, open(tmp, 'wb') as f: shutil.copyfileobj(r, f)
+        if hash_archivo(tmp) != entrada['sha256']: raise ValueError(f"sha256 distinto al del manifiesto: {nombre_objeto(entrada)}")
+    escribir_atomico(destino, escribir)
+    return destino
+
+def obtener_objeto(entrada, remoto=None, objetos=CARPETA_OBJETOS):
+    """Ruta local del objeto, descargándolo antes si hace falta. None si no está ni se puede bajar."""
+    ruta = ruta_local(entrada, objetos)
+    if os.path.exists(ruta): return ruta
+    remoto = remoto or URL_OBJETOS
+    if not remoto: return None
+    try:
+        return descargar_objeto(entrada, remoto, ruta)
+    except (OSError, ValueError) as e: # urllib.error.URLError es un OSError
+        print(f"⚠️ No se pudo descargar {nombre_objeto(entrada)} de {remoto}: {e}")
+        return None
+
+# --- PUBLICAR ---
+def publicar(rutas, almacen=CARPETA, version=None, objetos=CARPETA_OBJETOS, remoto=URL_OBJETOS):
+    """Copia a la caché de objetos los ficheros cuyo contenido aún no está y escribe el manifiesto de
+    la noche, con la lista de objetos que ningún manifiesto anterior usaba ('nuevos': los que hay que
+    subir al remoto). LATEST se actualiza al final: la app nunca ve un manifiesto a medias."""
+    manifiestos, latest, _ = _rutas(almacen)
+    os.makedirs(manifiestos, exist_ok=True)
+    version = version or time.strftime("%Y%m%dT%H%M%S")
+    conocidos = objetos_usados(almacen)
+    artefactos, nuevos, bytes_nuevos = {}, [], 0
+    for ruta in sorted(set(rutas)):
+        if not os.path.exists(ruta): continue
+        h = hash_archivo(ruta)
+        _, ext = os.path.splitext(ruta)
+        entrada = {'sha256': h, 'objeto': h + ext, 'bytes': os.path.getsize(ruta)}
+        destino = ruta_local(entrada, objetos)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            escribir_atomico(destino, lambda tmp: shutil.copy2(ruta, tmp)) # copy2: conserva el mtime
+        if entrada['objeto'] not in conocidos and entrada['objeto'] not in nuevos:
+            nuevos.append(entrada['objeto'])
+            bytes_nuevos += entrada['bytes']
+        artefactos[ruta.replace(os.sep, "/")] = entrada
+
+    manifiesto = {'version': version, 'fecha': time.strftime("%Y-%m-%d %H:%M:%S"), 'commit': _commit(),
+                  'remoto': remoto, 'nuevos': nuevos, 'artefactos': artefactos}
+    _escribir_texto(os.path.join(manifiestos, f"{version}.json"), json.dumps(manifiesto, indent=2, ensure_ascii=False))
+    _escribir_texto(latest, version)
+    print(f"📦 Publicada versión {version}: {len(artefactos)} artefactos, {len(nuevos)} nuevos ({bytes_nuevos / 1e6:.1f} MB), "
+          f"{len(artefactos) - len(nuevos)} sin cambios.")
+    return manifiesto
+
+def pendientes(version=None, almacen=CARPETA, objetos=CARPETA_OBJETOS):
+    """Rutas locales de los objetos nuevos de una versión (lo que el job sube al remoto)."""
+    m = manifiesto(version, almacen)
+    if m is None: return []
+    por_nombre = {e['objeto']: e for e in m['artefactos'].values()}
+    return [ruta_local(por_nombre[n], objetos) for n in m.get('nuevos', [])]
+
+# --- RESOLVER ---
+def version_activa(almacen=CARPETA):
+    """VERSION_ARTEFACTOS del entorno > PIN > LATEST (None si no hay almacén)."""
+    _, latest, pin = _rutas(almacen)
+    return os.environ.get("VERSION_ARTEFACTOS") or _leer_texto(pin) or _leer_texto(latest)
+
+@lru_cache(maxsize=8)
+def _manifiesto_cacheado(ruta, mtime_ns):
+    with open(ruta, encoding='utf-8') as f: return json.load(f)
+
+def manifiesto(version=None, almacen=CARPETA):
+    version = version or version_activa(almacen)
+    if version is None: return None
+    ruta = os.path.join(_rutas(almacen)[0], f"{version}.json")
+    try:
+        return _manifiesto_cacheado(ruta, os.stat(ruta).st_mtime_ns)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No existe la versión de artefactos '{version}' en {almacen}") from None
+
+def ruta_artefacto(nombre, version=None, almacen=CARPETA, objetos=CARPETA_OBJETOS):
+    """Ruta del objeto de `nombre` en la versión activa (o la pedida), bajándolo del remoto si no está
+    en la caché local. Sin almacén, si la versión no lo incluye o si el objeto no se puede obtener,
+    el fichero de trabajo de siempre."""
+    m = manifiesto(version, almacen)
+    entrada = m['artefactos'].get(nombre.replace(os.sep, "/")) if m else None
+    if entrada is None: return nombre
+    # Almacenes de antes de separar los objetos: siguen dentro de la carpeta del almacén
+    antigua = os.path.join(almacen, entrada['objeto'])
+    if os.path.dirname(entrada['objeto']) and os.path.exists(antigua): return antigua
+    return obtener_objeto(entrada, m.get('remoto'), objetos) or nombre
+
+def versiones(almacen=CARPETA):
+    carpeta = _rutas(almacen)[0]
+    if not os.path.isdir(carpeta): return []
+    return sorted(f[:-len(".json")] for f in os.listdir(carpeta) if f.endswith(".json"))
+
+def objetos_usados(almacen=CARPETA):
+    """Nombres de objeto que usa algún manifiesto del almacén."""
+    return {nombre_objeto(e) for v in versiones(almacen) for e in manifiesto(v, almacen)['artefactos'].values()}
+
+# --- FIJAR / RESTAURAR / LIMPIAR ---
+def fijar(version, almacen=CARPETA):
+    manifiesto(version, almacen) # Falla si no existe
+    _escribir_texto(_rutas(almacen)[2], version)
+    print(f"📌 Artefactos fijados en la versión {version}")
+
+def soltar(almacen=CARPETA):
+    pin = _rutas(almacen)[2]
+    if os.path.exists(pin): os.remove(pin)
+    print("📌 Sin versión fijada: se usa LATEST")
+
+def restaurar(version=None, almacen=CARPETA, objetos=CARPETA_OBJETOS):
+    """Copia los artefactos de una versión a la carpeta de trabajo, bajando del remoto los objetos que
+    no estén en la caché local (el job lo hace antes del pipeline: el entrenamiento incremental y el
+    salto de etapas necesitan los de ayer)."""
+    m = manifiesto(version, almacen)
+    if m is None:
+        print("ℹ️ Almacén vacío: nada que restaurar.")
+        return 0
+    copiados, faltan = 0, []
+    for nombre, entrada in m['artefactos'].items():
+        if os.path.exists(nombre) and hash_archivo(nombre) == entrada['sha256']: continue
+        origen = ruta_artefacto(nombre, m['version'], almacen, objetos)
+        if origen == nombre:
+            faltan.append(nombre); continue
+        if os.path.dirname(nombre): os.makedirs(os.path.dirname(nombre), exist_ok=True)
+        escribir_atomico(nombre, lambda tmp, o=origen: shutil.copy2(o, tmp))
+        copiados += 1
+    print(f"♻️ Restaurada versión {m['version']}: {copiados} de {len(m['artefactos'])} artefactos copiados.")
+    if faltan: print(f"⚠️ Sin objeto (ni en caché ni en el remoto): {', '.join(faltan)}")
+    return copiados
+
+def limpiar(conservar=CONSERVAR, almacen=CARPETA, objetos=CARPETA_OBJETOS):
+    """Borra los manifiestos más viejos (nunca LATEST ni el fijado) y de la caché local los objetos que
+    ya nadie usa. Devuelve los nombres de objeto que dejaron de usarse (para borrarlos del remoto)."""
+    manifiestos, latest, pin = _rutas(almacen)
+    todas = versiones(almacen)
+    antes = objetos_usados(almacen)
+    protegidas = set(todas[-conservar:]) | {_leer_texto(latest), _leer_texto(pin)}
+    for v in todas:
+        if v not in protegidas: os.remove(os.path.join(manifiestos, f"{v}.json"))
+    usados = objetos_usados(almacen)
+    borrados = 0
+    for raiz, _, ficheros in os.walk(objetos):
+        for f in ficheros:
+            if f not in usados:
+                os.remove(os.path.join(raiz, f))
+                borrados += 1
+    huerfanos = sorted(antes - usados)
+    print(f"🧹 {len(todas) - len(versiones(almacen))} versiones y {borrados} objetos locales borrados; "
+          f"{len(huerfanos)} objetos sin uso en el remoto.")
+    return huerfanos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Almacén de artefactos versionado")
+    sub = parser.add_subparsers(dest="orden", required=True)
+    p = sub.add_parser("publicar"); p.add_argument("rutas", nargs="+")
+    sub.add_parser("listar")
+    p = sub.add_parser("fijar"); p.add_argument("version")
+    sub.add_parser("soltar")
+    p = sub.add_parser("restaurar"); p.add_argument("version", nargs="?")
+    p = sub.add_parser("limpiar"); p.add_argument("--conservar", type=int, default=CONSERVAR)
+    p.add_argument("--huerfanos", help="Fichero donde escribir los objetos sin uso (uno por línea)")
+    p = sub.add_parser("pendientes"); p.add_argument("version", nargs="?")
+    args = parser.parse_args()
+
+    if args.orden == "publicar": publicar(args.rutas)
+    elif args.orden == "listar":
+        activa = version_activa()
+        for v in versiones():
+            m = manifiesto(v)
+            print(f"{'*' if v == activa else ' '} {v}  {m['fecha']}  commit {m['commit']}  "
+                  f"{len(m['artefactos'])} artefactos  {sum(e['bytes'] for e in m['artefactos'].values()) / 1e6:.1f} MB  "
+                  f"{len(m.get('nuevos', []))} nuevos")
+    elif args.orden == "fijar": fijar(args.version)
+    elif args.orden == "soltar": soltar()
+    elif args.orden == "restaurar": restaurar(args.version)
+    elif args.orden == "limpiar":
+        huerfanos = limpiar(args.conservar)
+        if args.huerfanos:
+            with open(args.huerfanos, 'w', encoding='utf-8') as f: f.write("".join(h + "\n" for h in huerfanos))
+    elif args.orden == "pendientes": # Solo rutas, una por línea: el workflow se las pasa a `gh release upload`
+        for ruta in pendientes(args.version): print(ruta)
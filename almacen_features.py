@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from pipeline import medir
+from artefactos import cargar, guardar
+from inferencia import COLS_SUPERFICIE
+
+# ==============================================================================
+#            ALMACÉN DE FEATURES "AS-OF" (HISTÓRICO POR JUGADOR / EQUIPO)
+# ==============================================================================
+# db_players.joblib solo guarda la última fila de cada jugador. Aquí se guarda la historia
+# completa, ordenada por (entidad, fecha), para responder "features de X a fecha D" de golpe:
+#
+#   almacen = cargar_almacen('tenis')
+#   consultar(almacen, ['Alcaraz C.', 'Sinner J.'], ['2024-06-01', '2023-01-15'])
+#   db_asof(almacen, '2024-06-01')   # igual que db_players.joblib, pero a esa fecha
+#
+# Cada fila es el estado PRE-partido (Elo, EWMA y descanso antes de jugarlo), igual que en el
+# entrenamiento. "A fecha D" = última fila con fecha < D: nunca ve el partido del propio día.
+# Clave = id_entidad * 2^32 + día: una sola búsqueda binaria resuelve miles de consultas.
+
+ALMACENES = {
+    'tenis': {'archivo': "almacen_features_tenis.joblib", 'csv': "atp_matches_procesados.csv",
+              'entidad': 'player_name', 'fecha': 'Date',
+              'columnas': ['player_rank', 'player_elo', 'ewma_form', 'ewma_serve', 'ewma_return', 'ewma_surface',
+                           *COLS_SUPERFICIE.values(), 'days_rest', 'n_eff', 'sd_serve', 'sd_return']},
+    'nba': {'archivo': "almacen_features_nba.joblib", 'csv': "nba_processed.csv",
+            'entidad': 'TEAM_NAME', 'fecha': 'GAME_DATE',
+            'columnas': ['ELO_START', 'EWMA_OFF_RTG', 'EWMA_PACE', 'EWMA_PTS', 'N_EFF', 'SD_OFF_RTG', 'SD_PACE']},
+}
+DESPLAZAMIENTO = np.int64(1 << 32)
+
+def a_dias(fechas):
+    return pd.to_datetime(pd.Series(fechas)).to_numpy('datetime64[D]').astype(np.int64)
+
+# --- CONSTRUCCIÓN ---
+def construir_almacen(deporte, df=None):
+    """Etapa del pipeline: recibe el procesado de crear_ia*.py en memoria (o lee el CSV)."""
+    conf = ALMACENES[deporte]
+    print(f"--- 🗄️ Almacén de features as-of ({deporte}) ---")
+    if df is None:
+        df = pd.read_csv(conf['csv'], usecols=[conf['entidad'], conf['fecha']] + conf['columnas'])
+    with medir("almacen"):
+        entidades, ids = np.unique(df[conf['entidad']].astype(str).to_numpy(), return_inverse=True)
+        dias = a_dias(df[conf['fecha']])
+        # Orden (entidad, fecha); a igual fecha se respeta el orden cronológico del procesado
+        orden = np.lexsort((np.arange(len(df)), dias, ids))
+        ids, dias = ids[orden].astype(np.int64), dias[orden]
+        almacen = {
+            'deporte': deporte, 'entidades': entidades.tolist(),
+            'clave': ids * DESPLAZAMIENTO + dias, 'dias': dias,
+            'inicio': np.searchsorted(ids, np.arange(len(entidades) + 1)),  # filas de la entidad i: inicio[i]:inicio[i+1]
+            'columnas': {c: df[c].to_numpy(float)[orden] for c in conf['columnas']},
+        }
+    guardar(almacen, conf['archivo'])
+    print(f"✅ Almacén {deporte}: {len(dias)} filas de {len(entidades)} entidades.")
+    return almacen
+
+def construir_almacen_tenis(df=None): return construir_almacen('tenis', df)
+def construir_almacen_nba(df=None): return construir_almacen('nba', df)
+
+def cargar_almacen(deporte):
+    almacen = cargar(ALMACENES[deporte]['archivo'])
+    almacen['posicion'] = {e: i for i, e in enumerate(almacen['entidades'])}
+    return almacen
+
+# --- CONSULTA ---
+def filas_asof(almacen, entidades, fechas):
+    """Índice de la fila vigente para cada (entidad, fecha): -1 si la entidad no existe o aún no había jugado."""
+    pos = almacen['posicion']
+    ids = np.array([pos.get(e, -1) for e in entidades], dtype=np.int64)
+    dias = a_dias(fechas)
+    if dias.size == 1 and ids.size > 1: dias = np.repeat(dias, ids.size) # Una fecha para todos
+    fila = np.searchsorted(almacen['clave'], ids * DESPLAZAMIENTO + dias, side='left') - 1
+    valida = (ids >= 0) & (fila >= almacen['inicio'][np.maximum(ids, 0)])
+    return np.where(valida, fila, -1)
+
+def consultar(almacen, entidades, fechas):
+    """DataFrame alineado con la consulta: columnas de features + fecha de la fila usada (NaN/NaT si no hay)."""
+    conf = ALMACENES[almacen['deporte']]
+    fila = filas_asof(almacen, entidades, fechas)
+    ok, k = fila >= 0, np.maximum(fila, 0)
+    res = pd.DataFrame({conf['entidad']: list(entidades)})
+    res[conf['fecha']] = pd.to_datetime(almacen['dias'][k].astype('datetime64[D]')).where(ok)
+    for c, v in almacen['columnas'].items():
+        res[c] = np.where(ok, v[k], np.nan)
+    return res
+
+def db_asof(almacen, fecha):
+    """Todas las entidades a una fecha, con la forma de db_players.joblib / nba_db_teams.joblib."""
+    conf = ALMACENES[almacen['deporte']]
+    res = consultar(almacen, almacen['entidades'], fecha)
+    return res[res[conf['fecha']].notna()].reset_index(drop=True)
+
+if __name__ == "__main__":
+    for deporte in ALMACENES:
+        construir_almacen(deporte)
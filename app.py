@@ -1,11 +1,21 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import numpy as np
-import random
-import plotly.graph_objects as go
-import plotly.express as px
-from scipy.stats import norm
+import time
+# Plotly y los modelos se importan/cargan bajo demanda: el arranque solo paga Streamlit + pandas
+
+from simulador import (prob_saque, sd_saque, curvas_tenis, curvas_tenis_bandas, curvas_nba, bandas_nba, supervivencia_normal,
+                       prob_mayor, reagrupar,
+                       TOUR_AVG, AJUSTE_SUPERFICIE, LIMITES_SAQUE, MAX_DIFF, VENTAJA_LOCAL, RUIDO_NBA)
+from matriz_enfrentamientos import cargar_matriz, consultar, ARCHIVO_INDICE, ARCHIVO_MATRIZ
+from inferencia import SUPERFICIES, FORMATOS, PESO_MODELO, indexar_jugadores, predecir_lote, mezclar
+from artefactos import cargar, firma
+from compilador_modelos import cargar_modelo, COMPILADOS
+from almacen_artefactos import ruta_artefacto
+from indice_nombres import construir_indice, buscar, ARCHIVO_INDICE_NOMBRES
+from cola_simulaciones import ColaSimulaciones, tarea_tenis, tarea_nba
+from telemetria_app import Telemetria, ACTIVA_POR_DEFECTO, leer, resumen, ARCHIVO_METRICAS
+from consulta_ratings import cargar_ratings, prob_saque_ajustada, ARCHIVO_RATINGS
 
 # --- CONFIGURACIÓN GLOBAL ---
 st.set_page_config(page_title="NeuralSports Quant", page_icon="🏆", layout="wide")
@@ -49,121 +59,236 @@ st.markdown("""
 # --- SELECTOR DE DEPORTE ---
 with st.sidebar:
     st.title("NeuralSports AI")
-    st.caption("Sistema de Predicción Monte Carlo")
+    st.caption("Predicción: motor exacto (tenis) · Monte Carlo (NBA)")
     deporte = st.radio("Selecciona Deporte", ["🎾 Tenis ATP", "🏀 NBA Basket"], index=0)
     st.markdown("---")
 
+# --- TELEMETRÍA (opcional): tiempos por etapa de cada ejecución + perfil bajo demanda ---
+with st.sidebar.expander("🩺 Rendimiento"):
+    telemetria_activa = st.checkbox("Cronometrar etapas", value=ACTIVA_POR_DEFECTO, key='telemetria')
+    armar_perfil = st.button("📸 Perfilar la próxima acción")
+    if armar_perfil: st.session_state['perfilar'] = True
+    panel_telemetria = st.container()
+# El clic que arma el perfil no se perfila: se captura la siguiente interacción (simular, cambiar de jugador...)
+tel = Telemetria(telemetria_activa, deporte, perfilar=False if armar_perfil else st.session_state.pop('perfilar', False))
+
+@st.cache_data(ttl=30)
+def resumen_telemetria(deporte):
+    return resumen(leer(ARCHIVO_METRICAS), deporte).get(deporte, {})
+
+def cerrar_telemetria(estado="ok"):
+    """Cierra la ejecución (también antes de un st.stop) y pinta el desglose en el panel lateral."""
+    registro = tel.terminar(estado)
+    if registro is None: return
+    if tel.perfil: st.session_state['perfil_app'] = tel.perfil
+    with panel_telemetria:
+        etapas = sorted(registro['etapas'].items(), key=lambda x: -x[1])
+        st.caption(f"Esta ejecución: {registro['total_ms']:.0f} ms ({estado})")
+        st.dataframe(pd.DataFrame(etapas, columns=["Etapa", "ms"]).round(1), hide_index=True, use_container_width=True)
+        historico = resumen_telemetria(deporte)
+        if historico:
+            st.caption(f"Histórico ({historico['total']['n']} ejecuciones completas)")
+            st.dataframe(pd.DataFrame([{"Etapa": e, "p50 ms": m['p50_ms'], "p95 ms": m['p95_ms']} for e, m in historico.items()])
+                         .sort_values("p95 ms", ascending=False), hide_index=True, use_container_width=True)
+        if armar_perfil: st.info("📸 Perfil armado: se capturará la siguiente interacción.")
+        perfil = st.session_state.get('perfil_app')
+        if perfil:
+            with st.popover("Último perfil (cProfile)"):
+                st.code(perfil['texto'])
+            st.download_button("⬇️ Descargar .prof", perfil['prof'], file_name="perfil_app.prof")
+
+# --- COLA DE SIMULACIONES (una por servidor, compartida por todas las sesiones) ---
+@st.cache_resource
+def load_cola():
+    return ColaSimulaciones()
+
+cola = load_cola()
+
+def resultado_cola(clave, funcion, *args, enviar=False):
+    """Resultado del trabajo si ya está. Si no, lo encola (o se engancha al idéntico en curso),
+    pinta el estado y corta el script: un fragmento consulta la cola y relanza la app al terminar."""
+    e = cola.estado(clave)
+    if enviar or e['estado'] == 'desconocido': # Pulsado el botón, o el resultado salió de la caché de la cola
+        cola.enviar(clave, funcion, *args)
+        e = cola.estado(clave)
+    if e['estado'] == 'listo': return e['resultado']
+    if e['estado'] != 'pendiente':
+        st.error(f"❌ La simulación no terminó ({e['estado']}): {e.get('error', '')}. Vuelve a pulsar el botón.")
+        st.stop()
+
+    @st.fragment(run_every=0.5)
+    def esperar_resultado():
+        e = cola.estado(clave)
+        if e['estado'] != 'pendiente': st.rerun() # Listo (o fallido): la app entera se vuelve a pintar
+        m = cola.metricas()
+        fase = "⚙️ Simulando" if e.get('en_curso') else "⏳ En cola"
+        st.info(f"{fase}... {e['segundos']:.1f}s · Cola: {m['en_cola']} esperando, {m['en_curso']}/{m['procesos']} en curso")
+
+    esperar_resultado()
+    cerrar_telemetria("esperando")
+    st.stop()
+
+with st.sidebar.expander("⚙️ Cola de simulaciones"):
+    m = cola.metricas()
+    st.caption(f"En cola: {m['en_cola']} · En curso: {m['en_curso']}/{m['procesos']} · Fusionados: {m['fusionados']} · "
+               f"Caducados: {m['caducados']} · Errores: {m['errores']}")
+    if m['p50_s'] is not None: st.caption(f"Duración p50 {m['p50_s']}s · p95 {m['p95_s']}s")
+
 # ==============================================================================
 #                                   MÓDULO TENIS
 # ==============================================================================
 if deporte == "🎾 Tenis ATP":
     
-    @st.cache_resource
-    def load_tennis():
+    # La "version" (mtime + tamaño de los ficheros) es parte de la clave de caché:
+    # cuando el job nocturno reemplaza un artefacto se recarga solo, sin reiniciar el servidor.
+    # Cada nombre se resuelve en el almacén de artefactos (versión "latest" o la fijada): la ruta
+    # del objeto cambia con su contenido, así que una versión nueva también cambia la firma.
+    @st.cache_resource(max_entries=1)
+    def load_db_tennis(version):
+        try:
+            d = cargar(ruta_artefacto('db_players.joblib'))
+            return d, indexar_jugadores(d)
+        except: return None, None
+
+    @st.cache_resource(max_entries=1)
+    def load_model_tennis(version):
+        # Solo se llama al simular: abrir la app no deserializa el ensemble calibrado
         try:
-            m = joblib.load('modelo_calibrado.joblib')
-            f = joblib.load('features.joblib')
-            d = joblib.load('db_players.joblib')
-            return m, f, d
-        except: return None, None, None
+            # Compilado (arrays NumPy) si está al día: una pareja en microsegundos en vez de milisegundos
+            return (cargar_modelo('modelo_calibrado.joblib', resolver=ruta_artefacto),
+                    cargar(ruta_artefacto('features.joblib'), mmap=False))
+        except: return None, None
 
-    model, features, db = load_tennis()
+    with tel.etapa("artefactos"):
+        v_db = firma(ruta_artefacto('db_players.joblib'))
+        v_modelo = firma(*map(ruta_artefacto, ['modelo_calibrado.joblib', COMPILADOS['modelo_calibrado.joblib'], 'features.joblib']))
+        db, db_idx = load_db_tennis(v_db)
     
     if db is None:
         st.error("⚠️ Faltan archivos de Tenis. Ejecuta 'actualizar_auto.py' primero.")
         st.stop()
 
-    # FUNCIONES SIMULACIÓN TENIS
-    def sim_point(prob): return 1 if random.random() < prob else 0
-    
-    def sim_game(prob):
-        p1, p2 = 0, 0
-        while True:
-            if sim_point(prob): p1+=1 
-            else: p2+=1
-            if p1>=4 and p1>=p2+2: return 1, p1+p2
-            if p2>=4 and p2>=p1+2: return 0, p1+p2
-            
-    def sim_set(p1_p, p2_p):
-        g1, g2, pts = 0, 0, 0
-        while g1<6 and g2<6:
-            w, p = sim_game(p1_p); pts+=p
-            if w: g1+=1
-            w, p = sim_game(p2_p); pts+=p
-            if not w: g2+=1
-            else: g1+=1
-            if g1==6 and g2<5: return g1, g2, pts
-            if g2==6 and g1<5: return g1, g2, pts
-        # Tiebreak
-        tb1, tb2 = 0, 0
-        while True:
-            if (tb1+tb2)%2==0: 
-                if sim_point(p1_p): tb1+=1
-                else: tb2+=1
-            else:
-                if sim_point(p2_p): tb2+=1
-                else: tb1+=1
-            if tb1>=7 and tb1>=tb2+2: return 7, 6, pts+tb1+tb2
-            if tb2>=7 and tb2>=tb1+2: return 6, 7, pts+tb1+tb2
-
-    def run_monte_carlo_tennis(p1_prob, p2_prob, best_of, n=1500):
-        res = []
-        target = 2 if best_of==3 else 3
-        for _ in range(n):
-            s1, s2, tg, gp1, gp2 = 0, 0, 0, 0, 0
-            while s1<target and s2<target:
-                g1, g2, _ = sim_set(p1_prob, p2_prob)
-                if g1>g2: s1+=1
-                else: s2+=1
-                tg += g1+g2; gp1+=g1; gp2+=g2
-            res.append({'winner': 1 if s1>s2 else 2, 'total_games': tg, 'diff_games': gp1-gp2})
-        return pd.DataFrame(res)
-
-    # UI TENIS SIDEBAR
-    players = sorted(db['player_name'].unique())
-    
-    # Índices por defecto inteligentes
-    idx1 = players.index("Alcaraz C.") if "Alcaraz C." in players else 0
-    idx2 = players.index("Sinner J.") if "Sinner J." in players else 1
-    
-    p1 = st.sidebar.selectbox("J1 (Servicio)", players, index=idx1)
-    p2 = st.sidebar.selectbox("J2 (Resto)", players, index=idx2)
+    @st.cache_data(max_entries=512)
+    def prob_modelo(p1, p2, v_modelo, v_db):
+        # Todas las superficies y formatos en una sola llamada -> cambiar de pista no vuelve a predecir
+        model, features = load_model_tennis(v_modelo)
+        if model is None: return None
+        return predecir_lote(model, features, load_db_tennis(v_db)[1], [p1], [p2])[0]
+
+    @st.cache_data(max_entries=512)
+    def bandas_tenis(p1, sd1, p2, sd2, best_of):
+        # Cruces servidos desde la matriz: solo faltan las bandas (muestras de parámetros, motor exacto)
+        return curvas_tenis_bandas(p1, sd1, p2, sd2, best_of)['bandas']
+
+    @st.cache_data(max_entries=4096)
+    def curvas_what_if(p1, p2, best_of):
+        # Una entrada por combinación de los sliders (probabilidades redondeadas): volver a una ya vista es gratis
+        return {k: v[0] for k, v in curvas_tenis([p1], [p2], best_of).items()}
+
+    @st.cache_resource(max_entries=1)
+    def load_ratings(version):
+        # Ratings de saque/resto ajustados por rival (etapa nocturna): None si aún no existen
+        try: return cargar_ratings(ruta_artefacto(ARCHIVO_RATINGS))
+        except: return None
+
+    @st.cache_resource(max_entries=1)
+    def load_matriz(version):
+        # Matriz nocturna de jugadores activos (mmap): None si no existe -> todo en vivo
+        return cargar_matriz(resolver=ruta_artefacto)
+
+    @st.cache_resource(max_entries=1)
+    def load_indice_nombres(version, v_db):
+        # Índice generado en la descarga; si aún no existe, uno sin alias con los nombres de la DB
+        try: return cargar(ruta_artefacto(ARCHIVO_INDICE_NOMBRES), mmap=False)
+        except: return construir_indice(db['player_name'])
+
+    with tel.etapa("artefactos"):
+        indice_nombres = load_indice_nombres(firma(ruta_artefacto(ARCHIVO_INDICE_NOMBRES)), v_db)
+
+    def elegir_jugador(etiqueta, defecto, clave):
+        # Al navegador solo viajan las coincidencias de la búsqueda, no la lista entera de jugadores
+        texto = st.sidebar.text_input(f"🔎 Buscar {etiqueta}", value=defecto, key=f"buscar_{clave}")
+        opciones = [n for n in buscar(indice_nombres, texto, limite=25) if n in db_idx.index]
+        if not opciones:
+            st.sidebar.warning(f"Sin coincidencias para '{texto}'")
+            return None
+        return st.sidebar.selectbox(etiqueta, opciones, key=clave)
+
+    # UI TENIS SIDEBAR (por defecto: Alcaraz vs Sinner)
+    with tel.etapa("busqueda"):
+        p1 = elegir_jugador("J1 (Servicio)", "Alcaraz C.", "j1")
+        p2 = elegir_jugador("J2 (Resto)", "Sinner J.", "j2")
     surf = st.sidebar.selectbox("Superficie", ["Hard", "Clay", "Grass"])
     bo = st.sidebar.radio("Sets", [3, 5], horizontal=True)
+    with tel.etapa("artefactos"):
+        ratings = load_ratings(firma(ruta_artefacto(ARCHIVO_RATINGS)))
+    ajustar_rival = ratings is not None and st.sidebar.toggle("🎯 Saque ajustado por rival", value=False,
+                                                              help="Ratings de saque/resto corregidos por calendario en vez del Log5 sobre las EWMA")
     
     analyze_btn = st.sidebar.button("⚡ EJECUTAR SIMULACIÓN", type="primary")
 
-    if analyze_btn and p1 != p2:
-        d1, d2 = db[db['player_name']==p1].iloc[0], db[db['player_name']==p2].iloc[0]
-        
-        # Lógica Quant (Log5 ajustado)
-        tour_avg = 0.64
-        adj = -0.04 if surf=='Clay' else (0.03 if surf=='Grass' else 0.01)
+    # La petición vive en session_state: los reruns (consultas a la cola, cambios en los widgets) la conservan
+    if analyze_btn and p1 and p2 and p1 != p2:
+        st.session_state['tenis'] = (p1, p2, surf, bo)
+    peticion = st.session_state.get('tenis')
+
+    if peticion and all(p in db_idx.index for p in peticion[:2]):
+        p1, p2, surf, bo = peticion
+        with tel.etapa("busqueda"):
+            d1, d2 = db_idx.loc[p1], db_idx.loc[p2]
         
-        # Fallback si faltan datos de resto
-        ret1 = d1.get('ewma_return', 1-tour_avg)
-        ret2 = d2.get('ewma_return', 1-tour_avg)
+        # Lógica Quant (Log5 ajustado). Fallback si faltan datos de resto
+        ret1 = d1.get('ewma_return', 1-TOUR_AVG)
+        ret2 = d2.get('ewma_return', 1-TOUR_AVG)
         
-        sim_p1 = np.clip(d1['ewma_serve'] - (ret2 - (1-tour_avg)) + adj, 0.45, 0.85)
-        sim_p2 = np.clip(d2['ewma_serve'] - (ret1 - (1-tour_avg)) + adj, 0.45, 0.85)
+        sim_p1 = prob_saque(d1['ewma_serve'], ret2, surf)
+        sim_p2 = prob_saque(d2['ewma_serve'], ret1, surf)
+        if ratings is not None: # Mismo cruce con los ratings ajustados por rival (se muestran siempre; se usan si se pide)
+            adj_p1, adj_p2 = prob_saque_ajustada(ratings, p1, p2, surf), prob_saque_ajustada(ratings, p2, p1, surf)
+            if ajustar_rival: sim_p1, sim_p2 = adj_p1, adj_p2
+        # Incertidumbre de esas probabilidades (DB sin sd_*: 0 -> bandas = punto)
+        sd_p1 = round(sd_saque(d1.get('sd_serve', 0), d2.get('sd_return', 0)), 6)
+        sd_p2 = round(sd_saque(d2.get('sd_serve', 0), d1.get('sd_return', 0)), 6)
         
-        with st.spinner(f"Simulando {p1} vs {p2}..."):
-            sim_df = run_monte_carlo_tennis(sim_p1, sim_p2, bo)
+        # Jugadores activos: lectura directa de la matriz nocturna. Resto: motor exacto en vivo
+        with tel.etapa("matriz"): # La matriz se genera con el Log5: con los ratings ajustados, siempre en vivo
+            res = None if ajustar_rival else consultar(load_matriz(firma(ruta_artefacto(ARCHIVO_INDICE), ruta_artefacto(ARCHIVO_MATRIZ))), p1, p2, surf, bo)
+        if res is None:
+            # Misma clave para cualquier sesión que pida este cruce -> un único trabajo en el pool
+            clave = ('tenis', round(float(sim_p1), 6), round(float(sim_p2), 6), bo, sd_p1, sd_p2)
+            with tel.etapa("simulacion"):
+                res = dict(resultado_cola(clave, tarea_tenis, [sim_p1], [sim_p2], bo, sd_p1, sd_p2, enviar=analyze_btn))
+            with tel.etapa("modelo"):
+                res['grid_modelo'] = prob_modelo(p1, p2, v_modelo, v_db)
+        else: # La matriz no guarda bandas: solo las muestras de parámetros (~decenas de ms, cacheadas)
+            with tel.etapa("bandas"):
+                res['bandas'] = bandas_tenis(float(sim_p1), sd_p1, float(sim_p2), sd_p2, bo)
             
         # --- RESULTADOS TENIS ---
         
-        # 1. Determinar Ganador y Confianza
-        p1_win_prob = sim_df['winner'].value_counts(normalize=True).get(1, 0)
+        # 1. Determinar Ganador y Confianza (Modelo calibrado + simulación)
+        p1_sim = res['p_win']
+        grid_modelo = res['grid_modelo']
+        banda_sim = res['bandas']['p_win'] # (P5, P50, P95) de la simulación
+        if grid_modelo is not None:
+            p1_modelo = grid_modelo[SUPERFICIES.index(surf), FORMATOS.index(bo)]
+            p1_win_prob = mezclar(p1_modelo, p1_sim)
+            banda_p1 = mezclar(p1_modelo, banda_sim)
+        else: # Sin modelo: solo simulación
+            p1_modelo, p1_win_prob = p1_sim, p1_sim
+            banda_p1 = banda_sim
         
         if p1_win_prob >= 0.5:
             pred_winner = p1
             final_prob = p1_win_prob
             loser_prob = 1 - p1_win_prob
+            banda_ganador = banda_p1
             color_win = "#4ade80" # Verde
         else:
             pred_winner = p2
             final_prob = 1 - p1_win_prob
             loser_prob = p1_win_prob
+            banda_ganador = 1 - banda_p1[::-1]
             color_win = "#4ade80" # Verde
             
         # Etiquetas de confianza
@@ -191,41 +316,45 @@ if deporte == "🎾 Tenis ATP":
         <div class='metric-container'>
             <div class='metric-label'>Probabilidad</div>
             <div class='metric-value'>{final_prob:.1%}</div>
-            <div style='font-size: 10px; color: #64748b;'>Rival: {loser_prob:.1%}</div>
+            <div style='font-size: 10px; color: #64748b;'>Rival: {loser_prob:.1%} · IA {p1_modelo:.0%} / MC {p1_sim:.0%} ({p1})</div>
+            <div style='font-size: 10px; color: #64748b;'>IC 90%: {banda_ganador[0]:.1%} – {banda_ganador[2]:.1%}</div>
         </div>
         """, unsafe_allow_html=True)
         
-        avg_games = sim_df['total_games'].mean()
+        avg_games = res['media_juegos']
         k3.markdown(f"""
         <div class='metric-container'>
             <div class='metric-label'>Total Juegos</div>
             <div class='metric-value'>{avg_games:.1f}</div>
-            <div style='font-size: 10px; color: #64748b;'>±{sim_df['total_games'].std():.1f}</div>
+            <div style='font-size: 10px; color: #64748b;'>±{res['std_juegos']:.1f} · IC 90% media: {res['bandas']['media_juegos'][0]:.1f} – {res['bandas']['media_juegos'][2]:.1f}</div>
         </div>
         """, unsafe_allow_html=True)
         
         fair_odd = 1/final_prob if final_prob > 0 else 99
+        cuotas_banda = 1 / np.clip(banda_ganador[::-1], 0.01, 1) # Prob. alta -> cuota baja
         k4.markdown(f"""
         <div class='metric-container'>
             <div class='metric-label'>Cuota Justa</div>
             <div class='metric-value'>{fair_odd:.2f}</div>
             <div style='font-size: 10px; color: #64748b;'>Valor si cuota > {fair_odd:.2f}</div>
+            <div style='font-size: 10px; color: #64748b;'>IC 90%: {cuotas_banda[0]:.2f} – {cuotas_banda[2]:.2f}</div>
         </div>
         """, unsafe_allow_html=True)
         
         st.markdown("<br>", unsafe_allow_html=True)
         
         # TABS DETALLADOS
-        tab1, tab2, tab3 = st.tabs(["📊 Mercados", "📈 Distribución", "🎾 Stats Técnicas"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Mercados", "📈 Distribución", "🎾 Stats Técnicas", "🎛️ What-if"])
         
-        with tab1:
+        # Tablas = DataFrame + Styler (background_gradient) + envío; Plotly = figura + serialización
+        with tab1, tel.etapa("tablas"):
             c_ou, c_hc = st.columns(2)
             with c_ou:
                 st.markdown("#### 🔢 Over / Under")
                 lines = range(int(avg_games)-3, int(avg_games)+4)
                 ou_data = []
                 for l in lines:
-                    over = (sim_df['total_games'] > l).mean()
+                    over = res['surv_total'][l] # P(juegos > l)
                     if 0.15 < over < 0.85:
                         ou_data.append({"Línea": l, "Over %": over, "Cuota O": 1/over, "Under %": 1-over, "Cuota U": 1/(1-over)})
                 
@@ -243,7 +372,7 @@ if deporte == "🎾 Tenis ATP":
                 hc_lines = [-4.5, -3.5, -2.5, -1.5, 1.5, 2.5, 3.5, 4.5]
                 hc_data = []
                 for h in hc_lines:
-                    cover = (sim_df['diff_games'] + h > 0).mean() # P1 gana handicap?
+                    cover = res['surv_diff'][int(np.floor(-h)) + MAX_DIFF[bo]] # P1 gana handicap? P(diff > -h)
                     if 0.15 < cover < 0.85:
                         hc_data.append({"Hándicap": h, "Probabilidad": cover, "Cuota Real": 1/cover})
                 
@@ -255,16 +384,22 @@ if deporte == "🎾 Tenis ATP":
                         use_container_width=True, hide_index=True
                     )
 
-        with tab2:
-            fig = px.histogram(sim_df, x="total_games", nbins=20, title="Frecuencia de Juegos Totales", color_discrete_sequence=['#38bdf8'])
+        with tab2, tel.etapa("plotly"):
+            import plotly.graph_objects as go
+            pmf = -np.diff(np.r_[1.0, res['surv_total']]) # P(juegos = k)
+            k = np.flatnonzero(pmf > 1e-3)
+            fig = go.Figure(go.Bar(x=k, y=pmf[k], marker_color='#38bdf8'))
+            fig.update_layout(title="Frecuencia de Juegos Totales", xaxis_title="total_games", yaxis_title="Probabilidad")
             fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='white', bargap=0.1)
             fig.add_vline(x=avg_games, line_dash="dash", line_color="#f472b6", annotation_text="Media")
             st.plotly_chart(fig, use_container_width=True)
             
-        with tab3:
+        with tab3, tel.etapa("plotly"):
             st.markdown("#### 🧬 ADN del Partido (Inputs de Simulación)")
             cg1, cg2 = st.columns(2)
             
+            import plotly.graph_objects as go
+
             def draw_gauge(val, title, color):
                 fig = go.Figure(go.Indicator(
                     mode = "gauge+number", value = val * 100, title = {'text': title},
@@ -275,7 +410,77 @@ if deporte == "🎾 Tenis ATP":
 
             with cg1: st.plotly_chart(draw_gauge(sim_p1, f"Saque Real {p1}", "#4ade80"), use_container_width=True)
             with cg2: st.plotly_chart(draw_gauge(sim_p2, f"Saque Real {p2}", "#f87171"), use_container_width=True)
-            st.info(f"Valores calculados: Saque Histórico - Calidad Resto Rival + Ajuste Superficie ({surf})")
+            if ajustar_rival:
+                st.info(f"Valores calculados: ratings de saque/resto ajustados por rival en {surf} (fecha {ratings['fecha_ref']})")
+            else:
+                st.info(f"Valores calculados: Saque Histórico - Calidad Resto Rival + Ajuste Superficie ({surf})")
+            if ratings is not None:
+                st.caption(f"🎯 Ajustado por rival: {p1} {adj_p1:.1%} · {p2} {adj_p2:.1%} "
+                           f"(Log5 sobre EWMA: {prob_saque(d1['ewma_serve'], ret2, surf):.1%} · {prob_saque(d2['ewma_serve'], ret1, surf):.1%})")
+            st.caption(f"Incertidumbre (±1σ): {p1} {sim_p1:.1%} ± {sd_p1:.1%} ({d1.get('n_eff', 0):.0f} partidos efectivos) · "
+                       f"{p2} {sim_p2:.1%} ± {sd_p2:.1%} ({d2.get('n_eff', 0):.0f} partidos efectivos)")
+
+            if grid_modelo is not None:
+                st.markdown(f"#### 🧠 Modelo Calibrado: P({p1} gana)")
+                st.dataframe(
+                    pd.DataFrame(grid_modelo, index=SUPERFICIES, columns=[f"Bo{f}" for f in FORMATOS]).style.format("{:.1%}"),
+                    use_container_width=True
+                )
+                st.caption(f"Probabilidad final = {PESO_MODELO:.0%} modelo + {1-PESO_MODELO:.0%} simulación (motor exacto)")
+
+        with tab4, tel.etapa("what_if"):
+            # Fragmento: mover un slider solo re-ejecuta este bloque, no la app entera. El slider manda
+            # su valor al soltarlo (eso ya hace de debounce) y cada combinación es un partido con el
+            # motor exacto (~5 ms), cacheado por (saque J1, saque J2, formato).
+            @st.fragment
+            def what_if_tenis():
+                st.markdown("#### 🎛️ What-if: ajusta los inputs y el partido se re-tarifica")
+                w1, w2 = st.columns(2)
+                tour = w1.slider("Media del circuito al saque", 0.55, 0.72, TOUR_AVG, 0.005, format="%.3f")
+                ajuste = w2.slider(f"Ajuste de superficie ({surf})", -0.08, 0.08, AJUSTE_SUPERFICIE.get(surf, 0.01), 0.005, format="%+.3f")
+                delta1 = w1.slider(f"Saque {p1} (± sobre el histórico)", -0.10, 0.10, 0.0, 0.005, format="%+.3f")
+                delta2 = w2.slider(f"Saque {p2} (± sobre el histórico)", -0.10, 0.10, 0.0, 0.005, format="%+.3f")
+
+                t0 = time.perf_counter()
+                if ajustar_rival: # Ratings: los sliders desplazan la probabilidad igual que en el Log5
+                    despl = (TOUR_AVG - tour) + (ajuste - AJUSTE_SUPERFICIE.get(surf, 0.01))
+                    q1 = round(float(np.clip(adj_p1 + delta1 + despl, *LIMITES_SAQUE)), 4)
+                    q2 = round(float(np.clip(adj_p2 + delta2 + despl, *LIMITES_SAQUE)), 4)
+                else:
+                    q1 = round(float(prob_saque(d1['ewma_serve'] + delta1, ret2, surf, tour, ajuste)), 4)
+                    q2 = round(float(prob_saque(d2['ewma_serve'] + delta2, ret1, surf, tour, ajuste)), 4)
+                c = curvas_what_if(q1, q2, bo)
+                p_wi = mezclar(p1_modelo, c['p_win']) if grid_modelo is not None else c['p_win']
+                ms = (time.perf_counter() - t0) * 1000
+                # Deltas frente al mismo camino con los inputs originales (sin ruido de redondeo)
+                b = curvas_what_if(round(float(sim_p1), 4), round(float(sim_p2), 4), bo)
+                p_base = mezclar(p1_modelo, b['p_win']) if grid_modelo is not None else b['p_win']
+
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("Saque J1 / J2", f"{q1:.1%} / {q2:.1%}", f"{q1 - sim_p1:+.1%} / {q2 - sim_p2:+.1%}", delta_color="off")
+                m2.metric(f"P({p1} gana)", f"{p_wi:.1%}", f"{p_wi - p_base:+.1%}")
+                m3.metric("Cuota justa J1 / J2", f"{1/max(p_wi, 1e-3):.2f} / {1/max(1-p_wi, 1e-3):.2f}")
+                m4.metric("Total juegos", f"{c['media_juegos']:.1f}", f"{c['media_juegos'] - b['media_juegos']:+.1f}")
+
+                c_ou, c_hc = st.columns(2)
+                with c_ou: # Mismas líneas que la pestaña de mercados: base vs what-if
+                    ou_data = [{"Línea": l, "Over % base": b['surv_total'][l], "Over % what-if": c['surv_total'][l],
+                                "Cuota O": 1/max(c['surv_total'][l], 1e-3), "Cuota U": 1/max(1-c['surv_total'][l], 1e-3)}
+                               for l in range(int(avg_games)-3, int(avg_games)+4)]
+                    st.dataframe(pd.DataFrame(ou_data).style.format({"Over % base": "{:.1%}", "Over % what-if": "{:.1%}",
+                                                                     "Cuota O": "{:.2f}", "Cuota U": "{:.2f}"}),
+                                 use_container_width=True, hide_index=True)
+                with c_hc:
+                    hc_data = []
+                    for h in [-4.5, -3.5, -2.5, -1.5, 1.5, 2.5, 3.5, 4.5]:
+                        i = int(np.floor(-h)) + MAX_DIFF[bo]
+                        hc_data.append({f"Hándicap {p1}": h, "Prob. base": b['surv_diff'][i], "Prob. what-if": c['surv_diff'][i],
+                                        "Cuota": 1/max(c['surv_diff'][i], 1e-3)})
+                    st.dataframe(pd.DataFrame(hc_data).style.format({"Prob. base": "{:.1%}", "Prob. what-if": "{:.1%}", "Cuota": "{:.2f}"}),
+                                 use_container_width=True, hide_index=True)
+                st.caption(f"Re-tarificado en {ms:.1f} ms (motor exacto, caché por combinación de parámetros)")
+
+            what_if_tenis()
 
     elif not analyze_btn:
         st.info("👈 Selecciona jugadores en el menú lateral para comenzar.")
@@ -285,68 +490,69 @@ if deporte == "🎾 Tenis ATP":
 # ==============================================================================
 elif deporte == "🏀 NBA Basket":
     
-    @st.cache_resource
-    def load_nba():
-        try:
-            mw = joblib.load('nba_model_win.joblib')
-            mp = joblib.load('nba_model_pts.joblib')
-            f = joblib.load('nba_features.joblib')
-            d = joblib.load('nba_db_teams.joblib')
-            return mw, mp, f, d
-        except: return None, None, None, None
-
-    mw, mp, feats, db = load_nba()
+    @st.cache_resource(max_entries=1)
+    def load_nba(version):
+        # La app NBA solo usa la DB de equipos (todo sale del Monte Carlo): los modelos no se cargan
+        try: return cargar(ruta_artefacto('nba_db_teams.joblib'))
+        except: return None
+
+    with tel.etapa("artefactos"):
+        db = load_nba(firma(ruta_artefacto('nba_db_teams.joblib')))
+
+    @st.cache_data(max_entries=4096)
+    def curvas_nba_what_if(pace1, off1, pace2, off2, ventaja, ruido):
+        return {k: float(v) for k, v in curvas_nba(pace1, off1, pace2, off2, ventaja, ruido).items()}
     
     if db is None:
         st.error("⚠️ Faltan archivos NBA. Ejecuta 'actualizar_nba.py' y 'entrenar_ia_nba.py'.")
         st.stop()
         
-    def run_monte_carlo_nba(t1_stats, t2_stats, n=2000):
-        pace = (t1_stats['EWMA_PACE'] + t2_stats['EWMA_PACE']) / 2
-        off1 = t1_stats['EWMA_OFF_RTG']
-        off2 = t2_stats['EWMA_OFF_RTG']
-        res = []
-        for _ in range(n):
-            noise1 = np.random.normal(0, 12) 
-            noise2 = np.random.normal(0, 12)
-            pts1 = ((pace/100) * off1) + 3 + noise1 # +3 Home Adv
-            pts2 = ((pace/100) * off2) + noise2
-            res.append({'winner': 1 if pts1 > pts2 else 2, 'total_pts': pts1 + pts2, 'diff': pts1 - pts2})
-        return pd.DataFrame(res)
-
     teams = sorted(db['TEAM_NAME'].unique())
     t1 = st.sidebar.selectbox("Equipo Local (Casa)", teams, index=0)
     t2 = st.sidebar.selectbox("Equipo Visitante", teams, index=1)
     
-    if st.sidebar.button("Analizar NBA", type="primary"):
+    analizar_nba = st.sidebar.button("Analizar NBA", type="primary")
+    if analizar_nba:
+        st.session_state['nba'] = (t1, t2)
+
+    if st.session_state.get('nba'):
+        t1, t2 = st.session_state['nba']
         d1 = db[db['TEAM_NAME'] == t1].iloc[0]
         d2 = db[db['TEAM_NAME'] == t2].iloc[0]
         
-        with st.spinner("Simulando partido en la cancha..."):
-            sim_df = run_monte_carlo_nba(d1, d2)
+        # El Monte Carlo es aleatorio: cada pulsación es un trabajo nuevo (los reruns recogen el mismo)
+        if analizar_nba: st.session_state['nba_tirada'] = st.session_state.get('nba_tirada', 0) + 1
+        clave = ('nba', t1, t2, st.session_state.get('nba_tirada', 0))
+        with tel.etapa("simulacion"):
+            sim = resultado_cola(clave, tarea_nba, d1, d2, enviar=analizar_nba) # Conteos + momentos, no las muestras
             
-        win_pct = sim_df['winner'].value_counts(normalize=True).get(1, 0)
-        avg_pts = sim_df['total_pts'].mean()
-        spread = sim_df['diff'].mean()
+        win_pct = sim['victorias'][0] / sim['n']
+        avg_pts = sim['total_pts']['media']
+        spread = sim['diff']['media']
+        with tel.etapa("bandas"):
+            bandas = bandas_nba(d1, d2) # Muestras de ritmo / ataque de cada equipo: IC 90%
+        cuotas_banda = 1 / np.clip(bandas['p_win'][::-1], 0.01, 1)
         
         st.title(f"{t1} vs {t2}")
         
         c1, c2, c3, c4 = st.columns(4)
-        c1.markdown(f"<div class='metric-container'><div class='metric-label'>Prob. Local</div><div class='metric-value'>{win_pct:.1%}</div></div>", unsafe_allow_html=True)
-        c2.markdown(f"<div class='metric-container'><div class='metric-label'>Total Puntos</div><div class='metric-value'>{avg_pts:.1f}</div></div>", unsafe_allow_html=True)
-        c3.markdown(f"<div class='metric-container'><div class='metric-label'>Spread Estimado</div><div class='metric-value'>{spread:+.1f}</div></div>", unsafe_allow_html=True)
-        c4.markdown(f"<div class='metric-container'><div class='metric-label'>Cuota Justa</div><div class='metric-value'>{1/win_pct if win_pct>0 else 99:.2f}</div></div>", unsafe_allow_html=True)
+        pw, tot, dif = bandas['p_win'], bandas['media_total'], bandas['media_diff']
+        def ic(lo, hi): return f"<div style='font-size: 10px; color: #64748b;'>IC 90%: {lo} – {hi}</div>"
+        c1.markdown(f"<div class='metric-container'><div class='metric-label'>Prob. Local</div><div class='metric-value'>{win_pct:.1%}</div>{ic(f'{pw[0]:.1%}', f'{pw[2]:.1%}')}</div>", unsafe_allow_html=True)
+        c2.markdown(f"<div class='metric-container'><div class='metric-label'>Total Puntos</div><div class='metric-value'>{avg_pts:.1f}</div>{ic(f'{tot[0]:.1f}', f'{tot[2]:.1f}')}</div>", unsafe_allow_html=True)
+        c3.markdown(f"<div class='metric-container'><div class='metric-label'>Spread Estimado</div><div class='metric-value'>{spread:+.1f}</div>{ic(f'{dif[0]:+.1f}', f'{dif[2]:+.1f}')}</div>", unsafe_allow_html=True)
+        c4.markdown(f"<div class='metric-container'><div class='metric-label'>Cuota Justa</div><div class='metric-value'>{1/win_pct if win_pct>0 else 99:.2f}</div>{ic(f'{cuotas_banda[0]:.2f}', f'{cuotas_banda[2]:.2f}')}</div>", unsafe_allow_html=True)
         
-        tab1, tab2 = st.tabs(["📊 Mercados", "📈 Distribución"])
+        tab1, tab2, tab3 = st.tabs(["📊 Mercados", "📈 Distribución", "🎛️ What-if"])
         
-        with tab1:
+        with tab1, tel.etapa("tablas"):
             co, ch = st.columns(2)
             with co:
                 st.markdown("#### 🔢 Over / Under")
                 lines = range(int(avg_pts)-5, int(avg_pts)+6)
                 ou_data = []
                 for l in lines:
-                    over = (sim_df['total_pts'] > l).mean()
+                    over = prob_mayor(sim['total_pts'], l)
                     ou_data.append({"Línea": l, "Over %": f"{over:.1%}", "Cuota O": f"{1/over:.2f}"})
                 st.dataframe(pd.DataFrame(ou_data), hide_index=True, use_container_width=True)
                 
@@ -355,15 +561,61 @@ elif deporte == "🏀 NBA Basket":
                 hc_data = []
                 h_lines = [-10.5, -7.5, -4.5, -1.5, 1.5, 4.5, 7.5]
                 for h in h_lines:
-                    cover = (sim_df['diff'] + h > 0).mean()
+                    cover = prob_mayor(sim['diff'], -h) # P(diff + h > 0)
                     hc_data.append({"Hándicap Local": h, "Probabilidad": f"{cover:.1%}", "Cuota": f"{1/cover:.2f}"})
                 st.dataframe(pd.DataFrame(hc_data), hide_index=True, use_container_width=True)
                 
-        with tab2:
-             fig = px.histogram(sim_df, x="total_pts", nbins=30, title="Distribución de Puntos", color_discrete_sequence=['#f59e0b'])
-             fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='white')
+        with tab2, tel.etapa("plotly"):
+             import plotly.graph_objects as go
+             # Barras ya agrupadas en el servidor: al navegador viajan ~40 barras aunque n crezca x100
+             x, prob = reagrupar(sim['total_pts'], 3)
+             fig = go.Figure(go.Bar(x=x, y=prob, width=3, marker_color='#f59e0b'))
+             fig.update_layout(title="Distribución de Puntos", xaxis_title="total_pts", yaxis_title="Probabilidad")
+             fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='white', bargap=0.05)
              fig.add_vline(x=avg_pts, line_dash="dash", line_color="white", annotation_text="Media")
              st.plotly_chart(fig, use_container_width=True)
 
+        with tab3, tel.etapa("what_if"):
+            # Fórmula cerrada (suma de normales, ver simulador.curvas_nba): exacta y en microsegundos,
+            # así que el what-if no necesita muestrear. Caché por combinación de sliders.
+            @st.fragment
+            def what_if_nba():
+                st.markdown("#### 🎛️ What-if: ajusta los inputs y el partido se re-tarifica")
+                w1, w2 = st.columns(2)
+                ventaja = w1.slider("Ventaja local (puntos)", 0.0, 8.0, float(VENTAJA_LOCAL), 0.5)
+                ruido = w2.slider("Ruido por equipo σ (puntos)", 6.0, 18.0, float(RUIDO_NBA), 0.5)
+                d_off1 = w1.slider(f"Ataque {t1} (± OFF_RTG)", -10.0, 10.0, 0.0, 0.5)
+                d_off2 = w2.slider(f"Ataque {t2} (± OFF_RTG)", -10.0, 10.0, 0.0, 0.5)
+                d_pace = w1.slider("Ritmo del partido (± posesiones)", -8.0, 8.0, 0.0, 0.5)
+
+                t0 = time.perf_counter()
+                c = curvas_nba_what_if(float(d1['EWMA_PACE']) + d_pace, float(d1['EWMA_OFF_RTG']) + d_off1,
+                                       float(d2['EWMA_PACE']) + d_pace, float(d2['EWMA_OFF_RTG']) + d_off2, ventaja, ruido)
+                lineas = np.arange(int(avg_pts)-5, int(avg_pts)+6)
+                over = supervivencia_normal(lineas, c['media_total'], c['std_total'])
+                h_lines = np.array([-10.5, -7.5, -4.5, -1.5, 1.5, 4.5, 7.5])
+                cover = supervivencia_normal(-h_lines, c['media_diff'], c['std_diff']) # P(diff + h > 0)
+                ms = (time.perf_counter() - t0) * 1000
+                # Deltas frente a la fórmula con los inputs originales (el Monte Carlo de arriba tiene ruido)
+                b = curvas_nba_what_if(float(d1['EWMA_PACE']), float(d1['EWMA_OFF_RTG']), float(d2['EWMA_PACE']),
+                                       float(d2['EWMA_OFF_RTG']), float(VENTAJA_LOCAL), float(RUIDO_NBA))
+
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("Prob. Local", f"{c['p_win']:.1%}", f"{c['p_win'] - b['p_win']:+.1%}")
+                m2.metric("Total Puntos", f"{c['media_total']:.1f}", f"{c['media_total'] - b['media_total']:+.1f}")
+                m3.metric("Spread Estimado", f"{c['media_diff']:+.1f}", f"{c['media_diff'] - b['media_diff']:+.1f}")
+                m4.metric("Cuota Justa Local", f"{1/max(c['p_win'], 1e-3):.2f}")
+
+                co, ch = st.columns(2)
+                co.dataframe(pd.DataFrame({"Línea": lineas, "Over %": over, "Cuota O": 1/np.maximum(over, 1e-3)})
+                             .style.format({"Over %": "{:.1%}", "Cuota O": "{:.2f}"}), hide_index=True, use_container_width=True)
+                ch.dataframe(pd.DataFrame({"Hándicap Local": h_lines, "Probabilidad": cover, "Cuota": 1/np.maximum(cover, 1e-3)})
+                             .style.format({"Probabilidad": "{:.1%}", "Cuota": "{:.2f}"}), hide_index=True, use_container_width=True)
+                st.caption(f"Re-tarificado en {ms:.1f} ms (fórmula exacta, caché por combinación de parámetros)")
+
+            what_if_nba()
+
     elif not st.sidebar.button:
-        st.info("👈 Selecciona equipos NBA para comenzar.")
\ No newline at end of file
+        st.info("👈 Selecciona equipos NBA para comenzar.")
+
+cerrar_telemetria()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import joblib
+import numpy as np
+
+# ==============================================================================
+#               ARTEFACTOS (.joblib): GUARDADO ATÓMICO Y CARGA CON MMAP
+# ==============================================================================
+# Los scripts de entrenamiento escriben con guardar(): la app (que puede estar leyendo a la vez)
+# ve el fichero viejo o el nuevo, nunca uno a medias. La app carga con cargar(): los arrays
+# NumPy de los modelos se mapean en memoria (solo lectura) y los comparten todos los procesos
+# del servidor a través de la caché de páginas del sistema.
+
+def escribir_atomico(ruta, escribir):
+    """escribir(ruta_temporal) en el mismo directorio + os.replace (atómico)."""
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=f".{os.path.basename(ruta)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        escribir(tmp)
+        os.chmod(tmp, 0o644) # mkstemp crea con 0600: el servidor de la app puede ser otro usuario
+        os.replace(tmp, ruta)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+def guardar(obj, ruta):
+    # Sin compresión: es lo que permite el mmap al cargar
+    escribir_atomico(ruta, lambda tmp: joblib.dump(obj, tmp))
+
+def guardar_npy(arr, ruta):
+    def escribir(tmp):
+        with open(tmp, 'wb') as f: np.save(f, arr) # Con fichero abierto np.save no añade ".npy"
+    escribir_atomico(ruta, escribir)
+
+def cargar(ruta, mmap=True):
+    return joblib.load(ruta, mmap_mode='r' if mmap else None)
+
+def firma(*rutas):
+    """(ruta, mtime_ns, tamaño) de cada fichero. Cambia en cuanto el job nocturno reemplaza un
+    artefacto, así que sirve como clave de st.cache_resource para recargar sin reiniciar."""
+    res = []
+    for ruta in rutas:
+        try:
+            info = os.stat(ruta)
+            res.append((ruta, info.st_mtime_ns, info.st_size))
+        except FileNotFoundError:
+            res.append((ruta, None, None))
+    return tuple(res)
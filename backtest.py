@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, parallel_config
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import brier_score_loss, log_loss, accuracy_score
+
+from pipeline import hash_archivo
+from entrenamiento_incremental import ModeloCalibrado, calibrar as isotonica_holdout, FRACCION_HOLDOUT
+
+# ==============================================================================
+#               BACKTEST WALK-FORWARD (VENTANAS EXPANSIVAS)
+# ==============================================================================
+# Uso:
+#   python backtest.py tenis                   -> folds mensuales, modelo calibrado de producción
+#   python backtest.py nba --frecuencia Q      -> folds trimestrales
+#   python backtest.py tenis --desde 2022-01 --sin-calibrar
+#
+# Para cada periodo se entrena con TODO lo anterior y se puntúa el periodo (fuera de muestra).
+# Tenis calibrado = mismo camino que el refit completo de entrenar_ia.py: un HGB sobre el pasado
+# menos su último FRACCION_HOLDOUT, e isotónica ajustada con sus predicciones en ese holdout.
+# La matriz de features se construye una sola vez y se cachea en disco (.npy, leída con mmap);
+# los folds son cortes [:a] / [a:b] de esa matriz y corren en paralelo sin copiarla.
+
+CARPETA_CACHE = "cache"
+# No tenemos cuotas históricas: el "mercado" es la probabilidad Elo con el margen típico de la casa.
+MARGEN_CASA = 0.05
+# Solo se apuesta si la cuota ofrecida supera nuestra cuota justa en este margen
+UMBRAL_EDGE = 0.05
+MESES_MINIMOS_TRAIN = 12
+
+FUENTES = {
+    'tenis': ("atp_matches_procesados.csv", "entrenar_ia.py"),
+    'nba': ("nba_processed.csv", "entrenar_ia_nba.py"),
+}
+
+# --- MATRIZ DE FEATURES CACHEADA ---
+def construir_matriz(deporte):
+    csv, _ = FUENTES[deporte]
+    if deporte == 'tenis':
+        from entrenar_ia import construir_features_tenis
+        df = pd.read_csv(csv)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df = df.sort_values('Date', kind='stable')
+        _, df_train, features = construir_features_tenis(df)
+        fechas, y = df_train['Date'], df_train['result']
+        p_mercado = 1 / (1 + 10 ** (-df_train['delta_elo'] / 400))
+    else:
+        from entrenar_ia_nba import construir_features_nba
+        from crear_ia_nba import HOME_ADVANTAGE
+        df = pd.read_csv(csv)
+        df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+        df_train, features, y = construir_features_nba(df)
+        orden = np.argsort(df_train['GAME_DATE'].values, kind='stable')
+        df_train, y = df_train.iloc[orden], y.iloc[orden]
+        fechas = df_train['GAME_DATE']
+        ventaja = np.where(df_train['home_adv'] == 1, HOME_ADVANTAGE, -HOME_ADVANTAGE)
+        p_mercado = 1 / (1 + 10 ** (-(df_train['diff_elo'] + ventaja) / 400))
+
+    return {
+        'X': df_train[features].astype(float).to_numpy(),
+        'y': np.asarray(y, dtype=np.int8),
+        'fechas': fechas.values.astype('datetime64[ns]'),
+        'p_mercado': np.asarray(p_mercado, dtype=float),
+    }, features
+
+def cargar_matriz(deporte):
+    """Clave de caché = hash del CSV procesado + hash del script que define las features."""
+    csv, script = FUENTES[deporte]
+    clave = hashlib.sha256((hash_archivo(csv) + hash_archivo(script)).encode()).hexdigest()[:16]
+    carpeta = os.path.join(CARPETA_CACHE, f"backtest_{deporte}_{clave}")
+    if not os.path.exists(os.path.join(carpeta, "features.json")):
+        print(f"🧱 Construyendo matriz de features ({deporte})...")
+        arrays, features = construir_matriz(deporte)
+        os.makedirs(carpeta, exist_ok=True)
+        for nombre, arr in arrays.items():
+            np.save(os.path.join(carpeta, f"{nombre}.npy"), arr)
+        with open(os.path.join(carpeta, "features.json"), 'w') as f:
+            json.dump(features, f)  # Se escribe el último: marca la caché como completa
+    else:
+        print(f"♻️ Matriz de features en caché ({carpeta}).")
+    with open(os.path.join(carpeta, "features.json")) as f:
+        features = json.load(f)
+    arrays = {n: np.load(os.path.join(carpeta, f"{n}.npy"), mmap_mode='r') for n in ('X', 'y', 'fechas', 'p_mercado')}
+    return arrays, features
+
+# --- FOLDS ---
+def generar_folds(fechas, frecuencia='M', meses_minimos=MESES_MINIMOS_TRAIN, desde=None):
+    """[(inicio, fin, etiqueta)]: el fold entrena con [:inicio] y puntúa [inicio:fin]."""
+    periodos = pd.PeriodIndex(pd.to_datetime(np.asarray(fechas)), freq=frecuencia)
+    cortes = np.flatnonzero(np.r_[True, periodos[1:] != periodos[:-1]])
+    limites = np.r_[cortes, len(fechas)]
+    inicio_minimo = pd.Period(periodos[0], 'M') + meses_minimos
+    folds = []
+    for a, b in zip(limites[:-1], limites[1:]):
+        p = periodos[a]
+        if pd.Period(p.start_time, 'M') < inicio_minimo: continue
+        if desde and p.end_time < pd.Timestamp(desde): continue
+        folds.append((int(a), int(b), str(p)))
+    return folds
+
+def construir_modelo(deporte):
+    if deporte == 'tenis':
+        from entrenar_ia import PARAMS_FIJOS, ARCHIVO_HIPERPARAMETROS
+        params = PARAMS_FIJOS
+        if os.path.exists(ARCHIVO_HIPERPARAMETROS):
+            with open(ARCHIVO_HIPERPARAMETROS) as f:
+                params = json.load(f)
+        return HistGradientBoostingClassifier(random_state=42, **params)
+    return HistGradientBoostingClassifier(max_iter=200, max_depth=5, learning_rate=0.1, random_state=42)
+
+def ejecutar_fold(deporte, X, y, a, b, calibrar):
+    modelo = construir_modelo(deporte)
+    if deporte != 'tenis' or not calibrar:
+        modelo.fit(X[:a], y[:a])
+        return modelo.predict_proba(X[a:b])[:, 1]
+    corte = int(a * (1 - FRACCION_HOLDOUT))
+    modelo.fit(X[:corte], y[:corte])
+    calibrado = ModeloCalibrado(modelo, isotonica_holdout(modelo.predict_proba(X[corte:a])[:, 1], y[corte:a]))
+    return calibrado.predict_proba(X[a:b])[:, 1]
+
+# --- MÉTRICAS ---
+def roi_contra_mercado(p_modelo, p_mercado, y, margen=MARGEN_CASA, umbral=UMBRAL_EDGE):
+    """Apuesta 1u cuando la cuota de mercado (Elo + margen) supera nuestra cuota justa en `umbral`."""
+    cuota = 1 / np.clip(p_mercado * (1 + margen), 1e-6, None)
+    apuesta = p_modelo * cuota > 1 + umbral
+    beneficio = np.where(y == 1, cuota - 1, -1.0)[apuesta]
+    return int(apuesta.sum()), (float(beneficio.mean()) if apuesta.any() else 0.0)
+
+def metricas(p, y, p_mercado):
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    n_apuestas, roi = roi_contra_mercado(p, p_mercado, y)
+    return {
+        'n': len(y), 'brier': brier_score_loss(y, p), 'log_loss': log_loss(y, p, labels=[0, 1]),
+        'accuracy': accuracy_score(y, p > 0.5), 'apuestas': n_apuestas, 'roi': roi,
+    }
+
+def tabla_calibracion(p, y, n_bins=10):
+    bins = np.clip((p * n_bins).astype(int), 0, n_bins - 1)
+    filas = []
+    for b in range(n_bins):
+        m = bins == b
+        if m.any():
+            filas.append({'bin': f"{b/n_bins:.1f}-{(b+1)/n_bins:.1f}", 'n': int(m.sum()),
+                          'prob_media': float(p[m].mean()), 'frecuencia_real': float(y[m].mean())})
+    return pd.DataFrame(filas)
+
+def ejecutar_backtest(deporte, frecuencia='M', desde=None, calibrar=True, n_jobs=-1):
+    start = time.time()
+    arrays, features = cargar_matriz(deporte)
+    X, y, p_mercado = arrays['X'], arrays['y'], arrays['p_mercado']
+    folds = generar_folds(arrays['fechas'], frecuencia, desde=desde)
+    print(f"--- 🔁 BACKTEST {deporte.upper()}: {len(folds)} folds ({frecuencia}), {len(y)} filas, {len(features)} features ---")
+
+    # Los arrays son memmaps: loky los pasa por referencia al fichero, no por copia
+    with parallel_config(backend='loky', inner_max_num_threads=1):
+        preds = Parallel(n_jobs=n_jobs, verbose=0)(
+            delayed(ejecutar_fold)(deporte, X, y, a, b, calibrar) for a, b, _ in folds)
+
+    filas = []
+    for (a, b, etiqueta), p in zip(folds, preds):
+        filas.append({'periodo': etiqueta, 'n_train': a, **metricas(p, np.asarray(y[a:b]), np.asarray(p_mercado[a:b]))})
+    informe = pd.DataFrame(filas)
+
+    a0 = folds[0][0] if folds else len(y)
+    p_all, y_all = np.concatenate(preds) if preds else np.array([]), np.asarray(y[a0:folds[-1][1]]) if folds else np.array([])
+    if not len(p_all):
+        print("⚠️ No hay folds que evaluar (pocos datos o --desde demasiado reciente).")
+        return informe
+
+    glob = metricas(p_all, y_all, np.asarray(p_mercado[a0:folds[-1][1]]))
+    print(informe.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print("\n--- 📏 Calibración fuera de muestra ---")
+    print(tabla_calibracion(p_all, y_all).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n✅ GLOBAL: Brier {glob['brier']:.4f} | LogLoss {glob['log_loss']:.4f} | Acc {glob['accuracy']:.2%} "
+          f"| Brier por fold {informe['brier'].mean():.4f} ± {informe['brier'].std():.4f}")
+    print(f"💰 ROI vs mercado Elo (margen {MARGEN_CASA:.0%}, edge > {UMBRAL_EDGE:.0%}): "
+          f"{glob['roi']:+.2%} en {glob['apuestas']} apuestas")
+    print(f"⏱️ {time.time()-start:.1f}s")
+
+    os.makedirs(CARPETA_CACHE, exist_ok=True)
+    informe.to_csv(os.path.join(CARPETA_CACHE, f"backtest_{deporte}_informe.csv"), index=False)
+    return informe
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest walk-forward")
+    parser.add_argument("deporte", choices=list(FUENTES))
+    parser.add_argument("--frecuencia", default="M", help="M (mensual), Q (trimestral)...")
+    parser.add_argument("--desde", help="Primer periodo de test (YYYY-MM)")
+    parser.add_argument("--sin-calibrar", action="store_true", help="Tenis: modelo base sin isotónica (entrenado con todo el pasado)")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if not os.path.exists(FUENTES[args.deporte][0]):
+        print(f"❌ Falta {FUENTES[args.deporte][0]}. Ejecuta el pipeline primero.")
+        sys.exit(1)
+    ejecutar_backtest(args.deporte, args.frecuencia, args.desde, not args.sin_calibrar, args.n_jobs)
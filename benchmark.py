@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+#          BENCHMARKS: SIMULADORES, FEATURES Y ENTRENAMIENTO
+# ==============================================================================
+# Uso:
+#   python benchmark.py                      -> ejecuta todo, guarda y compara con el commit anterior
+#   python benchmark.py --casos mc_tenis,elo_tenis --repeticiones 10
+#   python benchmark.py --congelar           -> (re)genera los snapshots congelados
+# Sale con código 1 si algún caso empeora más de --umbral respecto al último commit medido.
+
+CARPETA = "benchmarks"
+ARCHIVO_RESULTADOS = os.path.join(CARPETA, "resultados.jsonl")
+SNAPSHOT_TENIS = os.path.join(CARPETA, "snapshot_tenis.csv")
+SNAPSHOT_NBA = os.path.join(CARPETA, "snapshot_nba.csv")
+FILAS_SNAPSHOT = 4000
+SEMILLA = 42
+
+# --- DATASETS ---
+def datos_sinteticos_tenis(n=5000, n_jugadores=300, seed=SEMILLA):
+    """Partidos ficticios con el mismo esquema que atp_tennis.csv."""
+    rng = np.random.default_rng(seed)
+    jugadores = np.array([f"Jugador{i:03d} X." for i in range(n_jugadores)])
+    i1 = rng.integers(0, n_jugadores, n)
+    i2 = (i1 + rng.integers(1, n_jugadores, n)) % n_jugadores
+    sets = rng.integers(2, 4, n)
+    scores = [" ".join(f"6-{rng.integers(0, 5)}" for _ in range(s)) for s in sets]
+    svpt1, svpt2 = rng.integers(40, 120, n), rng.integers(40, 120, n)
+    return pd.DataFrame({
+        'Date': pd.Timestamp("2015-01-05") + pd.to_timedelta(np.sort(rng.integers(0, 3650, n)), unit='D'),
+        'Surface': rng.choice(["Hard", "Clay", "Grass"], n, p=[0.55, 0.35, 0.10]),
+        'Player_1': jugadores[i1], 'Player_2': jugadores[i2],
+        'Rank_1': rng.integers(1, 500, n).astype(float), 'Rank_2': rng.integers(1, 500, n).astype(float),
+        'Score': scores, 'Best of': np.where(rng.random(n) < 0.2, 5, 3),
+        'P1_SvPt': svpt1, 'P1_1stIn': (svpt1 * 0.62).astype(int),
+        'P1_1stWon': (svpt1 * 0.46).astype(int), 'P1_2ndWon': (svpt1 * 0.19).astype(int),
+        'P2_SvPt': svpt2, 'P2_1stIn': (svpt2 * 0.60).astype(int),
+        'P2_1stWon': (svpt2 * 0.42).astype(int), 'P2_2ndWon': (svpt2 * 0.17).astype(int),
+    })
+
+def datos_sinteticos_nba(n_partidos=3000, seed=SEMILLA):
+    """Formato largo de nba_games.csv: dos filas (local/visitante) por GAME_ID."""
+    rng = np.random.default_rng(seed)
+    equipos = np.arange(1610612737, 1610612767)
+    local = rng.choice(equipos, n_partidos)
+    visita = (local - equipos[0] + rng.integers(1, 30, n_partidos)) % 30 + equipos[0]
+    fechas = pd.Timestamp("2015-10-27") + pd.to_timedelta(np.sort(rng.integers(0, 3000, n_partidos)), unit='D')
+    pts_h, pts_a = rng.normal(112, 12, n_partidos).round(), rng.normal(109, 12, n_partidos).round()
+
+    def lado(ids, pts, rival, es_local):
+        return pd.DataFrame({
+            'GAME_ID': np.arange(n_partidos) + 21500000, 'TEAM_ID': ids, 'TEAM_NAME': ids.astype(str),
+            'GAME_DATE': fechas, 'MATCHUP': 0, 'WL': np.where(pts > rival, 'W', 'L'), 'PTS': pts,
+            'FGA': rng.integers(75, 100, n_partidos), 'FTA': rng.integers(10, 35, n_partidos),
+            'TOV': rng.integers(8, 20, n_partidos), 'OREB': rng.integers(5, 15, n_partidos), 'IS_HOME': es_local,
+        })
+    return pd.concat([lado(local, pts_h, pts_a, 1), lado(visita, pts_a, pts_h, 0)], ignore_index=True)
+
+def congelar_snapshots():
+    """Fotografía fija de los primeros partidos reales: no cambia aunque el CSV nocturno sí."""
+    os.makedirs(CARPETA, exist_ok=True)
+    pd.read_csv("atp_tennis.csv", nrows=FILAS_SNAPSHOT).to_csv(SNAPSHOT_TENIS, index=False)
+    pd.read_csv("nba_games.csv", nrows=FILAS_SNAPSHOT).to_csv(SNAPSHOT_NBA, index=False)
+    print(f"🧊 Snapshots congelados en {CARPETA}/ ({FILAS_SNAPSHOT} filas cada uno).")
+
+def cargar_dataset(nombre):
+    if nombre == "sintetico_tenis": return datos_sinteticos_tenis()
+    if nombre == "sintetico_nba": return datos_sinteticos_nba()
+    ruta = SNAPSHOT_TENIS if nombre == "snapshot_tenis" else SNAPSHOT_NBA
+    if not os.path.exists(ruta): congelar_snapshots()
+    return pd.read_csv(ruta)
+
+# --- PREPARACIÓN (no se cronometra) ---
+def tenis_largo(df):
+    from crear_ia import preparar_stats, calcular_elo_optimizado, duplicar_por_jugador
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = calcular_elo_optimizado(preparar_stats(df.sort_values('Date')))
+    return duplicar_por_jugador(df)
+
+def tenis_procesado(df):
+    from crear_ia import calcular_ewma_tenis
+    return calcular_ewma_tenis(tenis_largo(df))
+
+def nba_con_ratings(df):
+    from crear_ia_nba import calcular_four_factors
+    df = df.fillna(0).copy()
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df[['OFF_RTG', 'PACE']] = df.apply(calcular_four_factors, axis=1)
+    return df.sort_values(['TEAM_ID', 'GAME_DATE'])
+
+def matriz_modelo(n=20000, n_feat=15, seed=SEMILLA):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, n_feat)), columns=[f"f{i}" for i in range(n_feat)])
+    y = (X['f0'] + 0.5 * X['f1'] + rng.normal(size=n) > 0).astype(int)
+    return X, y
+
+def modelo_entrenado():
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    X, y = matriz_modelo()
+    return HistGradientBoostingClassifier(learning_rate=0.05, max_iter=300, max_depth=5,
+                                          l2_regularization=1, random_state=SEMILLA).fit(X, y), X
+
+def modelo_compilado():
+    from compilador_modelos import compilar
+    modelo, X = modelo_entrenado()
+    return compilar(modelo), X
+
+# --- CASOS ---
+def casos():
+    """nombre -> (dataset, preparar(df) -> estado, ejecutar(estado), unidades por llamada)."""
+    from simulador import run_monte_carlo_tennis, run_monte_carlo_nba, curvas_tenis
+    from crear_ia import calcular_elo_optimizado, calcular_ewma_tenis
+    from crear_ia_nba import calcular_four_factors, calcular_ewma_nba
+    from entrenar_ia import cruzar_oponentes
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    equipo_a = {'EWMA_PACE': 99.0, 'EWMA_OFF_RTG': 115.0}
+    equipo_b = {'EWMA_PACE': 101.0, 'EWMA_OFF_RTG': 112.0}
+    return {
+        'mc_tenis': (None, lambda _: None, lambda _: run_monte_carlo_tennis(0.66, 0.63, 3, n=1500), 1500),
+        'mc_tenis_bo5': (None, lambda _: None, lambda _: run_monte_carlo_tennis(0.66, 0.63, 5, n=1500), 1500),
+        'exacto_tenis_bo5': (None, lambda _: None, lambda _: curvas_tenis(0.66, 0.63, 5), 1),
+        'mc_nba': (None, lambda _: None, lambda _: run_monte_carlo_nba(equipo_a, equipo_b, n=2000), 2000),
+        'elo_tenis': ("snapshot_tenis", lambda df: df.sort_values('Date'),
+                      lambda df: calcular_elo_optimizado(df.copy()), FILAS_SNAPSHOT),
+        'ewma_tenis': ("snapshot_tenis", tenis_largo, lambda df: calcular_ewma_tenis(df.copy()), 2 * FILAS_SNAPSHOT),
+        'ewma_tenis_sintetico': ("sintetico_tenis", tenis_largo, lambda df: calcular_ewma_tenis(df.copy()), 10000),
+        'four_factors': ("snapshot_nba", lambda df: df.fillna(0),
+                         lambda df: df.apply(calcular_four_factors, axis=1), FILAS_SNAPSHOT),
+        'ewma_nba': ("sintetico_nba", nba_con_ratings, lambda df: calcular_ewma_nba(df.copy()), 6000),
+        'cruce_oponentes': ("snapshot_tenis", tenis_procesado, cruzar_oponentes, 2 * FILAS_SNAPSHOT),
+        'fit_modelo': (None, lambda _: matriz_modelo(),
+                       lambda xy: HistGradientBoostingClassifier(learning_rate=0.05, max_iter=300, max_depth=5,
+                                                                 l2_regularization=1, random_state=SEMILLA).fit(*xy), 20000),
+        'predict_lote': (None, lambda _: modelo_entrenado(), lambda mx: mx[0].predict_proba(mx[1]), 20000),
+        'predict_fila': (None, lambda _: modelo_entrenado(), lambda mx: mx[0].predict_proba(mx[1].iloc[:1]), 1),
+        'predict_lote_compilado': (None, lambda _: modelo_compilado(), lambda mx: mx[0].predict_proba(mx[1]), 20000),
+        'predict_fila_compilado': (None, lambda _: modelo_compilado(), lambda mx: mx[0].predict_proba(mx[1].iloc[:1]), 1),
+    }
+
+# --- MEDICIÓN ---
+def medir_caso(ejecutar, estado, repeticiones, calentamiento=1):
+    tiempos = []
+    for i in range(calentamiento + repeticiones):
+        random.seed(SEMILLA); np.random.seed(SEMILLA)
+        t0 = time.perf_counter()
+        ejecutar(estado)
+        dt = time.perf_counter() - t0
+        if i >= calentamiento: tiempos.append(dt)
+    return np.array(tiempos)
+
+def commit_actual():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        sucio = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return sha, sucio
+    except (OSError, subprocess.CalledProcessError):
+        return "sin_git", False
+
+def cargar_resultados(ruta=ARCHIVO_RESULTADOS):
+    if not os.path.exists(ruta): return []
+    with open(ruta, encoding='utf-8') as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+def linea_base(historial, caso, commit, maquina):
+    """Último resultado del mismo caso y máquina en un commit distinto al actual."""
+    previos = [r for r in historial if r['caso'] == caso and r['maquina'] == maquina and r['commit'] != commit]
+    return previos[-1] if previos else None
+
+def ejecutar_benchmarks(seleccion=None, repeticiones=5, umbral=0.25, guardar=True):
+    commit, sucio = commit_actual()
+    maquina = platform.node()
+    historial = cargar_resultados()
+    datasets, resultados, regresiones = {}, [], []
+
+    print(f"--- ⏱️ BENCHMARKS @ {commit}{' (+cambios)' if sucio else ''} ---")
+    print(f"{'caso':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'uds/s':>14}   vs base")
+    for nombre, (dataset, preparar, ejecutar, unidades) in casos().items():
+        if seleccion and nombre not in seleccion: continue
+        if dataset and dataset not in datasets: datasets[dataset] = cargar_dataset(dataset)
+        estado = preparar(datasets.get(dataset))
+        t = medir_caso(ejecutar, estado, repeticiones) * 1000
+        p50, p95, p99 = np.percentile(t, [50, 95, 99])
+        r = {
+            'commit': commit, 'sucio': sucio, 'fecha': time.strftime("%Y-%m-%d %H:%M:%S"), 'maquina': maquina,
+            'caso': nombre, 'dataset': dataset or 'sintetico', 'repeticiones': repeticiones, 'unidades': unidades,
+            'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3),
+            'throughput': round(unidades / (p50 / 1000), 1),
+        }
+        base = linea_base(historial, nombre, commit, maquina)
+        comparacion = ""
+        if base:
+            ratio = r['p50_ms'] / base['p50_ms']
+            comparacion = f"x{ratio:.2f} ({base['commit']})"
+            if ratio > 1 + umbral:
+                regresiones.append(nombre)
+                comparacion = "🔴 " + comparacion
+        print(f"{nombre:<22}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{r['throughput']:>14,.0f}   {comparacion}")
+        resultados.append(r)
+
+    if guardar and resultados:
+        os.makedirs(CARPETA, exist_ok=True)
+        with open(ARCHIVO_RESULTADOS, 'a', encoding='utf-8') as f:
+            for r in resultados: f.write(json.dumps(r) + "\n")
+
+    if regresiones:
+        print(f"❌ Regresiones > {umbral:.0%}: {', '.join(regresiones)}")
+    else:
+        print("✅ Sin regresiones.")
+    return regresiones
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de NeuralSports")
+    parser.add_argument("--casos", help="Lista separada por comas (por defecto, todos)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento tolerado del p50 (0.25 = 25%%)")
+    parser.add_argument("--no-guardar", action="store_true")
+    parser.add_argument("--congelar", action="store_true", help="Regenera los snapshots congelados y sale")
+    args = parser.parse_args()
+
+    if args.congelar:
+        congelar_snapshots()
+        sys.exit(0)
+    seleccion = set(args.casos.split(",")) if args.casos else None
+    sys.exit(1 if ejecutar_benchmarks(seleccion, args.repeticiones, args.umbral, not args.no_guardar) else 0)
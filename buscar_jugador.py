@@ -1,34 +1,26 @@
-import pandas as pd
+from indice_nombres import cargar_indice, buscar
 
 ARCHIVO_DATOS = 'atp_tennis.csv'
 
 try:
-    # Cargamos solo la columna de ganadores y perdedores para ir rápido
-    df = pd.read_csv(ARCHIVO_DATOS, usecols=['Player_1', 'Player_2'])
+    # Índice de nombres generado en la descarga (sin acentos, prefijos y erratas)
+    indice = cargar_indice(csv=ARCHIVO_DATOS)
     
-    # Unimos todos los nombres en una lista única
-    nombres_unicos = pd.concat([df['Player_1'], df['Player_2']]).unique()
-    
-    # Convertimos a un DataFrame para buscar fácil
-    df_nombres = pd.DataFrame(nombres_unicos, columns=['nombre'])
-    # Ordenamos alfabéticamente
-    df_nombres = df_nombres.sort_values(by='nombre')
-    
-    print(f"--- Base de datos cargada: {len(df_nombres)} jugadores encontrados ---")
+    print(f"--- Base de datos cargada: {len(indice['nombres'])} jugadores encontrados ---")
 
     while True:
         busqueda = input("\nEscribe parte del nombre (o 'salir'): ").lower()
         if busqueda == 'salir': break
         
-        # Filtramos los que contienen el texto escrito
-        resultados = df_nombres[df_nombres['nombre'].str.lower().str.contains(busqueda)]
+        # Mejores coincidencias primero (pedimos de más para poder decir cuántas quedan)
+        resultados = buscar(indice, busqueda, limite=50)
         
         if len(resultados) > 0:
             print("\nHe encontrado estos jugadores:")
             # Mostramos los primeros 10 resultados
-            print(resultados['nombre'].head(10).to_string(index=False))
+            print("\n".join(resultados[:10]))
             if len(resultados) > 10:
-                print(f"... y {len(resultados)-10} más.")
+                print(f"... y {len(resultados)-10}{'+' if len(resultados) == 50 else ''} más.")
         else:
             print("❌ No he encontrado a nadie con ese nombre.")
 
@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+# ==============================================================================
+#             COLA DE SIMULACIONES COMPARTIDA (PROCESOS EN SEGUNDO PLANO)
+# ==============================================================================
+# La app crea UNA cola por servidor (st.cache_resource) y todas las sesiones le mandan trabajos:
+#   - Pool de procesos: las simulaciones (Python puro, CPU) corren en paralelo de verdad y no
+#     bloquean el hilo del script de Streamlit.
+#   - Fusión: un trabajo idéntico a otro en curso (misma clave) no se vuelve a lanzar, se
+#     engancha al que ya corre. Los resultados recientes se guardan para que cada sesión los recoja.
+#   - Timeout por trabajo: pasado el plazo se da por caducado (si aún no había empezado se cancela).
+#   - Métricas: trabajos en cola / en curso, fusionados, caducados y duración p50/p95.
+#
+#   cola.enviar(clave, tarea_tenis, p1, p2, 5)  ->  cola.estado(clave)  ->  {'estado': 'listo', 'resultado': ...}
+
+TIMEOUT = 60            # segundos por trabajo
+MAX_RESULTADOS = 256    # resultados terminados que se guardan para que las sesiones los recojan
+MAX_DURACIONES = 500    # ventana para los percentiles de duración
+
+# --- TAREAS (funciones de módulo: tienen que poder viajar a los procesos del pool) ---
+def tarea_tenis(p1, p2, best_of, sd1=None, sd2=None):
+    """Motor exacto para una pareja de probabilidades de saque (arrays de una fila -> escalares).
+    Con sus desviaciones, en la misma llamada al motor salen también las bandas creíbles."""
+    from simulador import curvas_tenis, curvas_tenis_bandas
+    if sd1 is not None: return curvas_tenis_bandas(p1[0], sd1, p2[0], sd2, best_of)
+    return {k: v[0] for k, v in curvas_tenis(p1, p2, best_of).items()}
+
+def tarea_nba(local, visitante):
+    from simulador import run_monte_carlo_nba
+    return run_monte_carlo_nba(local, visitante)
+
+def _precargar():
+    import simulador # El primer trabajo no paga la importación de NumPy/pandas en el proceso hijo
+
+# --- COLA ---
+class ColaSimulaciones:
+    def __init__(self, max_workers=None, timeout=TIMEOUT, max_resultados=MAX_RESULTADOS):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.timeout = timeout
+        self.max_resultados = max_resultados
+        self.lock = threading.Lock()
+        self.en_vuelo = {}                  # clave -> (future, t_envio, timeout)
+        self.resultados = OrderedDict()     # clave -> {'estado', 'resultado' | 'error', 'segundos'}
+        self.duraciones = deque(maxlen=MAX_DURACIONES)
+        self.contadores = {'enviados': 0, 'fusionados': 0, 'completados': 0, 'errores': 0, 'caducados': 0}
+        self.pool = self._crear_pool()
+
+    def _crear_pool(self):
+        # 'spawn': el servidor de Streamlit tiene hilos y hacer fork de un proceso con hilos no es seguro
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_precargar,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    def enviar(self, clave, funcion, *args, timeout=None):
+        """Encola funcion(*args) bajo `clave`. Si ya hay uno igual en curso o terminado, no hace nada."""
+        self._caducar()
+        with self.lock:
+            if clave in self.en_vuelo:
+                self.contadores['fusionados'] += 1
+                return clave
+            if clave in self.resultados and self.resultados[clave]['estado'] == 'listo':
+                self.resultados.move_to_end(clave)
+                return clave
+            self.resultados.pop(clave, None) # Un error / caducado anterior se reintenta
+            try:
+                futuro = self.pool.submit(funcion, *args)
+            except (BrokenProcessPool, RuntimeError): # Un hijo murió (p.ej. OOM): pool nuevo
+                self.pool = self._crear_pool()
+                futuro = self.pool.submit(funcion, *args)
+            self.en_vuelo[clave] = (futuro, time.time(), timeout or self.timeout)
+            self.contadores['enviados'] += 1
+        futuro.add_done_callback(lambda f, c=clave: self._terminar(c, f))
+        return clave
+
+    def _terminar(self, clave, futuro):
+        with self.lock:
+            vuelo = self.en_vuelo.get(clave)
+            if vuelo is None or vuelo[0] is not futuro: return # Ya se dio por caducado
+            del self.en_vuelo[clave]
+            segundos = time.time() - vuelo[1]
+            if futuro.cancelled(): return
+            error = futuro.exception()
+            if error is None:
+                self._guardar(clave, {'estado': 'listo', 'resultado': futuro.result(), 'segundos': segundos})
+                self.contadores['completados'] += 1
+                self.duraciones.append(segundos)
+            else:
+                self._guardar(clave, {'estado': 'error', 'error': f"{type(error).__name__}: {error}", 'segundos': segundos})
+                self.contadores['errores'] += 1
+
+    def _guardar(self, clave, registro):
+        self.resultados[clave] = registro
+        self.resultados.move_to_end(clave)
+        while len(self.resultados) > self.max_resultados:
+            self.resultados.popitem(last=False)
+
+    def _revisar_caducados(self):
+        """Con el lock cogido: da por caducados los trabajos fuera de plazo y devuelve sus futures."""
+        # Un proceso del pool no se puede interrumpir: si ya había empezado, su resultado se descarta
+        ahora, caducados = time.time(), []
+        for clave, (futuro, t_envio, timeout) in list(self.en_vuelo.items()):
+            if ahora - t_envio > timeout and not futuro.done():
+                caducados.append(futuro)
+                del self.en_vuelo[clave]
+                self._guardar(clave, {'estado': 'caducado', 'error': f"Más de {timeout}s en cola/ejecución", 'segundos': ahora - t_envio})
+                self.contadores['caducados'] += 1
+        return caducados
+
+    def _caducar(self):
+        with self.lock:
+            caducados = self._revisar_caducados()
+        # cancel() FUERA del lock: un future cancelado ejecuta sus callbacks (_terminar, que coge el
+        # lock) en este mismo hilo, y con el lock cogido el servidor entero se quedaría colgado
+        for futuro in caducados: futuro.cancel()
+
+    def estado(self, clave):
+        """{'estado': 'pendiente' | 'listo' | 'error' | 'caducado' | 'desconocido', ...}"""
+        self._caducar()
+        with self.lock:
+            if clave in self.en_vuelo:
+                futuro, t_envio, _ = self.en_vuelo[clave]
+                return {'estado': 'pendiente', 'en_curso': futuro.running(), 'segundos': time.time() - t_envio}
+            if clave in self.resultados:
+                self.resultados.move_to_end(clave)
+                return self.resultados[clave]
+            return {'estado': 'desconocido'}
+
+    def metricas(self):
+        self._caducar()
+        with self.lock:
+            en_curso = sum(f.running() for f, _, _ in self.en_vuelo.values())
+            d = np.asarray(self.duraciones)
+            return {
+                'en_cola': len(self.en_vuelo) - en_curso, 'en_curso': en_curso, 'procesos': self.max_workers,
+                **self.contadores,
+                'p50_s': round(float(np.percentile(d, 50)), 3) if len(d) else None,
+                'p95_s': round(float(np.percentile(d, 95)), 3) if len(d) else None,
+            }
+
+    def cerrar(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def esperar(cola, clave, timeout=None, intervalo=0.05):
+    """Bloqueante (scripts / pruebas): espera a que el trabajo termine y devuelve su estado."""
+    limite = time.time() + (timeout or cola.timeout)
+    while time.time() < limite:
+        e = cola.estado(clave)
+        if e['estado'] != 'pendiente': return e
+        time.sleep(intervalo)
+    return cola.estado(clave)
+
+if __name__ == "__main__":
+    # Comprobación de regresión: trabajos que caducan antes de empezar (antes: cancel() con el lock
+    # cogido -> _terminar se bloqueaba para siempre y estado() no volvía nunca)
+    cola = ColaSimulaciones(max_workers=1, timeout=1)
+    for clave in "abcd": cola.enviar(clave, time.sleep, 3)
+    time.sleep(1.5)
+    hilo = threading.Thread(target=lambda: print({c: cola.estado(c)['estado'] for c in "abcd"}), daemon=True)
+    hilo.start()
+    hilo.join(10)
+    if hilo.is_alive():
+        print("❌ estado() bloqueado: interbloqueo al cancelar trabajos caducados")
+        os._exit(1)
+    print(f"✅ Sin interbloqueo: {cola.metricas()}")
+    cola.cerrar()
@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from simulador import distribucion_conjunta_tenis, curvas_nba, supervivencia_normal, MAX_DIFF, MAX_JUEGOS
+from tarificar_cartelera import resolver_tenis, resolver_nba, tarificar_cruces_tenis, escribir
+from escaner_valor import normalizar
+
+# ==============================================================================
+#               COMBINADAS (PARLAYS) CON CORRELACIÓN DENTRO DEL PARTIDO
+# ==============================================================================
+# Multiplicar las probabilidades de las patas supone que son independientes. Entre partidos
+# distintos lo son; dentro del mismo partido NO (el favorito que gana tiende a ganar por más
+# juegos y a jugar menos juegos). Aquí cada partido se calcula UNA vez y todas sus patas se
+# evalúan sobre la misma distribución conjunta:
+#
+#   Tenis: distribución exacta (ganador, juegos totales, diferencia de juegos) del motor por sets,
+#          inclinada para que P(gana J1) sea la probabilidad mezclada modelo + simulación.
+#          Cada pata es una máscara sobre esa rejilla: acertar todas = producto de máscaras.
+#   NBA:   total y diferencia son dos normales independientes (ver simulador.curvas_nba): cada pata
+#          es un intervalo sobre una de las dos; acertar todas = intersección de intervalos.
+#
+#   python combinadas.py boletos.csv [--salida combinadas]
+#   python combinadas.py --demo 50      (boletos de prueba sobre jugadores/equipos al azar)
+#
+# Boletos en formato largo (como el escáner de valor), una fila por pata:
+#   boleto, deporte, j1, j2, superficie, best_of, mercado (ganador|total|handicap),
+#   seleccion (j1|j2|over|under), linea, cuota_combinada (opcional, la que ofrece la casa)
+#
+# Con líneas enteras una pata puede quedar en push (devolución): p_sin_perder lo incluye y la
+# cuota justa es la de acertarlas todas (conservadora). Al inclinar la conjunta, las patas sueltas de
+# total / hándicap de tenis pueden diferir un poco del escáner (allí la curva del motor va sin inclinar).
+
+CLAVES_PARTIDO = ['deporte', 'j1', 'j2', 'superficie', 'best_of']
+
+# --- DISTRIBUCIONES POR PARTIDO ---
+def inclinar(conjunta, p_j1):
+    """Reescala las dos mitades (gana J1 / gana J2) para que P(gana J1) = p_j1 sin tocar la
+    distribución de juegos condicionada al ganador."""
+    p_sim = conjunta[:, 1].sum(axis=(1, 2))
+    factor = np.stack([(1 - p_j1) / np.clip(1 - p_sim, 1e-12, None), p_j1 / np.clip(p_sim, 1e-12, None)], axis=1)
+    return conjunta * factor[:, :, None, None]
+
+def distribuciones_tenis(cruces):
+    """Cruces tarificados (con saque1/saque2/p_j1) -> una distribución conjunta por cruce."""
+    res = [None] * len(cruces)
+    for bo, grupo in cruces.groupby('best_of'):
+        conjunta = inclinar(distribucion_conjunta_tenis(grupo['saque1'], grupo['saque2'], bo), grupo['p_j1'].to_numpy())
+        for k, c in zip(grupo.index, conjunta):
+            res[k] = {'deporte': 'tenis', 'best_of': bo, 'conjunta': c}
+    return res
+
+def preparar_partidos(patas, n_jobs=-1):
+    """Resuelve nombres y calcula la distribución de cada partido distinto de los boletos.
+    Devuelve (patas con 'partido' y 'error', lista de distribuciones indexada por 'partido')."""
+    patas = patas.copy()
+    patas['partido'], patas['error'] = -1, None
+    partidos = []
+    for deporte, grupo in patas.groupby('deporte', sort=False):
+        if deporte == 'tenis':
+            grupo, db_idx = resolver_tenis(grupo)
+        elif deporte == 'nba':
+            grupo, db = resolver_nba(grupo)
+        else:
+            patas.loc[grupo.index, 'error'] = f"Deporte '{deporte}' no soportado"
+            continue
+        patas.loc[grupo.index, ['j1', 'j2', 'error']] = grupo[['j1', 'j2', 'error']]
+        ok = grupo['error'].isna()
+        cruces = grupo.loc[ok, CLAVES_PARTIDO].drop_duplicates().reset_index(drop=True)
+        if not len(cruces): continue
+        if deporte == 'tenis':
+            dist = distribuciones_tenis(tarificar_cruces_tenis(cruces, db_idx, n_jobs))
+        else:
+            d1, d2 = db.loc[cruces['j1']], db.loc[cruces['j2']]
+            c = curvas_nba(d1['EWMA_PACE'], d1['EWMA_OFF_RTG'], d2['EWMA_PACE'], d2['EWMA_OFF_RTG'])
+            dist = [{'deporte': 'nba', **{k: float(v[i]) for k, v in c.items()}} for i in range(len(cruces))]
+        ids = pd.MultiIndex.from_frame(cruces).get_indexer(pd.MultiIndex.from_frame(grupo.loc[ok, CLAVES_PARTIDO]))
+        patas.loc[grupo.index[ok.to_numpy()], 'partido'] = ids + len(partidos)
+        partidos += dist
+    return patas, partidos
+
+# --- PATAS ---
+def mascaras_tenis(pata, best_of):
+    """(gana, push) de una pata como máscaras booleanas sobre la rejilla (ganador, total, diff)."""
+    off = MAX_DIFF[best_of]
+    W = np.arange(2)[:, None, None]
+    T = np.arange(MAX_JUEGOS[best_of] + 1)[None, :, None]
+    D = (np.arange(2 * off + 1) - off)[None, None, :]
+    m, sel, l = pata['mercado'], pata['seleccion'], float(pata['linea'])
+    nada = np.zeros((2, len(T[0]), len(D[0, 0])), bool)
+    if m == 'ganador':
+        return np.broadcast_to(W == (1 if sel == 'j1' else 0), nada.shape), nada
+    if m == 'total':
+        return np.broadcast_to(T > l if sel == 'over' else T < l, nada.shape), np.broadcast_to(T == l, nada.shape)
+    if m == 'handicap':
+        # J1 con h gana si D > -h ; J2 con h gana si D < h (D = J1 - J2), igual que en el escáner
+        umbral = -l if sel == 'j1' else l
+        return np.broadcast_to(D > umbral if sel == 'j1' else D < umbral, nada.shape), np.broadcast_to(D == umbral, nada.shape)
+    raise ValueError(f"Mercado '{m}' no soportado")
+
+def intervalo_nba(pata):
+    """Pata NBA -> (variable, mínimo, máximo) abierto sobre la diferencia o el total de puntos."""
+    m, sel, l = pata['mercado'], pata['seleccion'], float(pata['linea'])
+    if m == 'ganador': return ('diff', 0.0, np.inf) if sel == 'j1' else ('diff', -np.inf, 0.0)
+    if m == 'handicap': return ('diff', -l, np.inf) if sel == 'j1' else ('diff', -np.inf, l)
+    if m == 'total': return ('total', l, np.inf) if sel == 'over' else ('total', -np.inf, l)
+    raise ValueError(f"Mercado '{m}' no soportado")
+
+def prob_intervalo(media, std, minimo, maximo):
+    if minimo >= maximo: return 0.0
+    return float(supervivencia_normal(minimo, media, std) - supervivencia_normal(maximo, media, std))
+
+def prob_partido(dist, patas):
+    """Patas de UN partido -> (P(acertar todas), P(ninguna perdida), [P(acertar) de cada pata])."""
+    if dist['deporte'] == 'tenis':
+        c = dist['conjunta']
+        gana_todas, sin_perder, sueltas = np.ones(c.shape, bool), np.ones(c.shape, bool), []
+        for pata in patas:
+            gana, push = mascaras_tenis(pata, dist['best_of'])
+            gana_todas &= gana
+            sin_perder &= gana | push
+            sueltas.append(float(c[gana].sum()))
+        return float(c[gana_todas].sum()), float(c[sin_perder].sum()), sueltas
+
+    limites = {'diff': [-np.inf, np.inf], 'total': [-np.inf, np.inf]}
+    sueltas = []
+    for pata in patas:
+        var, lo, hi = intervalo_nba(pata)
+        limites[var] = [max(limites[var][0], lo), min(limites[var][1], hi)]
+        sueltas.append(prob_intervalo(dist[f'media_{var}'], dist[f'std_{var}'], lo, hi))
+    # Diferencia y total son independientes: la conjunta es el producto
+    p = np.prod([prob_intervalo(dist[f'media_{v}'], dist[f'std_{v}'], *limites[v]) for v in limites])
+    return float(p), float(p), sueltas # Normal continua: sin push
+
+# --- BOLETOS ---
+def tarificar_boleto(patas, partidos):
+    """Patas de un boleto ya preparadas -> precio conjunto. Solo máscaras / intervalos: milisegundos."""
+    if patas['error'].notna().any():
+        return {'p_gana': np.nan, 'error': "; ".join(sorted(set(patas['error'].dropna())))}
+    p_gana = p_sin_perder = p_independiente = 1.0
+    sueltas = []
+    for partido, grupo in patas.groupby('partido', sort=False):
+        g, s, ps = prob_partido(partidos[partido], grupo.to_dict('records'))
+        # Entre partidos distintos sí hay independencia: se multiplican
+        p_gana, p_sin_perder, p_independiente = p_gana * g, p_sin_perder * s, p_independiente * np.prod(ps)
+        sueltas += ps
+    return {'n_patas': len(patas), 'n_partidos': patas['partido'].nunique(), 'p_gana': p_gana,
+            'p_sin_perder': p_sin_perder, 'p_independiente': p_independiente,
+            'correlacion': p_gana / p_independiente if p_independiente > 0 else np.nan,
+            'cuota_justa': 1 / p_gana if p_gana > 0 else np.inf, 'p_patas': sueltas, 'error': None}
+
+def tarificar_boletos(df, n_jobs=-1):
+    """Boletos en formato largo -> un precio por boleto (mejor valor primero si traen cuota_combinada)."""
+    df = df.reset_index(drop=True)
+    if 'boleto' not in df.columns: df = df.assign(boleto=0) # Un solo boleto
+    cuota = pd.to_numeric(df['cuota_combinada'], errors='coerce') if 'cuota_combinada' in df.columns else pd.Series(np.nan, df.index)
+    patas = normalizar(df.assign(cuota=np.nan)).assign(boleto=df['boleto'].to_numpy())
+    patas, partidos = preparar_partidos(patas, n_jobs)
+    filas = []
+    for boleto, grupo in patas.groupby('boleto', sort=False):
+        filas.append({'boleto': boleto, 'cuota_combinada': cuota.loc[grupo.index].max(), **tarificar_boleto(grupo, partidos)})
+    res = pd.DataFrame(filas)
+    res['edge'] = res['p_gana'] * res['cuota_combinada'] - 1
+    return res.sort_values('edge', ascending=False, kind='stable', na_position='last').reset_index(drop=True), patas, partidos
+
+# --- BOLETOS DE PRUEBA ---
+def boletos_demo(n_boletos=50, max_patas=10, seed=0):
+    """Boletos al azar: varias patas del mismo partido (correladas) y de partidos distintos."""
+    from artefactos import cargar
+    rng = np.random.default_rng(seed)
+    jugadores = list(cargar('db_players.joblib', mmap=False).sort_values('player_elo')['player_name'].tail(64))
+    equipos = list(cargar('nba_db_teams.joblib', mmap=False)['TEAM_NAME']) if os.path.exists('nba_db_teams.joblib') else []
+    partidos = []
+    for k in range(12):
+        if equipos and k % 3 == 2:
+            a, b = rng.choice(equipos, 2, replace=False)
+            partidos.append({'deporte': 'nba', 'j1': a, 'j2': b, 'superficie': 'Hard', 'best_of': 3,
+                             'patas': [('ganador', 'j1', 0.0), ('total', 'over', 220.5), ('handicap', 'j1', -4.5)]})
+        else:
+            a, b = rng.choice(jugadores, 2, replace=False)
+            bo = int(rng.choice([3, 5], p=[0.7, 0.3]))
+            partidos.append({'deporte': 'tenis', 'j1': a, 'j2': b, 'superficie': str(rng.choice(['Hard', 'Clay', 'Grass'])),
+                             'best_of': bo, 'patas': [('ganador', 'j1', 0.0), ('total', 'under', 22.5 if bo == 3 else 38.5),
+                                                      ('handicap', 'j1', -2.5 if bo == 3 else -4.5)]})
+    filas = []
+    for boleto in range(n_boletos):
+        n = int(rng.integers(2, max_patas + 1))
+        for i in rng.choice(len(partidos), min(n, len(partidos)), replace=False):
+            p = partidos[i]
+            for mercado, sel, l in [p['patas'][j] for j in sorted(rng.choice(3, int(rng.integers(1, 3)), replace=False))]:
+                filas.append({'boleto': boleto, **{k: p[k] for k in CLAVES_PARTIDO}, 'mercado': mercado, 'seleccion': sel, 'linea': l})
+    return pd.DataFrame(filas)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precio de combinadas con correlación dentro del partido")
+    parser.add_argument("boletos", nargs='?', help="CSV/JSON/Parquet de patas en formato largo")
+    parser.add_argument("--demo", type=int, metavar="N", help="Sin fichero: N boletos de prueba")
+    parser.add_argument("--salida", default="combinadas", help="Nombre base del fichero de salida")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if args.boletos is None and not args.demo:
+        parser.error("Indica un fichero de boletos o --demo N")
+    if args.boletos and not os.path.exists(args.boletos):
+        print(f"❌ No existe {args.boletos}")
+        sys.exit(1)
+
+    if args.boletos is None: df = boletos_demo(args.demo)
+    elif args.boletos.endswith('.parquet'): df = pd.read_parquet(args.boletos)
+    elif args.boletos.endswith('.json'): df = pd.read_json(args.boletos)
+    else: df = pd.read_csv(args.boletos)
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    start = time.time()
+    res, patas, partidos = tarificar_boletos(df, args.n_jobs)
+    t = time.time() - start
+    print(f"--- 🎟️ COMBINADAS: {len(res)} boletos, {len(patas)} patas, {len(partidos)} partidos ({t:.2f}s) ---")
+    cols = ['boleto', 'n_patas', 'n_partidos', 'p_gana', 'p_independiente', 'correlacion', 'cuota_justa', 'cuota_combinada', 'edge']
+    print(res[[c for c in cols if c in res.columns]].head(args.top).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    sin = res['error'].notna()
+    if sin.any(): print(f"⚠️ {sin.sum()} boletos sin precio ({res.loc[sin, 'error'].value_counts().to_dict()})")
+    print(f"✅ Guardado en {escribir(res.drop(columns='p_patas'), args.salida)}")
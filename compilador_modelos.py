@@ -0,0 +1,244 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from pipeline import medir, hash_archivo
+from artefactos import guardar, cargar
+
+# ==============================================================================
+#        COMPILADOR DE MODELOS (ÁRBOLES DE SKLEARN -> ARRAYS NUMPY PLANOS)
+# ==============================================================================
+# predict_proba de sklearn paga validación, conversión a float y reparto en hilos en CADA
+# llamada: milisegundos aunque sea una sola fila. Aquí se exportan los árboles del
+# HistGradientBoosting (y las isotónicas de la calibración) a unos pocos arrays NumPy:
+#
+#   nodos:  feature | umbral | hijos (izq, der) | faltante_izq | valor   (todos los árboles seguidos)
+#   raices: índice del primer nodo de cada árbol
+#
+# Las hojas apuntan a sí mismas (umbral +inf), así que para evaluar basta con dar `profundidad`
+# pasos sobre TODOS los árboles y TODAS las filas a la vez, sin mirar quién ha llegado ya a una
+# hoja: cada paso son 4-6 operaciones vectorizadas. Una fila tarda microsegundos (en vez de los
+# milisegundos de sklearn) y los lotes grandes van por bloques. Misma interfaz (predict_proba / predict), así que inferencia.py,
+# la matriz y la app lo usan sin cambios. Al exportar se compara con sklearn (paridad): si no
+# coincide, no se guarda.
+
+COMPILADOS = {
+    'modelo_calibrado.joblib': "modelo_compilado.joblib",
+    'nba_model_win.joblib': "nba_model_win_compilado.joblib",
+    'nba_model_pts.joblib': "nba_model_pts_compilado.joblib",
+}
+TOLERANCIA_PARIDAD = 1e-9
+FILAS_PARIDAD = 20000
+FILAS_POR_BLOQUE = 1024   # filas de cada bloque en los lotes grandes (filas x árboles en memoria)
+
+# --- EXPORTACIÓN ---
+def aplanar_hgb(modelo):
+    """Árboles de un HistGradientBoosting -> arrays planos (índices de hijos ya absolutos)."""
+    if getattr(modelo, 'n_trees_per_iteration_', 1) != 1:
+        raise ValueError("Solo modelos binarios o de regresión (un árbol por iteración)")
+    if getattr(modelo, 'is_categorical_', None) is not None and np.any(modelo.is_categorical_):
+        raise ValueError("Features categóricas nativas no soportadas")
+    enlace = {'HalfBinomialLoss': 'logistica', 'HalfSquaredError': 'identidad'}.get(type(modelo._loss).__name__)
+    if enlace is None:
+        raise ValueError(f"Pérdida no soportada: {type(modelo._loss).__name__}")
+
+    nodos = [arboles[0].nodes for arboles in modelo._predictors]
+    tamanos = np.array([len(n) for n in nodos], dtype=np.int64)
+    raices = np.concatenate([[0], np.cumsum(tamanos)[:-1]])
+    todos = np.concatenate(nodos)
+    hoja = todos['is_leaf'].astype(bool)
+    propio = np.arange(len(todos))
+    desplazamiento = np.repeat(raices, tamanos)
+    # Hoja = bucle sobre sí misma: cualquier valor (también NaN) se queda donde está
+    return {
+        'feature': np.where(hoja, 0, todos['feature_idx']).astype(np.intp),
+        'umbral': np.where(hoja, np.inf, todos['num_threshold']).astype(np.float64),
+        'hijos': np.c_[np.where(hoja, propio, todos['left'] + desplazamiento),
+                       np.where(hoja, propio, todos['right'] + desplazamiento)].astype(np.intp),
+        'faltante_izq': todos['missing_go_to_left'].astype(bool) | hoja,
+        'es_hoja': hoja,
+        'valor': todos['value'].astype(np.float64),
+        'raices': raices.astype(np.int32),
+        'profundidad': int(todos['depth'].max()),
+        'base': float(np.ravel(modelo._baseline_prediction)[0]),
+        'enlace': enlace,
+    }
+
+def aplanar_calibrador(cal):
+    """IsotonicRegression -> puntos de np.interp; calibración sigmoide -> (a, b)."""
+    if hasattr(cal, 'X_thresholds_'):
+        return {'tipo': 'isotonica', 'x': np.asarray(cal.X_thresholds_, float), 'y': np.asarray(cal.y_thresholds_, float)}
+    if hasattr(cal, 'a_'):
+        return {'tipo': 'sigmoide', 'a': float(cal.a_), 'b': float(cal.b_)}
+    raise ValueError(f"Calibrador no soportado: {type(cal).__name__}")
+
+def compilar(modelo):
+    """HGB suelto, ModeloCalibrado (base + isotónica) o CalibratedClassifierCV (media de los folds)."""
+    from entrenamiento_incremental import ModeloCalibrado
+
+    if isinstance(modelo, ModeloCalibrado):
+        # La isotónica se ajustó sobre predict_proba del base
+        partes = [(aplanar_hgb(modelo.base), 'proba', aplanar_calibrador(modelo.isotonica))]
+        features = modelo.base.feature_names_in_
+    elif hasattr(modelo, 'calibrated_classifiers_'):
+        # CalibratedClassifierCV calibra la decision_function (el score crudo del HGB)
+        partes = [(aplanar_hgb(c.estimator), 'crudo', aplanar_calibrador(c.calibrators[0]))
+                  for c in modelo.calibrated_classifiers_]
+        features = modelo.calibrated_classifiers_[0].estimator.feature_names_in_
+    else:
+        partes = [(aplanar_hgb(modelo), 'proba', None)]
+        features = getattr(modelo, 'feature_names_in_', None)
+
+    # Todos los ensembles en las mismas tablas de nodos: una sola pasada para los folds de cv=3
+    tablas = [p[0] for p in partes]
+    inicio = np.concatenate([[0], np.cumsum([len(t['valor']) for t in tablas])[:-1]])
+    arboles_por_parte = [len(t['raices']) for t in tablas]
+    arrays = {k: np.concatenate([t[k] for t in tablas]) for k in ('feature', 'umbral', 'faltante_izq', 'es_hoja', 'valor')}
+    arrays['hijos'] = np.concatenate([t['hijos'] + d for t, d in zip(tablas, inicio)])
+    arrays['raices'] = np.concatenate([t['raices'] + d for t, d in zip(tablas, inicio)]).astype(np.intp)
+    return ModeloCompilado(
+        arrays, parte=np.repeat(np.arange(len(partes)), arboles_por_parte), n_partes=len(partes),
+        profundidad=max(t['profundidad'] for t in tablas), bases=[t['base'] for t in tablas],
+        enlace=tablas[0]['enlace'], entrada=[p[1] for p in partes], calibradores=[p[2] for p in partes],
+        features=None if features is None else list(features), clasificador=tablas[0]['enlace'] == 'logistica')
+
+# --- EVALUACIÓN ---
+def _sigmoide(z):
+    return 1 / (1 + np.exp(-z))
+
+class ModeloCompilado:
+    def __init__(self, nodos, parte, n_partes, profundidad, bases, enlace, entrada, calibradores, features, clasificador):
+        self.nodos = nodos
+        self.parte = parte.astype(np.int32)
+        self.n_partes = n_partes
+        self.profundidad = profundidad
+        self.bases = np.asarray(bases, float)
+        self.enlace = enlace
+        self.entrada = entrada
+        self.calibradores = calibradores
+        self.features = features
+        self.clasificador = clasificador
+        self.origen_sha256 = None # sha256 del .joblib de sklearn del que sale (lo pone exportar)
+        if clasificador: self.classes_ = np.array([0, 1])
+
+    def __setstate__(self, estado):
+        # Con mmap joblib devuelve np.memmap: la subclase cuesta más que el recorrido de una fila.
+        # np.asarray da una vista ndarray normal sobre la misma memoria mapeada.
+        estado['nodos'] = {k: np.asarray(v) for k, v in estado['nodos'].items()}
+        self.__dict__.update(estado)
+
+    def _matriz(self, X):
+        if isinstance(X, pd.DataFrame):
+            if self.features is not None and list(X.columns) != self.features: X = X[self.features]
+            return X.to_numpy(np.float64)
+        return np.atleast_2d(np.asarray(X, np.float64))
+
+    def _hojas(self, X):
+        """Nodo hoja alcanzado por cada fila en cada árbol: (n_filas, n_árboles)."""
+        n = self.nodos
+        feature, umbral, hijos = n['feature'], n['umbral'], n['hijos']
+        hay_nan = np.isnan(X).any()
+        # Índices planos sobre X: fila * n_features + feature (un solo take por paso)
+        X_plano, filas = X.ravel(), np.arange(len(X))[:, None] * X.shape[1]
+        nodo = np.broadcast_to(n['raices'], (len(X), len(n['raices'])))
+        for _ in range(self.profundidad):
+            x = X_plano.take(filas + feature.take(nodo))
+            derecha = x > umbral.take(nodo)   # NaN > umbral es False
+            if hay_nan: derecha |= np.isnan(x) & ~n['faltante_izq'].take(nodo)
+            nodo = hijos[nodo, derecha.view(np.uint8)]
+        return nodo
+
+    def puntuar_crudo(self, X):
+        """Score crudo de cada ensemble (base + suma de hojas): (n_filas, n_partes)."""
+        X = self._matriz(X)
+        crudo = np.empty((len(X), self.n_partes))
+        for i in range(0, len(X), FILAS_POR_BLOQUE):
+            valores = self.nodos['valor'].take(self._hojas(X[i:i + FILAS_POR_BLOQUE]))
+            if self.n_partes == 1:
+                crudo[i:i + FILAS_POR_BLOQUE, 0] = valores.sum(axis=1)
+            else:
+                crudo[i:i + FILAS_POR_BLOQUE] = np.stack([valores[:, self.parte == k].sum(axis=1)
+                                                          for k in range(self.n_partes)], axis=1)
+        return crudo + self.bases
+
+    def predict(self, X):
+        if not self.clasificador: return self.puntuar_crudo(X)[:, 0]
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+    def predict_proba(self, X):
+        crudo = self.puntuar_crudo(X)
+        p = np.empty_like(crudo)
+        for k, (entrada, cal) in enumerate(zip(self.entrada, self.calibradores)):
+            z = _sigmoide(crudo[:, k]) if entrada == 'proba' else crudo[:, k]
+            if cal is None: p[:, k] = z
+            elif cal['tipo'] == 'isotonica': p[:, k] = np.interp(z, cal['x'], cal['y'])
+            else: p[:, k] = _sigmoide(-(cal['a'] * z + cal['b']))
+        p = p.mean(axis=1)
+        return np.c_[1 - p, p]
+
+# --- PARIDAD ---
+def muestra_paridad(compilado, n=FILAS_PARIDAD, seed=42):
+    """Filas que pasan por todas las ramas: cada feature toma umbrales de los árboles (justo
+    en el corte, un poco por encima o por debajo) y a veces NaN."""
+    rng = np.random.default_rng(seed)
+    nodos, n_features = compilado.nodos, len(compilado.features or []) or int(compilado.nodos['feature'].max()) + 1
+    X = rng.normal(size=(n, n_features))
+    internos = ~nodos['es_hoja']
+    for f in range(n_features):
+        umbrales = nodos['umbral'][internos & (nodos['feature'] == f)]
+        if len(umbrales) == 0: continue
+        X[:, f] = rng.choice(umbrales, n) + rng.choice([-1e-6, 0.0, 1e-6], n) * np.maximum(1, np.abs(umbrales).max())
+    X[rng.random(X.shape) < 0.02] = np.nan
+    return pd.DataFrame(X, columns=compilado.features) if compilado.features else X
+
+def comprobar_paridad(modelo, compilado, X, tolerancia=TOLERANCIA_PARIDAD):
+    """Máxima diferencia absoluta frente a sklearn. Lanza ValueError si supera la tolerancia."""
+    if compilado.clasificador:
+        dif = np.abs(modelo.predict_proba(X)[:, 1] - compilado.predict_proba(X)[:, 1]).max()
+    else:
+        dif = np.abs(modelo.predict(X) - compilado.predict(X)).max()
+    if not dif <= tolerancia:
+        raise ValueError(f"Paridad rota: diferencia máxima {dif:.2e} > {tolerancia:.0e}")
+    return float(dif)
+
+def exportar(ruta_modelo, ruta_compilado=None):
+    ruta_compilado = ruta_compilado or COMPILADOS[ruta_modelo]
+    modelo = cargar(ruta_modelo, mmap=False)
+    with medir("compilar"):
+        compilado = compilar(modelo)
+    with medir("paridad"):
+        dif = comprobar_paridad(modelo, compilado, muestra_paridad(compilado))
+    compilado.origen_sha256 = hash_archivo(ruta_modelo)
+    guardar(compilado, ruta_compilado)
+    print(f"✅ {ruta_compilado}: {len(compilado.nodos['raices'])} árboles, {len(compilado.nodos['valor'])} nodos "
+          f"| paridad {dif:.1e} | {os.path.getsize(ruta_modelo) / 1e6:.2f} MB -> {os.path.getsize(ruta_compilado) / 1e6:.2f} MB")
+    return compilado
+
+def compilar_tenis(*_):
+    """Etapa del pipeline (tras el entrenamiento)."""
+    print("--- ⚙️ COMPILANDO MODELO TENIS ---")
+    return exportar('modelo_calibrado.joblib')
+
+def compilar_nba(*_):
+    print("--- ⚙️ COMPILANDO MODELOS NBA ---")
+    return exportar('nba_model_win.joblib'), exportar('nba_model_pts.joblib')
+
+def cargar_modelo(ruta_modelo, mmap=True, resolver=None):
+    """El compilado si sale de este mismo modelo (sha256 del .joblib de sklearn guardado al exportar);
+    si no, el de sklearn. Por contenido y no por mtime: en el almacén de artefactos los mtime son el
+    orden de descarga. `resolver`: nombre lógico -> ruta real (p.ej. almacen_artefactos.ruta_artefacto)."""
+    resolver = resolver or (lambda r: r)
+    ruta_compilado = resolver(COMPILADOS[ruta_modelo]) if ruta_modelo in COMPILADOS else None
+    ruta_modelo = resolver(ruta_modelo)
+    if ruta_compilado and os.path.exists(ruta_compilado):
+        compilado = cargar(ruta_compilado, mmap)
+        # Compilados de antes de guardar el origen: no se sabe de qué modelo salen -> sklearn
+        if getattr(compilado, 'origen_sha256', None) == hash_archivo(ruta_modelo): return compilado
+    return cargar(ruta_modelo, mmap)
+
+if __name__ == "__main__":
+    # Importado por su nombre: el pickle tiene que apuntar a compilador_modelos.ModeloCompilado, no a __main__
+    import compilador_modelos
+    for ruta in (sys.argv[1:] or [r for r in COMPILADOS if os.path.exists(r)]):
+        compilador_modelos.exportar(ruta)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from artefactos import cargar
+from simulador import LIMITES_SAQUE
+
+# ==============================================================================
+#          CONSULTA DE LOS RATINGS DE SAQUE / RESTO (SIN SCIPY, PARA LA APP)
+# ==============================================================================
+# ratings_saque.py ajusta los ratings cada noche (scipy.sparse + gradiente conjugado); aquí solo
+# se leen. La app importa este módulo y no aquel: el arranque no paga scipy ni crear_ia.
+
+ARCHIVO_RATINGS = "ratings_saque.joblib"
+
+def cargar_ratings(ruta=ARCHIVO_RATINGS):
+    r = cargar(ruta, mmap=False)
+    r['posicion'] = {j: k for k, j in enumerate(r['jugadores'])}
+    return r
+
+def efectos(r, jugador, superficie):
+    """(saque, resto) del jugador en esa superficie; 0 (la media) si no tiene ratings."""
+    k = r['posicion'].get(jugador)
+    if k is None: return 0.0, 0.0
+    s = r['superficies'].index(superficie) if superficie in r['superficies'] else 0
+    return r['saque'][k] + r['saque_sup'][k, s], r['resto'][k] + r['resto_sup'][k, s]
+
+def prob_saque_ajustada(r, servidor, restador, superficie):
+    """% de puntos ganados al saque esperado para `servidor` contra `restador`, ya corregido por calendario."""
+    s = r['superficies'].index(superficie) if superficie in r['superficies'] else 0
+    return float(np.clip(r['mu'][s] + efectos(r, servidor, superficie)[0] - efectos(r, restador, superficie)[1], *LIMITES_SAQUE))
+
+def tabla(r):
+    """Un DataFrame por jugador: efectos generales y por superficie + puntos efectivos detrás."""
+    t = pd.DataFrame({'jugador': r['jugadores'], 'saque': r['saque'], 'resto': r['resto'], 'puntos_efectivos': r['puntos_efectivos']})
+    for k, s in enumerate(r['superficies']):
+        t[f'saque_{s}'] = r['saque'] + r['saque_sup'][:, k]
+        t[f'resto_{s}'] = r['resto'] + r['resto_sup'][:, k]
+    return t
@@ -2,7 +2,11 @@ import pandas as pd
 import numpy as np
 import re
 
+from pipeline import medir
+from inferencia import COLS_SUPERFICIE
+
 NOMBRE_ARCHIVO = "atp_tennis.csv"
+ARCHIVO_SALIDA = "atp_matches_procesados.csv"
 K_FACTOR = 32
 START_ELO = 1500
 
@@ -32,77 +36,143 @@ def calcular_elo_optimizado(df):
 
 def safe_div(a, b): return np.where(b > 0, a / b, 0)
 
-print(f"--- 1. Ingeniería de Datos Quant (Stats Reales) ---")
-df = pd.read_csv(NOMBRE_ARCHIVO)
-df['Date'] = pd.to_datetime(df['Date'])
-df = df.sort_values(by='Date')
-
-# Limpieza y Nulos
-cols_stats = ['P1_SvPt', 'P1_1stIn', 'P1_1stWon', 'P1_2ndWon', 'P2_SvPt', 'P2_1stIn', 'P2_1stWon', 'P2_2ndWon']
-for c in cols_stats:
-    if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
-    else: df[c] = 0
+def preparar_stats(df):
+    cols_stats = ['P1_SvPt', 'P1_1stIn', 'P1_1stWon', 'P1_2ndWon', 'P2_SvPt', 'P2_1stIn', 'P2_1stWon', 'P2_2ndWon']
+    for c in cols_stats:
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+        else: df[c] = 0
 
-df = calcular_elo_optimizado(df)
-col_score = 'Score' if 'Score' in df.columns else 'score'
-df['total_games'] = df[col_score].apply(calcular_juegos)
+    # --- ESTADÍSTICAS REALES DE SAQUE/RESTO ---
+    # Calculamos % de puntos ganados al saque (Serve Points Won)
+    df['P1_SrvPtsWon'] = df['P1_1stWon'] + df['P1_2ndWon']
+    df['P2_SrvPtsWon'] = df['P2_1stWon'] + df['P2_2ndWon']
 
-# --- ESTADÍSTICAS REALES DE SAQUE/RESTO ---
-# Calculamos % de puntos ganados al saque (Serve Points Won)
-df['P1_SrvPtsWon'] = df['P1_1stWon'] + df['P1_2ndWon']
-df['P2_SrvPtsWon'] = df['P2_1stWon'] + df['P2_2ndWon']
+    df['P1_Serve_Pct'] = safe_div(df['P1_SrvPtsWon'], df['P1_SvPt'])
+    df['P2_Serve_Pct'] = safe_div(df['P2_SrvPtsWon'], df['P2_SvPt'])
 
-df['P1_Serve_Pct'] = safe_div(df['P1_SrvPtsWon'], df['P1_SvPt'])
-df['P2_Serve_Pct'] = safe_div(df['P2_SrvPtsWon'], df['P2_SvPt'])
-
-# Calculamos % de puntos ganados al resto (Return Points Won)
-# Puntos Resto Ganados = Puntos Saque del Rival Totales - Puntos Saque del Rival Ganados
-df['P1_Rtn_Pct'] = 1 - df['P2_Serve_Pct']
-df['P2_Rtn_Pct'] = 1 - df['P1_Serve_Pct']
+    # Calculamos % de puntos ganados al resto (Return Points Won)
+    # Puntos Resto Ganados = Puntos Saque del Rival Totales - Puntos Saque del Rival Ganados
+    df['P1_Rtn_Pct'] = 1 - df['P2_Serve_Pct']
+    df['P2_Rtn_Pct'] = 1 - df['P1_Serve_Pct']
+    return df
 
 # --- DUPLICACIÓN ---
-cols_p1 = ['Player_1', 'Rank_1', 'elo_1', 'P1_Serve_Pct', 'P1_Rtn_Pct']
-cols_p2 = ['Player_2', 'Rank_2', 'elo_2', 'P2_Serve_Pct', 'P2_Rtn_Pct']
-
-rn_p1 = {'Player_1': 'player_name', 'Rank_1': 'player_rank', 'elo_1': 'player_elo', 'P1_Serve_Pct': 'stats_serve', 'P1_Rtn_Pct': 'stats_return'}
-rn_p2 = {'Player_2': 'player_name', 'Rank_2': 'player_rank', 'elo_2': 'player_elo', 'P2_Serve_Pct': 'stats_serve', 'P2_Rtn_Pct': 'stats_return'}
-
-df_1 = df.copy()
-df_1.rename(columns=rn_p1, inplace=True)
-df_1['opponent_name'] = df['Player_2']
-df_1['opponent_rank'] = df['Rank_2']
-df_1['opponent_elo'] = df['elo_2']
-df_1['result'] = 1
-
-df_2 = df.copy()
-df_2.rename(columns=rn_p2, inplace=True)
-df_2['opponent_name'] = df['Player_1']
-df_2['opponent_rank'] = df['Rank_1']
-df_2['opponent_elo'] = df['elo_1']
-df_2['result'] = 0
-
-df_full = pd.concat([df_1, df_2], ignore_index=True).sort_values(by='Date')
+def duplicar_por_jugador(df):
+    """Formato largo: una fila por jugador y partido (ganador result=1, perdedor result=0).
+    Cada partido lleva su match_id y side (0/1) y sus dos filas quedan contiguas."""
+    df = df.reset_index(drop=True)
+    rn_p1 = {'Player_1': 'player_name', 'Rank_1': 'player_rank', 'elo_1': 'player_elo', 'P1_Serve_Pct': 'stats_serve', 'P1_Rtn_Pct': 'stats_return'}
+    rn_p2 = {'Player_2': 'player_name', 'Rank_2': 'player_rank', 'elo_2': 'player_elo', 'P2_Serve_Pct': 'stats_serve', 'P2_Rtn_Pct': 'stats_return'}
+
+    df_1 = df.copy()
+    df_1.rename(columns=rn_p1, inplace=True)
+    df_1['opponent_name'] = df['Player_2']
+    df_1['opponent_rank'] = df['Rank_2']
+    df_1['opponent_elo'] = df['elo_2']
+    df_1['result'] = 1
+    df_1['match_id'] = df.index
+    df_1['side'] = 0
+
+    df_2 = df.copy()
+    df_2.rename(columns=rn_p2, inplace=True)
+    df_2['opponent_name'] = df['Player_1']
+    df_2['opponent_rank'] = df['Rank_1']
+    df_2['opponent_elo'] = df['elo_1']
+    df_2['result'] = 0
+    df_2['match_id'] = df.index
+    df_2['side'] = 1
+
+    # match_id sigue el orden cronológico de df: ordenar por (match_id, side) mantiene las fechas
+    return pd.concat([df_1, df_2], ignore_index=True).sort_values(['match_id', 'side'], kind='stable')
 
 # --- EWMA (Medias Móviles) ---
-def get_ewma(col, span=20):
+def get_ewma(df_full, col, span=20):
     return df_full.groupby('player_name')[col].transform(lambda x: x.shift(1).ewm(span=span, adjust=False).mean()).fillna(0.60) # Default tenis 60%
 
-df_full['ewma_form'] = df_full.groupby('player_name')['result'].transform(lambda x: x.shift(1).ewm(span=5).mean()).fillna(0.5)
-df_full['ewma_serve'] = get_ewma('stats_serve', span=30) # Estabilidad al saque
-df_full['ewma_return'] = get_ewma('stats_return', span=30) # Calidad de resto
-df_full['ewma_surface'] = df_full.groupby(['player_name', 'Surface'])['result'].transform(lambda x: x.shift(1).ewm(span=15).mean()).fillna(0.5)
-
-# Fatiga
-df_full['last_match'] = df_full.groupby('player_name')['Date'].shift(1)
-df_full['days_rest'] = (df_full['Date'] - df_full['last_match']).dt.days.fillna(10).clip(upper=30)
-
-cols_final = [
-    'Date', 'Surface', 'Best of', 'player_name', 'opponent_name',
-    'player_rank', 'player_elo', 'opponent_rank', 'opponent_elo',
-    'ewma_form', 'ewma_serve', 'ewma_return', 'ewma_surface', 'days_rest',
-    'result', 'total_games'
-]
-
-df_final = df_full[cols_final].fillna(0)
-df_final.to_csv("atp_matches_procesados.csv", index=False)
-print(f"✅ Datos procesados (Saque/Resto Real): {len(df_final)} registros.")
\ No newline at end of file
+# --- INCERTIDUMBRE DE LAS EWMA ---
+# Un jugador con 5 partidos y otro con 500 tienen una EWMA igual de "firme" a ojos del simulador.
+# Se exporta cuánta información hay detrás de cada media: tamaño muestral efectivo de la EWMA
+# (con pesos w: n_eff = (Σw)² / Σw²) y desviación típica del nivel real del jugador (normal-normal:
+# previa = dispersión entre jugadores, cada partido efectivo aporta la varianza partido a partido).
+def n_efectivo(previos, span, adjust=True):
+    """n_eff de una EWMA de pandas sobre `previos` observaciones (0 si aún no hay ninguna)."""
+    r = 1 - 2 / (span + 1)
+    k = np.asarray(previos, dtype=float)
+    m = np.maximum(k, 1)
+    if adjust: # Pesos r^i, i < k
+        s1, s2 = (1 - r**m) / (1 - r), (1 - r**(2*m)) / (1 - r**2)
+    else: # adjust=False: la primera observación arrastra r^(k-1) y el resto (1-r)·r^j
+        s1, s2 = 1.0, r**(2*(m-1)) + (1-r)**2 * (1 - r**(2*(m-1))) / (1 - r**2)
+    return np.where(k > 0, s1**2 / s2, 0.0)
+
+def varianzas(df, entidad, col, validos, min_partidos=20):
+    """(varianza partido a partido dentro de cada entidad, varianza entre entidades) de `col`."""
+    v = df.loc[validos, [entidad, col]]
+    var_partido = (v[col] - v.groupby(entidad)[col].transform('mean')).var()
+    medias = v.groupby(entidad)[col].agg(['mean', 'size'])
+    veteranas = medias['size'] >= min_partidos
+    var_entidades = medias.loc[veteranas if veteranas.sum() > 1 else medias.index, 'mean'].var()
+    return var_partido, var_entidades
+
+def sd_posterior(n_eff, var_partido, var_entidades):
+    var_partido, var_entidades = max(var_partido, 1e-12), max(var_entidades, 1e-12) # Datos constantes -> sd ~0
+    return np.sqrt(1 / (1 / var_entidades + np.asarray(n_eff) / var_partido))
+
+def calcular_ewma_tenis(df_full):
+    df_full['ewma_form'] = df_full.groupby('player_name')['result'].transform(lambda x: x.shift(1).ewm(span=5).mean()).fillna(0.5)
+    df_full['ewma_serve'] = get_ewma(df_full, 'stats_serve', span=30) # Estabilidad al saque
+    df_full['ewma_return'] = get_ewma(df_full, 'stats_return', span=30) # Calidad de resto
+    df_full['ewma_surface'] = df_full.groupby(['player_name', 'Surface'])['result'].transform(lambda x: x.shift(1).ewm(span=15).mean()).fillna(0.5)
+    # La misma EWMA arrastrada por superficie: en cada fila, la del último partido del jugador en esa
+    # superficie. La última fila de cada jugador (db_players) lleva así su forma en las tres
+    for sup, col in COLS_SUPERFICIE.items():
+        df_full[col] = df_full['ewma_surface'].where(df_full['Surface'] == sup)
+        df_full[col] = df_full.groupby('player_name')[col].ffill().fillna(0.5)
+
+    # Incertidumbre de saque / resto (mismos partidos previos que la EWMA; sin stats -> fuera de las varianzas)
+    df_full['n_eff'] = n_efectivo(df_full.groupby('player_name').cumcount(), span=30, adjust=False)
+    validos = df_full['stats_serve'].between(0, 1, inclusive='neither') & df_full['stats_return'].between(0, 1, inclusive='neither')
+    for col, sd in [('stats_serve', 'sd_serve'), ('stats_return', 'sd_return')]:
+        df_full[sd] = sd_posterior(df_full['n_eff'], *varianzas(df_full, 'player_name', col, validos))
+
+    # Fatiga
+    df_full['last_match'] = df_full.groupby('player_name')['Date'].shift(1)
+    df_full['days_rest'] = (df_full['Date'] - df_full['last_match']).dt.days.fillna(10).clip(upper=30)
+    return df_full
+
+def procesar_tenis(df=None):
+    """Elo + EWMA + stats reales. Acepta el DataFrame de la descarga en memoria (o lee el CSV)."""
+    print(f"--- 1. Ingeniería de Datos Quant (Stats Reales) ---")
+    if df is None:
+        df = pd.read_csv(NOMBRE_ARCHIVO)
+    else:
+        df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(by='Date', kind='stable')
+
+    # Limpieza y Nulos
+    df = preparar_stats(df)
+
+    with medir("elo"):
+        df = calcular_elo_optimizado(df)
+    col_score = 'Score' if 'Score' in df.columns else 'score'
+    df['total_games'] = df[col_score].apply(calcular_juegos)
+
+    df_full = duplicar_por_jugador(df)
+    with medir("ewma"):
+        df_full = calcular_ewma_tenis(df_full)
+
+    cols_final = [
+        'match_id', 'side', 'Date', 'Surface', 'Best of', 'player_name', 'opponent_name',
+        'player_rank', 'player_elo', 'opponent_rank', 'opponent_elo',
+        'ewma_form', 'ewma_serve', 'ewma_return', 'ewma_surface', *COLS_SUPERFICIE.values(), 'days_rest',
+        'n_eff', 'sd_serve', 'sd_return', 'result', 'total_games'
+    ]
+
+    df_final = df_full[cols_final].fillna(0)
+    df_final.to_csv(ARCHIVO_SALIDA, index=False)
+    print(f"✅ Datos procesados (Saque/Resto Real): {len(df_final)} registros.")
+    return df_final
+
+if __name__ == "__main__":
+    procesar_tenis()
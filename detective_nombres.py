@@ -1,32 +1,28 @@
-import pandas as pd
+from indice_nombres import cargar_indice, buscar
 
 ARCHIVO = "atp_tennis.csv"
 
 print(f"--- BUSCANDO EN {ARCHIVO} ---")
 
 try:
-    # Cargamos solo las columnas de nombres para ir rápido
-    df = pd.read_csv(ARCHIVO, usecols=['Player_1', 'Player_2'])
+    # Índice de nombres (nombre corto + nombre completo de TML como alias)
+    indice = cargar_indice(csv=ARCHIVO)
     
-    print(f"Base de datos cargada: {len(df)} partidos.")
+    print(f"Base de datos cargada: {len(indice['nombres'])} jugadores.")
     
     while True:
         texto = input("\nEscribe parte del nombre (ej: Gima): ").strip().lower()
         if texto == "salir": break
         
-        # Buscamos en ambas columnas
-        # .str.contains(..., case=False) busca sin importar mayúsculas/minúsculas
-        resultados_1 = df[df['Player_1'].str.lower().str.contains(texto, na=False)]['Player_1'].unique()
-        resultados_2 = df[df['Player_2'].str.lower().str.contains(texto, na=False)]['Player_2'].unique()
-        
-        # Unimos y limpiamos
-        todos = set(list(resultados_1) + list(resultados_2))
+        # Busca por prefijo, subcadena o con erratas, sin importar mayúsculas ni acentos
+        todos = buscar(indice, texto, limite=25)
         
         if todos:
-            print(f"\n✅ HE ENCONTRADO ESTOS NOMBRES QUE CONTIENEN '{texto}':")
+            print(f"\n✅ HE ENCONTRADO ESTOS NOMBRES PARECIDOS A '{texto}':")
             print("------------------------------------------------")
             for nombre in todos:
-                print(f" -> {nombre}")
+                alias = indice['alias'].get(nombre)
+                print(f" -> {nombre}" + (f"   ({', '.join(alias)})" if alias else ""))
             print("------------------------------------------------")
             print("Prueba a buscar EXACTAMENTE ese nombre en tu web.")
         else:
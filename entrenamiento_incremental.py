@@ -0,0 +1,135 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.isotonic import IsotonicRegression
+
+from pipeline import rss_pico_mb
+from artefactos import escribir_atomico
+
+# ==============================================================================
+#          RE-ENTRENAMIENTO INCREMENTAL (WARM START + CALIBRACIÓN EN HOLDOUT)
+# ==============================================================================
+# Cada noche solo entra un día de partidos. En vez de reajustar todo desde cero:
+#   1. Antes de entrenar, el modelo base de ayer predice los partidos nuevos: son predicciones
+#      fuera de muestra de verdad. Se guardan en una caché (ventana móvil = holdout de calibración).
+#   2. Se siguen añadiendo árboles al modelo de ayer (warm start) con los datos de hoy.
+#   3. La isotónica se reajusta UNA vez sobre la caché (milisegundos), sin los 3 fits de cv=3.
+# Refit completo solo si toca por calendario, si cambian las features, si el modelo ha crecido
+# demasiado o si hay deriva (PSI de las features o Brier de los partidos nuevos).
+# Nota: sklearn recalcula los bins de las features en cada fit con warm start; con un día más de
+# datos apenas se mueven, y el refit semanal / por deriva lo corrige del todo.
+
+ARBOLES_POR_NOCHE = 20
+MAX_ARBOLES_EXTRA = 200     # árboles añadidos desde el último refit completo antes de forzar otro
+DIAS_REFIT_COMPLETO = 7
+FRACCION_HOLDOUT = 0.10     # en el refit completo: últimos partidos para calibrar y medir
+VENTANA_CALIBRACION = 20000 # predicciones fuera de muestra que se guardan para la isotónica
+UMBRAL_PSI = 0.25           # > 0.25 = cambio de distribución importante (regla habitual)
+MARGEN_BRIER = 0.015
+MIN_FILAS_DERIVA = 200      # con menos partidos nuevos el PSI / Brier son solo ruido
+N_CORTES_PSI = 10
+MAX_HISTORIAL = 60
+
+class ModeloCalibrado:
+    """Modelo base + isotónica ajustada en el holdout. Misma interfaz que CalibratedClassifierCV
+    (predict_proba), así que inferencia, matriz y app no cambian."""
+    def __init__(self, base, isotonica):
+        self.base = base
+        self.isotonica = isotonica
+        self.classes_ = base.classes_
+
+    def predict_proba(self, X):
+        p = self.isotonica.predict(self.base.predict_proba(X)[:, 1])
+        return np.c_[1 - p, p]
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+def calibrar(p, y):
+    return IsotonicRegression(y_min=0, y_max=1, out_of_bounds='clip').fit(np.asarray(p, float), np.asarray(y, float))
+
+def brier_calibrado_fuera(p, y):
+    """Brier de la isotónica sin mirarse a sí misma: se ajusta en una mitad del holdout y se mide en la otra."""
+    p, y = np.asarray(p, float), np.asarray(y, float)
+    mitad = len(p) // 2
+    if mitad < 50: return float(np.mean((p - y) ** 2))
+    return float(np.mean((calibrar(p[:mitad], y[:mitad]).predict(p[mitad:]) - y[mitad:]) ** 2))
+
+# --- CONTINUAR BOOSTING ---
+def ampliar(modelo, X, y, arboles=ARBOLES_POR_NOCHE):
+    """Warm start: `arboles` árboles más sobre los datos de hoy (sin early stopping: pararía en el 1º)."""
+    modelo.set_params(warm_start=True, early_stopping=False, max_iter=modelo.n_iter_ + arboles)
+    modelo.fit(X, y)
+    return modelo
+
+# --- DERIVA ---
+def referencia_psi(X):
+    """Cortes por cuantiles de cada feature continua y proporción de filas en cada tramo.
+    Las discretas (superficie, 'Best of', local) cambian con el calendario, no por deriva: fuera."""
+    ref = {}
+    for c in X.columns:
+        v = pd.to_numeric(X[c], errors='coerce').to_numpy(float)
+        if len(np.unique(v[~np.isnan(v)])) <= N_CORTES_PSI: continue
+        cortes = np.unique(np.nanquantile(v, np.linspace(0, 1, N_CORTES_PSI + 1)[1:-1]))
+        ref[c] = {'cortes': cortes.tolist(), 'proporciones': (np.bincount(np.searchsorted(cortes, v, side='right'),
+                                                                           minlength=len(cortes) + 1) / len(v)).tolist()}
+    return ref
+
+def psi(referencia, X):
+    """Population Stability Index de cada feature frente a la referencia del último refit completo."""
+    res = {}
+    for c, ref in referencia.items():
+        if c not in X.columns: continue
+        v = pd.to_numeric(X[c], errors='coerce').to_numpy(float)
+        cortes = np.asarray(ref['cortes'])
+        actual = np.bincount(np.searchsorted(cortes, v, side='right'), minlength=len(cortes) + 1) / len(v)
+        esperado = np.clip(np.asarray(ref['proporciones']), 1e-4, None)
+        actual = np.clip(actual, 1e-4, None)
+        res[c] = float(np.sum((actual - esperado) * np.log(actual / esperado)))
+    return res
+
+def motivo_refit(estado, features, X_nuevo, brier_nuevo, arboles_extra, hoy=None):
+    """Por qué toca refit completo esta noche (None = basta con el incremental)."""
+    hoy = pd.Timestamp.today().normalize() if hoy is None else hoy
+    if not estado: return "sin estado previo"
+    if list(features) != estado.get('features'): return "cambió el esquema de features"
+    dias = (hoy - pd.Timestamp(estado['ultimo_completo'])).days
+    if dias >= DIAS_REFIT_COMPLETO: return f"refit programado ({dias} días desde el último)"
+    if arboles_extra + ARBOLES_POR_NOCHE > MAX_ARBOLES_EXTRA: return f"modelo demasiado grande (+{arboles_extra} árboles)"
+    if len(X_nuevo) >= MIN_FILAS_DERIVA:
+        valores = psi(estado['referencia_psi'], X_nuevo)
+        peor = max(valores, key=valores.get)
+        if valores[peor] > UMBRAL_PSI: return f"deriva en {peor} (PSI {valores[peor]:.2f})"
+        if brier_nuevo is not None and brier_nuevo > estado['brier_referencia'] + MARGEN_BRIER:
+            return f"deriva de Brier ({brier_nuevo:.4f} vs {estado['brier_referencia']:.4f})"
+    return None
+
+# --- ESTADO Y CACHÉ ---
+def cargar_estado(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_estado(estado, ruta):
+    def escribir(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(estado, f, indent=2, ensure_ascii=False)
+    escribir_atomico(ruta, escribir)
+
+def ampliar_cache(cache, fechas, p, y, ventana=VENTANA_CALIBRACION):
+    """Añade predicciones fuera de muestra y se queda con las `ventana` más recientes."""
+    nuevo = {'fecha': np.asarray(pd.to_datetime(fechas), dtype='datetime64[D]'),
+             'p': np.asarray(p, dtype=np.float32), 'y': np.asarray(y, dtype=np.int8)}
+    if cache:
+        nuevo = {k: np.concatenate([np.asarray(cache[k]), v]) for k, v in nuevo.items()}
+    return {k: v[-ventana:] for k, v in nuevo.items()}
+
+def registrar_noche(estado, modo, motivo, inicio, **extra):
+    """Tiempo y pico de memoria del entrenamiento de esta noche (también al historial del estado)."""
+    segundos, memoria = round(time.time() - inicio, 2), rss_pico_mb()
+    print(f"⏱️ Entrenamiento {modo}{f' ({motivo})' if motivo else ''}: {segundos:.1f}s | pico memoria {memoria} MB")
+    registro = {'fecha': pd.Timestamp.now().isoformat(timespec='seconds'), 'modo': modo, 'motivo': motivo,
+                'segundos': segundos, 'memoria_mb': memoria, **extra}
+    estado['historial'] = (estado.get('historial', []) + [registro])[-MAX_HISTORIAL:]
+    return estado
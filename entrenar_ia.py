@@ -1,78 +1,254 @@
 import os
-os.environ['LOKY_MAX_CPU_COUNT'] = '1'
+import sys
+import json
+import time
+# Evita el aviso de loky en Windows sin limitar a 1 núcleo (antes forzábamos '1')
+os.environ.setdefault('LOKY_MAX_CPU_COUNT', str(os.cpu_count() or 1))
 import pandas as pd
 import numpy as np
-import joblib
+from joblib import Parallel, delayed, parallel_config
 from sklearn.ensemble import HistGradientBoostingClassifier
-from sklearn.calibration import CalibratedClassifierCV
+from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import brier_score_loss, accuracy_score
 
-print("--- ENTRENAMIENTO QUANT (CALIBRADO) ---")
-
-df = pd.read_csv("atp_matches_procesados.csv")
-df['Date'] = pd.to_datetime(df['Date'])
-df = df.sort_values(by='Date')
+from pipeline import medir
+from inferencia import COLS_SUPERFICIE
+from artefactos import guardar, cargar
+from entrenamiento_incremental import (ModeloCalibrado, calibrar, brier_calibrado_fuera, ampliar, referencia_psi,
+                                       motivo_refit, cargar_estado, guardar_estado, ampliar_cache, registrar_noche,
+                                       FRACCION_HOLDOUT, ARBOLES_POR_NOCHE)
+
+ARCHIVO_PROCESADO = "atp_matches_procesados.csv"
+ARCHIVO_HIPERPARAMETROS = "hiperparametros_tenis.json"
+# Incremental: modelo base (sin calibrar), predicciones fuera de muestra y estado entre noches
+ARCHIVO_BASE = "modelo_base_tenis.joblib"
+ARCHIVO_CACHE = "cache_predicciones_tenis.joblib"
+ARCHIVO_ESTADO = "estado_entrenamiento_tenis.json"
+
+# Configuración histórica (modo --fijo)
+PARAMS_FIJOS = {'learning_rate': 0.05, 'max_iter': 300, 'max_depth': 5, 'l2_regularization': 1}
+
+# --- BÚSQUEDA DE HIPERPARÁMETROS (SUCCESSIVE HALVING) ---
+# Presupuesto de reloj para la búsqueda: lo que tardaban los 3 fits secuenciales de antes
+# en el runner de GitHub. Con los folds de calibración en paralelo el total queda igual.
+PRESUPUESTO_BUSQUEDA_S = float(os.environ.get("PRESUPUESTO_BUSQUEDA_S", 20))
+ESPACIO_BUSQUEDA = {
+    'learning_rate': [0.03, 0.05, 0.08, 0.12],
+    'max_depth': [3, 4, 5, 6, None],
+    'max_leaf_nodes': [15, 31, 63],
+    'l2_regularization': [0.0, 0.5, 1.0, 3.0],
+    'min_samples_leaf': [20, 50, 100],
+}
+
+def muestrear_candidatos(n, seed=42):
+    rng = np.random.default_rng(seed)
+    candidatos = [{k: v[rng.integers(len(v))] for k, v in ESPACIO_BUSQUEDA.items()} for _ in range(n)]
+    candidatos[0] = {**candidatos[0], **{k: v for k, v in PARAMS_FIJOS.items() if k in ESPACIO_BUSQUEDA}}
+    return candidatos
+
+def evaluar_candidato(params, X, y, n_splits=2):
+    """Validación temporal (TimeSeriesSplit): entrena en el pasado y puntúa (Brier) en el futuro.
+    Early stopping decide el nº de árboles; devolvemos la media para fijar max_iter en el refit."""
+    briers, iters = [], []
+    for idx_tr, idx_va in TimeSeriesSplit(n_splits=n_splits).split(X):
+        m = HistGradientBoostingClassifier(max_iter=500, early_stopping=True, n_iter_no_change=10,
+                                           validation_fraction=0.1, random_state=42, **params)
+        m.fit(X.iloc[idx_tr], y.iloc[idx_tr])
+        briers.append(brier_score_loss(y.iloc[idx_va], m.predict_proba(X.iloc[idx_va])[:, 1]))
+        iters.append(m.n_iter_)
+    return float(np.mean(briers)), int(np.mean(iters))
+
+def busqueda_halving(X, y, n_candidatos=None, factor=2, presupuesto_s=PRESUPUESTO_BUSQUEDA_S, n_jobs=-1):
+    """Successive halving con los partidos más recientes como recurso: empieza con pocas filas y
+    muchos candidatos, y en cada ronda se queda con 1/factor y multiplica las filas por factor.
+    Así cada ronda cuesta lo mismo que la anterior, y no se lanza una ronda que no cabe en el presupuesto."""
+    start = time.time()
+    # Tantos candidatos como quepan en paralelo en la primera ronda (4 por núcleo, máx. 16)
+    n_candidatos = n_candidatos or int(min(16, 4 * (os.cpu_count() or 1)))
+    candidatos = muestrear_candidatos(n_candidatos)
+    rondas = int(np.ceil(np.log(n_candidatos) / np.log(factor)))
+    n_filas = max(len(X) // factor ** rondas, 2000)
+    mejor = (np.inf, PARAMS_FIJOS['max_iter'], candidatos[0])
+
+    while candidatos:
+        t_ronda = time.time()
+        Xr, yr = X.iloc[-n_filas:], y.iloc[-n_filas:]
+        # Un hilo OpenMP por worker para no sobresuscribir la CPU
+        with parallel_config(backend='loky', inner_max_num_threads=1):
+            res = Parallel(n_jobs=n_jobs)(delayed(evaluar_candidato)(c, Xr, yr) for c in candidatos)
+        orden = np.argsort([b for b, _ in res])
+        mejor = (res[orden[0]][0], res[orden[0]][1], candidatos[orden[0]])
+        print(f"   🔎 Ronda: {len(candidatos):>2} candidatos x {n_filas} filas -> mejor Brier {mejor[0]:.4f} ({time.time()-start:.1f}s)")
+
+        if len(candidatos) == 1 or n_filas >= len(X): break
+        if (time.time() - start) + (time.time() - t_ronda) > presupuesto_s:
+            print("   ⏱️ Presupuesto de búsqueda agotado, nos quedamos con el mejor actual.")
+            break
+        candidatos = [candidatos[i] for i in orden[:max(1, len(candidatos) // factor)]]
+        n_filas = min(len(X), n_filas * factor)
+
+    brier, n_iter, params = mejor
+    # Con más datos en el refit damos algo de margen a los árboles que marcó el early stopping
+    return {**params, 'max_iter': int(n_iter * 1.1) + 1}, brier
+
+def a_json(params):
+    return {k: (None if v is None else float(v) if isinstance(v, float) else int(v)) for k, v in params.items()}
 
 # --- CRUCE DE OPONENTES ---
-cols_stats = ['ewma_form', 'ewma_serve', 'ewma_surface', 'days_rest']
-lookup = df[['Date', 'player_name'] + cols_stats].copy()
-lookup.rename(columns={c: c.replace('player_', 'opponent_').replace('ewma_', 'opp_ewma_').replace('days_', 'opp_days_') 
-                       for c in lookup.columns}, inplace=True)
-
-df = pd.merge(df, lookup, left_on=['Date', 'opponent_name'], right_on=['Date', 'opponent_name'], how='left')
-
-# Delta Features (La clave de la predicción)
-df['delta_elo'] = df['player_elo'] - df['opponent_elo']
-df['delta_form'] = df['ewma_form'] - df['opp_ewma_form']
-df['delta_serve'] = df['ewma_serve'] - df['opp_ewma_serve']
-df['delta_surf'] = df['ewma_surface'] - df['opp_ewma_surface']
-
-df = pd.get_dummies(df, columns=['Surface'], drop_first=True)
-
-features = [
-    'Best of', 'delta_elo', 'delta_form', 'delta_serve', 'delta_surf',
-    'player_elo', 'opponent_elo', 'ewma_serve', 'opp_ewma_serve',
-    'days_rest', 'opp_days_rest'
-] + [c for c in df.columns if 'Surface_' in c]
-
-# Split temporal estricto
-mask_valid = df['delta_elo'].notna() & df['result'].notna()
-df_train = df[mask_valid].copy()
-
-split = int(len(df_train) * 0.90)
-X_train = df_train[features].iloc[:split]
-X_test = df_train[features].iloc[split:]
-y_train = df_train['result'].iloc[:split]
-y_test = df_train['result'].iloc[split:]
-
-# --- MODELO BASE + CALIBRACIÓN ---
-print("🚀 Entrenando y Calibrando Modelo...")
-base_model = HistGradientBoostingClassifier(
-    learning_rate=0.05, max_iter=300, max_depth=5, l2_regularization=1, random_state=42
-)
-
-# CalibratedClassifierCV ajusta las probabilidades para que sean "reales"
-# method='isotonic' es mejor para grandes datasets
-calibrated_model = CalibratedClassifierCV(base_model, method='isotonic', cv=3)
-calibrated_model.fit(X_train, y_train)
-
-# Evaluación Profesional
-probs = calibrated_model.predict_proba(X_test)[:, 1]
-preds = (probs > 0.5).astype(int)
-acc = accuracy_score(y_test, preds)
-brier = brier_score_loss(y_test, probs)
-
-print(f"✅ Accuracy: {acc:.2%}")
-print(f"✅ Brier Score: {brier:.4f} (Objetivo < 0.20 para rentabilidad)")
-
-# Guardado
-joblib.dump(calibrated_model, 'modelo_calibrado.joblib')
-joblib.dump(features, 'features.joblib')
-
-# Base de datos ligera para la APP (último registro por jugador)
-print("💾 Generando DB optimizada...")
-cols_db = ['player_name', 'Date', 'player_rank', 'player_elo', 'ewma_form', 'ewma_serve', 'ewma_return', 'ewma_surface', 'days_rest']
-df_last = df.sort_values('Date').groupby('player_name').tail(1)[cols_db]
-joblib.dump(df_last, 'db_players.joblib')
-
-print("¡Sistema Quant Listo!")
\ No newline at end of file
+def cruzar_oponentes(df):
+    """Features del rival sin merge: cada partido son dos filas contiguas (side 0/1, ver
+    crear_ia.duplicar_por_jugador), así que el rival de una fila es la otra fila de su par."""
+    cols_stats = ['ewma_form', 'ewma_serve', 'ewma_surface', 'days_rest']
+    ids = df['match_id'].to_numpy()
+    if len(ids) % 2 or (ids[0::2] != ids[1::2]).any():
+        df = df.sort_values(['match_id', 'side'], kind='stable')
+        ids = df['match_id'].to_numpy()
+        if len(ids) % 2 or (ids[0::2] != ids[1::2]).any():
+            raise ValueError("Hay partidos sin sus dos filas: vuelve a generar el CSV con crear_ia.py")
+
+    # Intercambio de las dos filas de cada par: O(n), sin tabla hash
+    return df.assign(**{
+        c.replace('ewma_', 'opp_ewma_').replace('days_', 'opp_days_'): df[c].to_numpy().reshape(-1, 2)[:, ::-1].ravel()
+        for c in cols_stats
+    })
+
+def construir_features_tenis(df):
+    """Cruce de oponentes + deltas + dummies de superficie. Devuelve (df, df_train, features)."""
+    with medir("cruce_oponentes"):
+        df = cruzar_oponentes(df)
+
+    # Delta Features (La clave de la predicción)
+    df['delta_elo'] = df['player_elo'] - df['opponent_elo']
+    df['delta_form'] = df['ewma_form'] - df['opp_ewma_form']
+    df['delta_serve'] = df['ewma_serve'] - df['opp_ewma_serve']
+    df['delta_surf'] = df['ewma_surface'] - df['opp_ewma_surface']
+
+    df = pd.get_dummies(df, columns=['Surface'], drop_first=True)
+
+    features = [
+        'Best of', 'delta_elo', 'delta_form', 'delta_serve', 'delta_surf',
+        'player_elo', 'opponent_elo', 'ewma_serve', 'opp_ewma_serve',
+        'days_rest', 'opp_days_rest'
+    ] + [c for c in df.columns if 'Surface_' in c]
+
+    # Filas con features completas
+    mask_valid = df['delta_elo'].notna() & df['result'].notna()
+    df_train = df[mask_valid].copy()
+    return df, df_train, features
+
+def entrenar_tenis(df=None, busqueda=None, modo='auto'):
+    """Entrena y calibra el modelo de tenis. Acepta el DataFrame procesado en memoria (o lee el CSV).
+    modo='auto': incremental (warm start + isotónica sobre la caché de predicciones) salvo que toque
+    refit completo (calendario, deriva, cambio de features). 'completo' lo fuerza.
+    Con busqueda=True el refit completo elige hiperparámetros por successive halving.
+    Por defecto solo se busca si hay 2+ núcleos (en 1 núcleo la búsqueda no cabe en el presupuesto)."""
+    if busqueda is None:
+        busqueda = (os.cpu_count() or 1) >= 2
+    inicio = time.time()
+    print("--- ENTRENAMIENTO QUANT (CALIBRADO) ---")
+
+    if df is None:
+        df = pd.read_csv(ARCHIVO_PROCESADO)
+    else:
+        df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(['match_id', 'side'], kind='stable') # Cronológico y con los dos lados de cada partido juntos
+
+    df, df_train, features = construir_features_tenis(df)
+    X, y, fechas = df_train[features], df_train['result'], df_train['Date']
+
+    # --- ¿INCREMENTAL O COMPLETO? ---
+    estado = cargar_estado(ARCHIVO_ESTADO)
+    base = cargar(ARCHIVO_BASE, mmap=False) if estado and os.path.exists(ARCHIVO_BASE) else None
+    motivo = "forzado" if modo == 'completo' else None
+    if base is None: motivo = motivo or "sin modelo base previo"
+    nuevos = (fechas > pd.Timestamp(estado['fecha_max'])).to_numpy() if estado else np.ones(len(X), bool)
+    p_nuevos = brier_nuevo = None
+    if motivo is None:
+        # Predicciones del modelo de AYER sobre los partidos nuevos: fuera de muestra de verdad
+        with medir("prediccion_nuevos"):
+            p_nuevos = base.predict_proba(X[nuevos])[:, 1] if nuevos.any() else np.array([])
+        if nuevos.any():
+            isotonica = cargar('modelo_calibrado.joblib', mmap=False).isotonica
+            brier_nuevo = brier_score_loss(y[nuevos], isotonica.predict(p_nuevos))
+        motivo = motivo_refit(estado, features, X[nuevos], brier_nuevo, base.n_iter_ - estado['arboles_completo'])
+
+    if motivo is None:
+        # --- INCREMENTAL ---
+        print(f"➕ Incremental: {nuevos.sum()} filas nuevas, +{0 if not nuevos.any() else ARBOLES_POR_NOCHE} árboles sobre {base.n_iter_}")
+        cache = ampliar_cache(cargar(ARCHIVO_CACHE, mmap=False), fechas[nuevos], p_nuevos, y[nuevos])
+        if nuevos.any():
+            with medir("warm_start"):
+                ampliar(base, X, y)
+        with medir("calibracion"):
+            calibrated_model = ModeloCalibrado(base, calibrar(cache['p'], cache['y']))
+        if brier_nuevo is not None:
+            print(f"✅ Brier partidos nuevos (modelo de ayer): {brier_nuevo:.4f} | referencia {estado['brier_referencia']:.4f}")
+        estado.update({'fecha_max': str(fechas.max().date()), 'arboles': int(base.n_iter_)})
+        modo_noche = 'incremental'
+    else:
+        # --- REFIT COMPLETO ---
+        print(f"🔁 Refit completo: {motivo}")
+        corte = int(len(X) * (1 - FRACCION_HOLDOUT))
+        X_train, X_hold, y_train, y_hold = X.iloc[:corte], X.iloc[corte:], y.iloc[:corte], y.iloc[corte:]
+
+        params = PARAMS_FIJOS
+        if busqueda:
+            print(f"🔎 Buscando hiperparámetros (successive halving, {PRESUPUESTO_BUSQUEDA_S:.0f}s de presupuesto)...")
+            with medir("busqueda"):
+                params, brier_cv = busqueda_halving(X_train, y_train)
+            print(f"✅ Ganador: {params} (Brier validación temporal {brier_cv:.4f})")
+            with open(ARCHIVO_HIPERPARAMETROS, 'w') as f:
+                json.dump(a_json(params), f, indent=2)
+
+        # Un solo fit del modelo base; la isotónica se ajusta con sus predicciones sobre el holdout
+        # (antes: CalibratedClassifierCV con cv=3 = tres fits completos)
+        print("🚀 Entrenando y Calibrando Modelo...")
+        base = HistGradientBoostingClassifier(random_state=42, **params)
+        with medir("fit_base"):
+            base.fit(X_train, y_train)
+        with medir("evaluacion"):
+            p_hold = base.predict_proba(X_hold)[:, 1]
+        brier_base, brier = brier_score_loss(y_hold, p_hold), brier_calibrado_fuera(p_hold, y_hold)
+        acc = accuracy_score(y_hold, (p_hold > 0.5).astype(int))
+        print(f"✅ Accuracy: {acc:.2%}")
+        print(f"✅ Brier Score: {brier:.4f} calibrado | {brier_base:.4f} sin calibrar (Objetivo < 0.20 para rentabilidad)")
+
+        # Se sirve exactamente el base que produjo p_hold: isotónica, caché y brier_referencia describen
+        # ese modelo. El holdout entra en los árboles con el warm start de la noche siguiente.
+        cache = ampliar_cache(None, fechas.iloc[corte:], p_hold, y_hold)
+        with medir("calibracion"):
+            calibrated_model = ModeloCalibrado(base, calibrar(cache['p'], cache['y']))
+        arboles_completo = int(base.n_iter_)
+        estado = {
+            'features': list(features), 'params': a_json(params),
+            'ultimo_completo': str(pd.Timestamp.today().date()), 'fecha_max': str(fechas.max().date()),
+            'arboles_completo': arboles_completo, 'arboles': int(base.n_iter_),
+            'brier_referencia': brier, 'referencia_psi': referencia_psi(X_hold),
+            'historial': estado.get('historial', []),
+        }
+        modo_noche = 'completo'
+
+    # Guardado
+    guardar(base, ARCHIVO_BASE)
+    guardar(cache, ARCHIVO_CACHE)
+    guardar(calibrated_model, 'modelo_calibrado.joblib')
+    guardar(features, 'features.joblib')
+    guardar_estado(registrar_noche(estado, modo_noche, motivo, inicio, filas_nuevas=int(nuevos.sum()) if modo_noche == 'incremental' else len(X),
+                                   brier_nuevos=brier_nuevo), ARCHIVO_ESTADO)
+
+    # Base de datos ligera para la APP (último registro por jugador)
+    print("💾 Generando DB optimizada...")
+    cols_db = ['player_name', 'Date', 'player_rank', 'player_elo', 'ewma_form', 'ewma_serve', 'ewma_return', 'ewma_surface',
+               *COLS_SUPERFICIE.values(), 'days_rest',
+               'n_eff', 'sd_serve', 'sd_return']
+    df_last = df.sort_values('Date', kind='stable').groupby('player_name').tail(1)[cols_db]
+    guardar(df_last, 'db_players.joblib')
+
+    print("¡Sistema Quant Listo!")
+    return df_last
+
+if __name__ == "__main__":
+    # --fijo: configuración histórica sin búsqueda / --busqueda: forzar la búsqueda / --completo: sin incremental
+    entrenar_tenis(busqueda=False if "--fijo" in sys.argv else (True if "--busqueda" in sys.argv else None),
+                   modo='completo' if "--completo" in sys.argv else 'auto')
@@ -1,69 +1,140 @@
+import os
+import sys
+import time
 import pandas as pd
 import numpy as np
-import joblib
 from sklearn.ensemble import HistGradientBoostingRegressor, HistGradientBoostingClassifier
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, mean_absolute_error
+from sklearn.metrics import accuracy_score, mean_absolute_error, brier_score_loss
 
-print("--- ENTRENANDO IA NBA (QUANT) ---")
+from pipeline import medir
+from artefactos import guardar, cargar
+from entrenamiento_incremental import (ampliar, referencia_psi, motivo_refit, cargar_estado, guardar_estado,
+                                       registrar_noche, FRACCION_HOLDOUT, ARBOLES_POR_NOCHE)
 
-df = pd.read_csv("nba_processed.csv")
-df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+ARCHIVO_PROCESADO = "nba_processed.csv"
+ARCHIVO_ESTADO = "estado_entrenamiento_nba.json"
 
 # --- CRUCE DE RIVALES ---
-# Necesitamos saber contra quién jugaron para calcular los Deltas
-df_opp = df[['GAME_ID', 'TEAM_ID', 'ELO_START', 'EWMA_OFF_RTG', 'EWMA_PACE', 'EWMA_PTS']].copy()
-df_opp.rename(columns={
-    'TEAM_ID': 'OPP_ID', 
-    'ELO_START': 'OPP_ELO', 
-    'EWMA_OFF_RTG': 'OPP_OFF_RTG',
-    'EWMA_PACE': 'OPP_PACE',
-    'EWMA_PTS': 'OPP_PTS'
-}, inplace=True)
-
-# Merge del partido consigo mismo pero invirtiendo equipos
-# Truco: Un game tiene 2 filas. Hacemos merge por GameID pero filtramos que TEAM_ID != OPP_ID
-df_full = pd.merge(df, df_opp, on='GAME_ID')
-df_full = df_full[df_full['TEAM_ID'] != df_full['OPP_ID']]
-
-# Features
-df_full['home_adv'] = df_full['IS_HOME'] # 1 o 0
-df_full['diff_elo'] = df_full['ELO_START'] - df_full['OPP_ELO']
-df_full['diff_off'] = df_full['EWMA_OFF_RTG'] - df_full['OPP_OFF_RTG']
-
-features = ['home_adv', 'diff_elo', 'diff_off', 'ELO_START', 'OPP_ELO', 'EWMA_OFF_RTG', 'OPP_OFF_RTG', 'EWMA_PACE', 'OPP_PACE']
-target_win = df_full['WL'].apply(lambda x: 1 if x == 'W' else 0)
-target_points = df_full['PTS']
-
-# Split
-split = int(len(df_full) * 0.90)
-X_train, X_test = df_full[features].iloc[:split], df_full[features].iloc[split:]
-y_win_train, y_win_test = target_win.iloc[:split], target_win.iloc[split:]
-y_pts_train, y_pts_test = target_points.iloc[:split], target_points.iloc[split:]
-
-# 1. Modelo Ganador
-print("🚀 Entrenando Winner Model...")
-model_win = HistGradientBoostingClassifier(max_iter=200, max_depth=5, learning_rate=0.1)
-model_win.fit(X_train, y_win_train)
-acc = accuracy_score(y_win_test, model_win.predict(X_test))
-print(f"✅ Accuracy NBA: {acc:.1%}")
-
-# 2. Modelo Puntos (Para calibrar el Pace en Monte Carlo)
-print("🚀 Entrenando Points Model...")
-model_pts = HistGradientBoostingRegressor(max_iter=200, max_depth=5)
-model_pts.fit(X_train, y_pts_train)
-mae = mean_absolute_error(y_pts_test, model_pts.predict(X_test))
-print(f"✅ Error Medio Puntos: +/- {mae:.1f}")
-
-# Guardar Modelos
-joblib.dump(model_win, 'nba_model_win.joblib')
-joblib.dump(model_pts, 'nba_model_pts.joblib')
-joblib.dump(features, 'nba_features.joblib')
-
-# Guardar DB Reciente (Último partido de cada equipo)
-print("💾 Guardando Stats Actuales...")
-last_games = df_full.sort_values('GAME_DATE').groupby('TEAM_NAME').tail(1)
-cols_db = ['TEAM_NAME', 'ELO_START', 'EWMA_OFF_RTG', 'EWMA_PACE', 'EWMA_PTS']
-joblib.dump(last_games[cols_db], 'nba_db_teams.joblib')
-
-print("¡Sistema NBA Listo!")
\ No newline at end of file
+def cruzar_rivales(df):
+    # Necesitamos saber contra quién jugaron para calcular los Deltas
+    df_opp = df[['GAME_ID', 'TEAM_ID', 'ELO_START', 'EWMA_OFF_RTG', 'EWMA_PACE', 'EWMA_PTS']].copy()
+    df_opp.rename(columns={
+        'TEAM_ID': 'OPP_ID',
+        'ELO_START': 'OPP_ELO',
+        'EWMA_OFF_RTG': 'OPP_OFF_RTG',
+        'EWMA_PACE': 'OPP_PACE',
+        'EWMA_PTS': 'OPP_PTS'
+    }, inplace=True)
+
+    # Merge del partido consigo mismo pero invirtiendo equipos
+    # Truco: Un game tiene 2 filas. Hacemos merge por GameID pero filtramos que TEAM_ID != OPP_ID
+    df_full = pd.merge(df, df_opp, on='GAME_ID')
+    return df_full[df_full['TEAM_ID'] != df_full['OPP_ID']].copy()
+
+def construir_features_nba(df):
+    """Cruce de rivales + diferencias. Devuelve (df_full, features, target_win)."""
+    df_full = cruzar_rivales(df)
+
+    # Features
+    df_full['home_adv'] = df_full['IS_HOME'] # 1 o 0
+    df_full['diff_elo'] = df_full['ELO_START'] - df_full['OPP_ELO']
+    df_full['diff_off'] = df_full['EWMA_OFF_RTG'] - df_full['OPP_OFF_RTG']
+
+    features = ['home_adv', 'diff_elo', 'diff_off', 'ELO_START', 'OPP_ELO', 'EWMA_OFF_RTG', 'OPP_OFF_RTG', 'EWMA_PACE', 'OPP_PACE']
+    target_win = df_full['WL'].apply(lambda x: 1 if x == 'W' else 0)
+    return df_full, features, target_win
+
+def entrenar_nba(df=None, modo='auto'):
+    """Entrena los modelos NBA. Acepta el DataFrame procesado en memoria (o lee el CSV).
+    modo='auto': warm start con los partidos nuevos salvo que toque refit completo; 'completo' lo fuerza."""
+    inicio = time.time()
+    print("--- ENTRENANDO IA NBA (QUANT) ---")
+
+    if df is None:
+        df = pd.read_csv(ARCHIVO_PROCESADO)
+    else:
+        df = df.copy()
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+
+    df_full, features, target_win = construir_features_nba(df)
+    target_points = df_full['PTS']
+    X, fechas = df_full[features], df_full['GAME_DATE']
+
+    # --- ¿INCREMENTAL O COMPLETO? ---
+    estado = cargar_estado(ARCHIVO_ESTADO)
+    previos = estado and os.path.exists('nba_model_win.joblib') and os.path.exists('nba_model_pts.joblib')
+    motivo = "forzado" if modo == 'completo' else (None if previos else "sin modelos previos")
+    nuevos = (fechas > pd.Timestamp(estado['fecha_max'])).to_numpy() if estado else np.ones(len(X), bool)
+    brier_nuevo = None
+    if motivo is None:
+        model_win, model_pts = cargar('nba_model_win.joblib', mmap=False), cargar('nba_model_pts.joblib', mmap=False)
+        # El modelo de ayer sobre los partidos de hoy: Brier fuera de muestra para detectar deriva
+        if nuevos.any():
+            brier_nuevo = brier_score_loss(target_win[nuevos], model_win.predict_proba(X[nuevos])[:, 1])
+        motivo = motivo_refit(estado, features, X[nuevos], brier_nuevo, model_win.n_iter_ - estado['arboles_completo'])
+
+    if motivo is None:
+        # --- INCREMENTAL ---
+        print(f"➕ Incremental: {nuevos.sum()} filas nuevas, +{0 if not nuevos.any() else ARBOLES_POR_NOCHE} árboles")
+        if nuevos.any():
+            with medir("warm_start"):
+                ampliar(model_win, X, target_win)
+                ampliar(model_pts, X, target_points)
+            print(f"✅ Brier partidos nuevos (modelo de ayer): {brier_nuevo:.4f} | referencia {estado['brier_referencia']:.4f}")
+        estado.update({'fecha_max': str(fechas.max().date()), 'arboles': int(model_win.n_iter_)})
+        modo_noche = 'incremental'
+    else:
+        # --- REFIT COMPLETO ---
+        print(f"🔁 Refit completo: {motivo}")
+        split = int(len(df_full) * (1 - FRACCION_HOLDOUT))
+        X_train, X_test = X.iloc[:split], X.iloc[split:]
+        y_win_train, y_win_test = target_win.iloc[:split], target_win.iloc[split:]
+        y_pts_train, y_pts_test = target_points.iloc[:split], target_points.iloc[split:]
+
+        # 1. Modelo Ganador
+        print("🚀 Entrenando Winner Model...")
+        model_win = HistGradientBoostingClassifier(max_iter=200, max_depth=5, learning_rate=0.1)
+        with medir("fit_ganador"):
+            model_win.fit(X_train, y_win_train)
+        acc = accuracy_score(y_win_test, model_win.predict(X_test))
+        brier = brier_score_loss(y_win_test, model_win.predict_proba(X_test)[:, 1])
+        print(f"✅ Accuracy NBA: {acc:.1%} | Brier {brier:.4f}")
+
+        # 2. Modelo Puntos (Para calibrar el Pace en Monte Carlo)
+        print("🚀 Entrenando Points Model...")
+        model_pts = HistGradientBoostingRegressor(max_iter=200, max_depth=5)
+        with medir("fit_puntos"):
+            model_pts.fit(X_train, y_pts_train)
+        mae = mean_absolute_error(y_pts_test, model_pts.predict(X_test))
+        print(f"✅ Error Medio Puntos: +/- {mae:.1f}")
+
+        # Se sirven los modelos medidos (brier_referencia / mae_puntos son suyos); el holdout entra
+        # en los árboles con el warm start de la noche siguiente
+        arboles_completo = int(model_win.n_iter_)
+        estado = {
+            'features': list(features), 'ultimo_completo': str(pd.Timestamp.today().date()),
+            'fecha_max': str(fechas.max().date()), 'arboles_completo': arboles_completo, 'arboles': int(model_win.n_iter_),
+            'brier_referencia': float(brier), 'mae_puntos': float(mae), 'referencia_psi': referencia_psi(X_test),
+            'historial': estado.get('historial', []),
+        }
+        modo_noche = 'completo'
+
+    # Guardar Modelos
+    guardar(model_win, 'nba_model_win.joblib')
+    guardar(model_pts, 'nba_model_pts.joblib')
+    guardar(features, 'nba_features.joblib')
+    guardar_estado(registrar_noche(estado, modo_noche, motivo, inicio, filas_nuevas=int(nuevos.sum()) if modo_noche == 'incremental' else len(X),
+                                   brier_nuevos=brier_nuevo), ARCHIVO_ESTADO)
+
+    # Guardar DB Reciente (Último partido de cada equipo)
+    print("💾 Guardando Stats Actuales...")
+    last_games = df_full.sort_values('GAME_DATE').groupby('TEAM_NAME').tail(1)
+    cols_db = ['TEAM_NAME', 'ELO_START', 'EWMA_OFF_RTG', 'EWMA_PACE', 'EWMA_PTS', 'N_EFF', 'SD_OFF_RTG', 'SD_PACE']
+    guardar(last_games[cols_db], 'nba_db_teams.joblib')
+
+    print("¡Sistema NBA Listo!")
+    return last_games[cols_db]
+
+if __name__ == "__main__":
+    entrenar_nba(modo='completo' if "--completo" in sys.argv else 'auto')
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from simulador import curvas_nba, supervivencia_normal, probs_discretas, MAX_DIFF, MAX_JUEGOS
+from tarificar_cartelera import resolver_tenis, resolver_nba, tarificar_cruces_tenis, escribir
+
+# ==============================================================================
+#                 ESCÁNER DE VALOR CONTRA CUOTAS DE CASAS DE APUESTAS
+# ==============================================================================
+# Cruza miles de cuotas ofrecidas (ganador, totales y hándicaps, tenis y NBA) con nuestras
+# probabilidades justas en una sola pasada vectorizada:
+#
+#   python escaner_valor.py cuotas.csv [--min-edge 0.03] [--salida valor]
+#   python escaner_valor.py --demo 300          (feed de prueba generado, sin fichero de cuotas)
+#
+# Formato largo del fichero de cuotas (CSV, JSON o Parquet), una fila por precio ofrecido:
+#   casa, deporte, j1, j2, superficie, best_of, mercado (ganador|total|handicap),
+#   seleccion (j1|j2|over|under), linea (hándicap desde el lado seleccionado), cuota
+#
+# Cada partido distinto se tarifica una vez. Tenis: las supervivencias del motor exacto de todos
+# los cruces se apilan en una matriz (cruce x juegos), así que cualquier línea es un índice.
+# NBA: supervivencia de la normal. Líneas enteras: el push (devolución) se tiene en cuenta.
+
+FRACCION_KELLY = 0.25       # Kelly fraccional: la probabilidad del modelo también tiene error
+MAX_STAKE = 0.05            # tope por apuesta (fracción del bank)
+MIN_EDGE = 0.03
+COLUMNAS = ['casa', 'deporte', 'j1', 'j2', 'superficie', 'best_of', 'mercado', 'seleccion', 'linea', 'cuota']
+
+# --- LECTURA ---
+def leer_cuotas(ruta):
+    if ruta.endswith('.parquet'): df = pd.read_parquet(ruta)
+    elif ruta.endswith('.json'): df = pd.read_json(ruta)
+    else: df = pd.read_csv(ruta)
+    df.columns = [c.strip().lower() for c in df.columns]
+    return normalizar(df)
+
+def normalizar(df):
+    faltan = {'deporte', 'j1', 'j2', 'mercado', 'seleccion', 'cuota'} - set(df.columns)
+    if faltan: raise ValueError(f"Faltan columnas en el fichero de cuotas: {sorted(faltan)}")
+    df = df.copy()
+    if 'casa' not in df.columns: df['casa'] = 'casa'
+    if 'superficie' not in df.columns: df['superficie'] = 'Hard'
+    if 'best_of' not in df.columns: df['best_of'] = 3
+    if 'linea' not in df.columns: df['linea'] = 0.0
+    for c in ['deporte', 'mercado', 'seleccion']: df[c] = df[c].astype(str).str.lower().str.strip()
+    df['superficie'] = df['superficie'].fillna('Hard').astype(str).str.capitalize()
+    df['best_of'] = pd.to_numeric(df['best_of'], errors='coerce').fillna(3).astype(int)
+    df['linea'] = pd.to_numeric(df['linea'], errors='coerce').fillna(0.0)
+    df['cuota'] = pd.to_numeric(df['cuota'], errors='coerce')
+    return df[COLUMNAS].reset_index(drop=True)
+
+# --- PROBABILIDADES (vectorizadas) ---
+def apilar_curvas(curvas, best_ofs):
+    """Supervivencias de cada cruce en matrices comunes para los dos formatos.
+    Totales: hasta MAX_JUEGOS[5] (con 0 a la derecha). Diferencias: centradas en MAX_DIFF[5]."""
+    n_t, d_max = max(MAX_JUEGOS.values()) + 1, max(MAX_DIFF.values())
+    S_total = np.zeros((len(curvas), n_t))
+    S_diff = np.zeros((len(curvas), 2 * d_max + 1))
+    for i, (c, bo) in enumerate(zip(curvas, best_ofs)):
+        st, sd = np.asarray(c['surv_total']), np.asarray(c['surv_diff'])
+        S_total[i, :len(st)] = st
+        a = d_max - MAX_DIFF[bo]
+        S_diff[i, :a] = 1.0 # P(diff > k) para k por debajo de lo posible
+        S_diff[i, a:a + len(sd)] = sd
+    return S_total, S_diff, d_max
+
+def prob_gana_push(df, p_j1, S_total, S_diff, offset_diff, fila, normal):
+    """Para cada cuota: P(la selección gana) y P(push). Tenis discreto, NBA normal (sin push)."""
+    m, sel, l = df['mercado'].to_numpy(), df['seleccion'].to_numpy(), df['linea'].to_numpy(float)
+    gana, push = np.full(len(df), np.nan), np.zeros(len(df))
+
+    es = m == 'ganador'
+    gana[es] = np.where(sel[es] == 'j1', p_j1[es], 1 - p_j1[es])
+
+    # Totales: over gana si T > l, under si T < l
+    es = m == 'total'
+    if es.any():
+        if normal is not None:
+            sv = supervivencia_normal(l[es], normal['media_total'][es], normal['std_total'][es])
+            gana[es] = np.where(sel[es] == 'over', sv, 1 - sv)
+        else:
+            mayor, igual = probs_discretas(S_total, fila[es], l[es], 0)
+            gana[es] = np.where(sel[es] == 'over', mayor, 1 - mayor - igual)
+            push[es] = igual
+
+    # Hándicap desde el lado seleccionado: J1 con h gana si D > -h ; J2 con h gana si D < h (D = J1 - J2)
+    es = m == 'handicap'
+    if es.any():
+        umbral = np.where(sel[es] == 'j1', -l[es], l[es])
+        if normal is not None:
+            sv = supervivencia_normal(umbral, normal['media_diff'][es], normal['std_diff'][es])
+            gana[es] = np.where(sel[es] == 'j1', sv, 1 - sv)
+        else:
+            mayor, igual = probs_discretas(S_diff, fila[es], umbral, offset_diff)
+            gana[es] = np.where(sel[es] == 'j1', mayor, 1 - mayor - igual)
+            push[es] = igual
+    return gana, push
+
+def tarificar_cuotas(df, n_jobs=-1):
+    """Añade p_gana / p_push a cada cuota. Cada partido distinto se tarifica una sola vez."""
+    partes = []
+    for deporte, grupo in df.groupby('deporte', sort=False):
+        grupo = grupo.copy()
+        grupo['p_gana'], grupo['p_push'] = np.nan, 0.0
+        if deporte == 'tenis':
+            grupo, db_idx = resolver_tenis(grupo)
+            claves = ['j1', 'j2', 'superficie', 'best_of']
+            ok = grupo['error'].isna().to_numpy()
+            cruces = grupo.loc[ok, claves].drop_duplicates()
+            if len(cruces):
+                cruces = tarificar_cruces_tenis(cruces, db_idx, n_jobs)
+                S_total, S_diff, offset = apilar_curvas(cruces['curva'], cruces['best_of'])
+                fila = pd.MultiIndex.from_frame(cruces[claves]).get_indexer(pd.MultiIndex.from_frame(grupo.loc[ok, claves]))
+                g, p = prob_gana_push(grupo.loc[ok], cruces['p_j1'].to_numpy()[fila], S_total, S_diff, offset, fila, None)
+                grupo.loc[ok, 'p_gana'], grupo.loc[ok, 'p_push'] = g, p
+        elif deporte == 'nba':
+            grupo, db = resolver_nba(grupo)
+            ok = grupo['error'].isna().to_numpy()
+            if ok.any():
+                d1, d2 = db.loc[grupo.loc[ok, 'j1']], db.loc[grupo.loc[ok, 'j2']]
+                c = curvas_nba(d1['EWMA_PACE'], d1['EWMA_OFF_RTG'], d2['EWMA_PACE'], d2['EWMA_OFF_RTG'])
+                g, p = prob_gana_push(grupo.loc[ok], c['p_win'], None, None, 0, None, c)
+                grupo.loc[ok, 'p_gana'], grupo.loc[ok, 'p_push'] = g, p
+        else:
+            grupo['error'] = f"Deporte '{deporte}' no soportado"
+        partes.append(grupo)
+    return pd.concat(partes).sort_index()
+
+# --- VALOR ---
+def quitar_margen(df):
+    """Probabilidad implícita sin margen (método proporcional) por casa y mercado: las dos
+    selecciones de una misma línea suman 1. Si la casa solo ofrece un lado queda NaN."""
+    implicita = 1 / df['cuota']
+    # Clave de mercado: el hándicap de J2 (+h) es la otra cara del de J1 (-h)
+    linea_j1 = np.where((df['mercado'] == 'handicap') & (df['seleccion'] == 'j2'), -df['linea'], df['linea'])
+    grupo = [df['casa'], df['deporte'], df['j1'], df['j2'], df['superficie'], df['best_of'], df['mercado'], linea_j1]
+    suma = implicita.groupby(grupo, dropna=False).transform('sum')
+    lados = implicita.groupby(grupo, dropna=False).transform('size')
+    return implicita, np.where(lados == 2, implicita / suma, np.nan), np.where(lados == 2, suma - 1, np.nan)
+
+def kelly(p_gana, p_push, cuota):
+    """Fracción de Kelly con push: condicionada a que la apuesta se resuelva."""
+    resuelta = np.clip(1 - p_push, 1e-9, None)
+    p = p_gana / resuelta
+    b = cuota - 1
+    f = (b * p - (1 - p)) / np.where(b > 0, b, np.nan)
+    return np.clip(np.nan_to_num(f) * FRACCION_KELLY, 0, MAX_STAKE)
+
+def escanear(cuotas, min_edge=MIN_EDGE, n_jobs=-1):
+    """Cuotas (formato largo) -> todas las filas con edge, kelly y ranking (mejor valor primero)."""
+    df = tarificar_cuotas(normalizar(cuotas), n_jobs)
+    df['p_implicita'], df['p_mercado'], df['margen'] = quitar_margen(df)
+    df['cuota_justa'] = (1 - df['p_push']) / df['p_gana'].clip(lower=1e-6)
+    df['edge'] = df['p_gana'] * df['cuota'] + df['p_push'] - 1     # valor esperado por unidad apostada
+    df['edge_vs_mercado'] = df['p_gana'] / (1 - df['p_push']) - df['p_mercado']
+    df['kelly'] = kelly(df['p_gana'], df['p_push'], df['cuota'])
+    df['valor'] = df['edge'] >= min_edge
+    df = df.sort_values(['valor', 'edge'], ascending=False, kind='stable').reset_index(drop=True)
+    df.insert(0, 'rank', np.where(df['valor'], np.arange(1, len(df) + 1), 0))
+    return df
+
+# --- FEED DE PRUEBA ---
+def cuotas_demo(n_partidos=200, margen=0.05, ruido=0.15, seed=0):
+    """Feed sustituto: precios de varias casas sobre partidos al azar (nuestra prob. + ruido + margen)."""
+    from artefactos import cargar
+    from matriz_enfrentamientos import cargar_matriz
+    rng = np.random.default_rng(seed)
+    m = cargar_matriz()
+    jugadores = m['indice']['jugadores'] if m else list(cargar('db_players.joblib', mmap=False)['player_name'])
+    equipos = list(cargar('nba_db_teams.joblib', mmap=False)['TEAM_NAME']) if os.path.exists('nba_db_teams.joblib') else []
+    filas = []
+    for k in range(n_partidos):
+        if equipos and k % 4 == 3:
+            a, b = rng.choice(equipos, 2, replace=False)
+            base = {'deporte': 'nba', 'j1': a, 'j2': b, 'superficie': 'Hard', 'best_of': 3}
+            lineas = [('total', 'over', 'under', l) for l in 215.5 + 5 * rng.integers(0, 5, 2)] + \
+                     [('handicap', 'j1', 'j2', h) for h in (-6.5, -2.5, 3.5)]
+        else:
+            a, b = rng.choice(jugadores, 2, replace=False)
+            bo = int(rng.choice([3, 5], p=[0.8, 0.2]))
+            base = {'deporte': 'tenis', 'j1': a, 'j2': b, 'superficie': str(rng.choice(['Hard', 'Clay', 'Grass'])), 'best_of': bo}
+            lineas = [('total', 'over', 'under', l) for l in (21.5, 22, 23.5) if bo == 3] + \
+                     [('total', 'over', 'under', l) for l in (36.5, 38.5) if bo == 5] + \
+                     [('handicap', 'j1', 'j2', h) for h in (-3.5, -2.5, 2.5)]
+        lados = [('ganador', 'j1', 'j2', 0.0)] + lineas
+        for casa in ['casa_a', 'casa_b']:
+            for mercado, s1, s2, l in lados:
+                filas += [{**base, 'casa': casa, 'mercado': mercado, 'seleccion': s1, 'linea': l},
+                          {**base, 'casa': casa, 'mercado': mercado, 'seleccion': s2, 'linea': -l if mercado == 'handicap' else l}]
+    df = tarificar_cuotas(normalizar(pd.DataFrame(filas).assign(cuota=2.0)))
+    # La "casa" ve la prob. resuelta con ruido (en log-odds) y cobra margen sobre las dos caras
+    p = (df['p_gana'] / (1 - df['p_push'])).clip(0.01, 0.99).to_numpy()
+    p = 1 / (1 + np.exp(-(np.log(p / (1 - p)) + rng.normal(0, ruido, len(df)))))
+    df['cuota'] = np.maximum(1 / (p * (1 + margen)), 1.01).round(2)
+    return df[COLUMNAS]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escáner de valor contra cuotas de casas de apuestas")
+    parser.add_argument("cuotas", nargs='?', help="CSV/JSON/Parquet de cuotas en formato largo")
+    parser.add_argument("--demo", type=int, metavar="N", help="Sin fichero: feed de prueba con N partidos")
+    parser.add_argument("--min-edge", type=float, default=MIN_EDGE)
+    parser.add_argument("--salida", default="valor_cuotas", help="Nombre base del fichero de salida")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if args.cuotas is None and not args.demo:
+        parser.error("Indica un fichero de cuotas o --demo N")
+    if args.cuotas and not os.path.exists(args.cuotas):
+        print(f"❌ No existe {args.cuotas}")
+        sys.exit(1)
+
+    cuotas = leer_cuotas(args.cuotas) if args.cuotas else cuotas_demo(args.demo)
+    start = time.time()
+    res = escanear(cuotas, args.min_edge, args.n_jobs)
+    t = time.time() - start
+    valor = res[res['valor']]
+    print(f"--- 💰 ESCÁNER: {len(res)} cuotas, {res[['j1', 'j2']].drop_duplicates().shape[0]} partidos, "
+          f"{len(valor)} con edge >= {args.min_edge:.0%} ({t:.2f}s) ---")
+    cols = ['rank', 'casa', 'deporte', 'j1', 'j2', 'mercado', 'seleccion', 'linea', 'cuota', 'cuota_justa', 'p_gana', 'p_mercado', 'edge', 'kelly']
+    print(valor[cols].head(args.top).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    sin = res['error'].notna()
+    if sin.any(): print(f"⚠️ {sin.sum()} cuotas sin precio ({res.loc[sin, 'error'].value_counts().to_dict()})")
+    print(f"✅ Guardado en {escribir(res, args.salida)}")
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from pipeline import medir
+from artefactos import cargar, guardar
+from inferencia import SUPERFICIES
+
+# ==============================================================================
+#                  ÍNDICE HEAD-TO-HEAD (ENFRENTAMIENTOS DIRECTOS)
+# ==============================================================================
+# Una fila por pareja de jugadores que se ha enfrentado alguna vez (estructura dispersa):
+# clave = id_menor * N + id_mayor, ordenada, así que una consulta es un searchsorted.
+# Las victorias se cuentan desde el jugador de id menor; la consulta las gira si hace falta.
+
+ARCHIVO_PROCESADO = "atp_matches_procesados.csv"
+ARCHIVO_H2H = "indice_h2h.joblib"
+
+def construir_h2h(df=None):
+    """Etapa del pipeline: recibe el formato largo de crear_ia.py (o lee el CSV)."""
+    print("--- 🤝 Índice Head-to-Head ---")
+    if df is None:
+        df = pd.read_csv(ARCHIVO_PROCESADO)
+    # Lado 0 = ganador (Player_1 en TML): una fila por partido
+    partidos = df[df['side'] == 0] if 'side' in df.columns else df[df['result'] == 1]
+    with medir("h2h"):
+        nombres, ids = np.unique(np.concatenate([partidos['player_name'].astype(str), partidos['opponent_name'].astype(str)]),
+                                 return_inverse=True)
+        n = len(nombres)
+        ganador, perdedor = ids[:len(partidos)].astype(np.int64), ids[len(partidos):].astype(np.int64)
+        menor, mayor = np.minimum(ganador, perdedor), np.maximum(ganador, perdedor)
+        claves, fila = np.unique(menor * n + mayor, return_inverse=True)
+        gana_menor = (ganador == menor).astype(np.int64)
+
+        sup = partidos['Surface'].map({s: i for i, s in enumerate(SUPERFICIES)}).fillna(-1).to_numpy(int)
+        por_sup = np.zeros((len(claves), len(SUPERFICIES)), dtype=np.int32)
+        vic_sup = np.zeros((len(claves), len(SUPERFICIES)), dtype=np.int32)
+        ok = sup >= 0
+        np.add.at(por_sup, (fila[ok], sup[ok]), 1)
+        np.add.at(vic_sup, (fila[ok], sup[ok]), gana_menor[ok])
+
+        # Último enfrentamiento: el de mayor posición en el orden cronológico del CSV
+        fechas = pd.to_datetime(partidos['Date']).to_numpy('datetime64[D]')
+        orden = np.arange(len(partidos))
+        ultimo = np.full(len(claves), -1)
+        np.maximum.at(ultimo, fila, orden)
+
+    indice = {
+        'nombres': nombres.tolist(),
+        'claves': claves,
+        'partidos': np.bincount(fila, minlength=len(claves)).astype(np.int32),
+        'victorias_menor': np.bincount(fila, weights=gana_menor, minlength=len(claves)).astype(np.int32),
+        'partidos_superficie': por_sup, 'victorias_superficie': vic_sup,
+        'ultima_fecha': fechas[ultimo], 'ultimo_gana_menor': gana_menor[ultimo].astype(bool),
+    }
+    guardar(indice, ARCHIVO_H2H)
+    print(f"✅ H2H: {len(claves)} parejas distintas entre {n} jugadores.")
+    return indice
+
+def cargar_h2h(ruta=ARCHIVO_H2H):
+    indice = cargar(ruta)
+    indice['posicion'] = {j: i for i, j in enumerate(indice['nombres'])}
+    return indice
+
+def consultar_h2h_lote(indice, j1, j2):
+    """Vectorizado: victorias de J1, de J2 y partidos (total y por superficie) + último cruce.
+    Parejas sin enfrentamientos (o jugadores desconocidos) devuelven ceros."""
+    pos, n = indice['posicion'], len(indice['nombres'])
+    a = np.array([pos.get(x, -1) for x in j1], dtype=np.int64)
+    b = np.array([pos.get(x, -1) for x in j2], dtype=np.int64)
+    clave = np.minimum(a, b) * n + np.maximum(a, b)
+    k = np.clip(np.searchsorted(indice['claves'], clave), 0, len(indice['claves']) - 1)
+    existe = (a >= 0) & (b >= 0) & (a != b) & (indice['claves'][k] == clave)
+    j1_menor = a < b
+
+    def girar(v_menor, total):  # victorias del menor -> victorias de J1 (total o por superficie)
+        forma = (-1,) + (1,) * (np.ndim(v_menor) - 1)
+        v = np.where(j1_menor.reshape(forma), v_menor, total - v_menor)
+        return np.where(existe.reshape(forma), v, 0)
+
+    total = np.where(existe, indice['partidos'][k], 0)
+    total_sup = np.where(existe[:, None], indice['partidos_superficie'][k], 0)
+    return {
+        'partidos': total,
+        'victorias_j1': girar(indice['victorias_menor'][k], indice['partidos'][k]),
+        'partidos_superficie': total_sup,
+        'victorias_j1_superficie': girar(indice['victorias_superficie'][k], indice['partidos_superficie'][k]),
+        'ultima_fecha': np.where(existe, indice['ultima_fecha'][k], np.datetime64('NaT')),
+        'ultimo_gana_j1': existe & (indice['ultimo_gana_menor'][k] == j1_menor),
+    }
+
+def consultar_h2h(indice, j1, j2):
+    """Una pareja, en formato legible (dict)."""
+    r = consultar_h2h_lote(indice, [j1], [j2])
+    fecha = r['ultima_fecha'][0]
+    return {
+        'partidos': int(r['partidos'][0]), 'victorias_j1': int(r['victorias_j1'][0]),
+        'victorias_j2': int(r['partidos'][0] - r['victorias_j1'][0]),
+        'por_superficie': {s: [int(r['victorias_j1_superficie'][0, i]), int(r['partidos_superficie'][0, i])]
+                           for i, s in enumerate(SUPERFICIES)},
+        'ultimo': None if np.isnat(fecha) else {'fecha': str(fecha), 'ganador': j1 if r['ultimo_gana_j1'][0] else j2},
+    }
+
+if __name__ == "__main__":
+    construir_h2h()
@@ -0,0 +1,123 @@
+import os
+import re
+import bisect
+import unicodedata
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+from artefactos import cargar, guardar
+
+# ==============================================================================
+#                 ÍNDICE DE NOMBRES DE JUGADORES (BÚSQUEDA DIFUSA)
+# ==============================================================================
+# Se construye en la descarga (actualizar_auto.py) con los nombres cortos "Apellido N." que usa
+# todo el sistema y, como alias, los nombres completos de TML ("Carlos Alcaraz").
+# Búsqueda sin acentos ni mayúsculas, por tres vías y en este orden de preferencia:
+#   1. Prefijo de palabra  ("alc", "carl alc")  -> bisect sobre la lista ordenada de palabras
+#   2. Subcadena           ("lcara")            -> intersección de trigramas + comprobación
+#   3. Con erratas         ("alcaras")          -> similitud de trigramas (Jaccard)
+
+ARCHIVO_INDICE_NOMBRES = "indice_nombres.joblib"
+ARCHIVO_DATOS = "atp_tennis.csv"
+MIN_SIMILITUD = 0.3
+
+def plegar(texto):
+    """Minúsculas, sin acentos y solo letras/números separados por un espacio: 'Müller, J.' -> 'muller j'."""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', texto))
+
+def trigramas(texto, bordes=True):
+    t = f"  {texto} " if bordes else texto
+    return {t[i:i+3] for i in range(len(t) - 2)}
+
+# --- CONSTRUCCIÓN ---
+def construir_indice(nombres, alias=None):
+    """nombres: nombres canónicos. alias: {nombre canónico: [nombres alternativos]}."""
+    nombres = sorted({str(n) for n in nombres if isinstance(n, str) and n.strip()})
+    conocidos = set(nombres)
+    alias = {n: a for n, a in (alias or {}).items() if n in conocidos}
+    claves, clave_jugador = [], []
+    for i, nombre in enumerate(nombres):
+        for texto in {plegar(nombre)} | {plegar(a) for a in alias.get(nombre, [])}:
+            if texto:
+                claves.append(texto); clave_jugador.append(i)
+
+    palabras = sorted({(p, j) for texto, j in zip(claves, clave_jugador) for p in texto.split()})
+    postings = defaultdict(list)
+    for k, texto in enumerate(claves):
+        for tri in trigramas(texto):
+            postings[tri].append(k)
+
+    return {
+        'nombres': nombres,
+        'alias': {n: sorted(set(a)) for n, a in alias.items()},
+        'claves': claves,
+        'clave_jugador': np.asarray(clave_jugador, dtype=np.int32),
+        'n_trigramas': np.asarray([len(trigramas(t)) for t in claves], dtype=np.int32),
+        'palabras': [p for p, _ in palabras],
+        'palabra_jugador': np.asarray([j for _, j in palabras], dtype=np.int32),
+        'trigramas': {tri: np.asarray(ks, dtype=np.int32) for tri, ks in postings.items()},
+    }
+
+def alias_desde_pares(cortos, completos):
+    """Pares (nombre corto, nombre original de TML) -> {corto: [originales distintos]}."""
+    alias = defaultdict(set)
+    for corto, completo in zip(cortos, completos):
+        if isinstance(completo, str) and completo != corto: alias[corto].add(completo.strip())
+    return {k: sorted(v) for k, v in alias.items()}
+
+def guardar_indice(indice, ruta=ARCHIVO_INDICE_NOMBRES):
+    guardar(indice, ruta)
+
+def cargar_indice(ruta=ARCHIVO_INDICE_NOMBRES, csv=ARCHIVO_DATOS):
+    """Índice persistido; si aún no existe se construye al vuelo desde el CSV (sin alias)."""
+    if os.path.exists(ruta):
+        return cargar(ruta, mmap=False)
+    df = pd.read_csv(csv, usecols=['Player_1', 'Player_2'])
+    return construir_indice(pd.concat([df['Player_1'], df['Player_2']]).unique())
+
+# --- BÚSQUEDA ---
+def buscar(indice, consulta, limite=10):
+    """Nombres canónicos ordenados por relevancia: prefijo > subcadena > parecido (erratas)."""
+    q = plegar(consulta)
+    if not q: return []
+    puntos = {}
+
+    def anotar(jugadores, nivel):
+        # nivel = (vía, similitud): nos quedamos con la mejor vía que encuentre a cada jugador
+        for j in map(int, jugadores):
+            if j not in puntos or nivel > puntos[j]: puntos[j] = nivel
+
+    # 1. Todas las palabras de la consulta son prefijo de alguna palabra del jugador
+    palabras, candidatos = indice['palabras'], None
+    for p in q.split():
+        a, b = bisect.bisect_left(palabras, p), bisect.bisect_left(palabras, p + '\uffff')
+        hits = set(indice['palabra_jugador'][a:b].tolist())
+        candidatos = hits if candidatos is None else candidatos & hits
+        if not candidatos: break
+    anotar(candidatos or (), (3, 0.0))
+
+    claves, clave_jugador = indice['claves'], indice['clave_jugador']
+    # 2. Subcadena (3+ caracteres): claves que tienen todos los trigramas de la consulta
+    if len(q) >= 3:
+        listas = [indice['trigramas'].get(t) for t in trigramas(q, bordes=False)]
+        if all(l is not None for l in listas):
+            ks = listas[0]
+            for l in listas[1:]: ks = np.intersect1d(ks, l, assume_unique=True)
+            anotar((clave_jugador[k] for k in ks if q in claves[k]), (2, 0.0))
+
+    # 3. Erratas: Jaccard de trigramas (con bordes) entre consulta y cada clave
+    if len(puntos) < limite:
+        tq = trigramas(q)
+        listas = [indice['trigramas'][t] for t in tq if t in indice['trigramas']]
+        if listas:
+            comunes = np.bincount(np.concatenate(listas), minlength=len(claves))
+            ks = np.flatnonzero(comunes)
+            sim = comunes[ks] / (len(tq) + indice['n_trigramas'][ks] - comunes[ks])
+            for k, s in zip(ks, sim):
+                if s >= MIN_SIMILITUD: anotar([clave_jugador[k]], (1, float(s)))
+
+    orden = sorted(puntos, key=lambda j: (-puntos[j][0], -puntos[j][1], indice['nombres'][j]))
+    return [indice['nombres'][j] for j in orden[:limite]]
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+#               INFERENCIA TENIS (MODELO CALIBRADO EN LOTE)
+# ==============================================================================
+# Reconstruye el vector de features.joblib a partir de db_players.joblib y puntúa con
+# modelo_calibrado.joblib. Todo va en UNA llamada a predict_proba: N parejas x superficies x
+# formatos x las dos orientaciones (J1-J2 y J2-J1), así que sirve igual para la app (1 pareja)
+# que para puntuar miles de cruces de golpe.
+
+SUPERFICIES = ["Hard", "Clay", "Grass"]
+FORMATOS = [3, 5]
+# Peso del modelo en la mezcla con la simulación (el resto es el motor exacto con Log5)
+PESO_MODELO = 0.6
+MAX_DESCANSO = 30  # Igual que el clip de days_rest en crear_ia.py
+# Última ewma_surface de cada jugador EN CADA superficie (crear_ia.py): ewma_surface a secas es la de
+# la superficie de su último partido, que no sirve para puntuar las otras
+COLS_SUPERFICIE = {s: f'ewma_surface_{s}' for s in SUPERFICIES}
+
+def indexar_jugadores(db):
+    """db_players -> tabla indexada por nombre (para buscar miles de jugadores con un solo .loc)."""
+    return db.drop_duplicates('player_name', keep='last').set_index('player_name')
+
+def matriz_features(db_idx, features, j1, j2, superficies=SUPERFICIES, formatos=FORMATOS, fecha=None):
+    """DataFrame con las columnas de `features`, ordenado (pareja, superficie, formato)."""
+    j1, j2 = np.asarray(j1, dtype=object), np.asarray(j2, dtype=object)
+    a, b = db_idx.loc[j1], db_idx.loc[j2]
+    fecha = pd.Timestamp.today().normalize() if fecha is None else pd.Timestamp(fecha)
+
+    # Descanso hasta la fecha del partido (en el entrenamiento: días desde el partido anterior)
+    def descanso(d): return (fecha - pd.to_datetime(d['Date'])).dt.days.clip(0, MAX_DESCANSO).to_numpy(float)
+
+    base = {
+        'delta_elo': a['player_elo'].to_numpy() - b['player_elo'].to_numpy(),
+        'delta_form': a['ewma_form'].to_numpy() - b['ewma_form'].to_numpy(),
+        'delta_serve': a['ewma_serve'].to_numpy() - b['ewma_serve'].to_numpy(),
+        'player_elo': a['player_elo'].to_numpy(), 'opponent_elo': b['player_elo'].to_numpy(),
+        'ewma_serve': a['ewma_serve'].to_numpy(), 'opp_ewma_serve': b['ewma_serve'].to_numpy(),
+        'days_rest': descanso(a), 'opp_days_rest': descanso(b),
+    }
+    n, n_s, n_f = len(j1), len(superficies), len(formatos)
+    X = pd.DataFrame({k: np.repeat(v.astype(float), n_s * n_f) for k, v in base.items()})
+    # Forma de la superficie pedida (pareja x superficie, repetida por formato). DB antigua sin las
+    # columnas por superficie: la de siempre para todas
+    def surf(d, s): return d[COLS_SUPERFICIE[s] if COLS_SUPERFICIE.get(s) in d.columns else 'ewma_surface'].to_numpy(float)
+    X['delta_surf'] = np.repeat(np.stack([surf(a, s) - surf(b, s) for s in superficies], axis=1).ravel(), n_f)
+    X['Best of'] = np.tile(np.asarray(formatos, dtype=float), n * n_s)
+    sup = np.tile(np.repeat(np.asarray(superficies, dtype=object), n_f), n)
+    for col in features:
+        if col.startswith('Surface_'):
+            X[col] = (sup == col[len('Surface_'):]).astype(float)
+    return X.reindex(columns=features, fill_value=0.0)
+
+def predecir_lote(modelo, features, db_idx, j1, j2, superficies=SUPERFICIES, formatos=FORMATOS, fecha=None):
+    """P(J1 gana) con forma (n_parejas, n_superficies, n_formatos).
+    El modelo se entrenó con las dos perspectivas de cada partido: promediamos p(J1-J2) y 1 - p(J2-J1)."""
+    n = len(j1)
+    X = pd.concat([matriz_features(db_idx, features, j1, j2, superficies, formatos, fecha),
+                   matriz_features(db_idx, features, j2, j1, superficies, formatos, fecha)], ignore_index=True)
+    p = modelo.predict_proba(X)[:, 1].reshape(2, n, len(superficies), len(formatos))
+    return (p[0] + 1 - p[1]) / 2
+
+def mezclar(p_modelo, p_simulacion, peso=PESO_MODELO):
+    return peso * p_modelo + (1 - peso) * p_simulacion
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import shutil
+import zipfile
+import hashlib
+import tempfile
+
+import pandas as pd
+
+from pipeline import medir, hash_archivo
+from artefactos import escribir_atomico
+
+# ==============================================================================
+#           INGESTA DE KAGGLE CON CACHÉ POR VERSIÓN (SIN DESCOMPRIMIR NADA)
+# ==============================================================================
+# Antes: cada noche dataset_download_files(..., unzip=True) bajaba el bundle entero y lo
+# descomprimía en la raíz del repo (games.csv, players.csv, teams.csv...). Ahora:
+#
+#   cache/kaggle/nathanlauga__nba-games/
+#     archivo.zip      <- el bundle tal cual lo sirve Kaggle
+#     version.json     <- huella de la versión publicada + fecha + tamaño
+#
+#   ruta_zip, version, descargado = obtener_archivo(fuente_por_defecto("nathanlauga/nba-games"))
+#   df = leer_miembro(ruta_zip, "games.csv")    # stream directo desde el zip al DataFrame
+#
+# 1. Se pregunta a Kaggle la versión del dataset (llamada de metadatos, KB). Si coincide con la
+#    de la caché y el zip está, no se descarga nada.
+# 2. Solo se abre el miembro que hace falta, leyéndolo desde el zip: nada se extrae al disco.
+# Pruebas / sin red: KAGGLE_ZIP_LOCAL=ruta/al/archivo.zip usa ese zip como si fuera Kaggle
+# (la versión es su hash). En CI la carpeta de caché se conserva entre ejecuciones.
+
+CARPETA_CACHE = os.environ.get("CACHE_KAGGLE", os.path.join("cache", "kaggle"))
+
+# --- FUENTES ---
+class FuenteKaggle:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._api = None
+
+    def api(self):
+        if self._api is None:
+            # Import diferido: kaggle intenta autenticarse al importarse
+            from kaggle.api.kaggle_api_extended import KaggleApi
+            self._api = KaggleApi()
+            self._api.authenticate()
+        return self._api
+
+    def version(self):
+        """Huella de la versión publicada: nº de versión + fecha si la API los da (los nombres de los
+        atributos cambian entre versiones del cliente); si no, nombre/tamaño/fecha de cada fichero."""
+        dueno, nombre = self.dataset.split("/")
+        try:
+            for d in self.api().dataset_list(user=dueno, search=nombre):
+                if str(getattr(d, 'ref', '')) != self.dataset: continue
+                numero = getattr(d, 'currentVersionNumber', None) or getattr(d, 'current_version_number', None)
+                fecha = getattr(d, 'lastUpdated', None) or getattr(d, 'last_updated', None)
+                if numero or fecha: return f"v{numero}-{fecha}"
+        except Exception as e:
+            print(f"⚠️ Sin versión en el listado de Kaggle ({e}): se usa la lista de ficheros.")
+        ficheros = self.api().dataset_list_files(self.dataset).files
+        firma = sorted((str(f.name), str(getattr(f, 'totalBytes', getattr(f, 'size', ''))),
+                        str(getattr(f, 'creationDate', getattr(f, 'creation_date', '')))) for f in ficheros)
+        return "ficheros-" + hashlib.sha256(json.dumps(firma).encode()).hexdigest()[:16]
+
+    def descargar(self, destino):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.api().dataset_download_files(self.dataset, path=tmp, unzip=False, quiet=True)
+            zips = [f for f in os.listdir(tmp) if f.endswith(".zip")]
+            if not zips: raise FileNotFoundError(f"Kaggle no devolvió ningún zip para {self.dataset}")
+            escribir_atomico(destino, lambda t: shutil.move(os.path.join(tmp, zips[0]), t))
+
+class FuenteLocal:
+    """Un zip del disco haciendo de Kaggle (pruebas, ejecuciones sin red)."""
+    def __init__(self, dataset, ruta_zip):
+        self.dataset, self.ruta_zip = dataset, ruta_zip
+
+    def version(self):
+        return "local-" + hash_archivo(self.ruta_zip)[:16]
+
+    def descargar(self, destino):
+        escribir_atomico(destino, lambda t: shutil.copyfile(self.ruta_zip, t))
+
+def fuente_por_defecto(dataset):
+    local = os.environ.get("KAGGLE_ZIP_LOCAL")
+    return FuenteLocal(dataset, local) if local else FuenteKaggle(dataset)
+
+# --- CACHÉ ---
+def carpeta_dataset(dataset, carpeta=CARPETA_CACHE):
+    return os.path.join(carpeta, dataset.replace("/", "__"))
+
+def leer_version(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def obtener_archivo(fuente, carpeta=CARPETA_CACHE):
+    """Zip de la caché al día con la versión publicada -> (ruta_zip, version, descargado)."""
+    base = carpeta_dataset(fuente.dataset, carpeta)
+    os.makedirs(base, exist_ok=True)
+    ruta_zip, ruta_version = os.path.join(base, "archivo.zip"), os.path.join(base, "version.json")
+    with medir("version"):
+        version = fuente.version()
+    cacheada = leer_version(ruta_version)
+    if cacheada.get('version') == version and zipfile.is_zipfile(ruta_zip):
+        print(f"♻️ {fuente.dataset} sin cambios ({version}): se usa el zip de la caché.")
+        return ruta_zip, version, False
+
+    print(f"⬇️  Descargando {fuente.dataset} ({cacheada.get('version', 'sin caché')} -> {version})...")
+    with medir("descarga"):
+        fuente.descargar(ruta_zip)
+    if not zipfile.is_zipfile(ruta_zip): raise zipfile.BadZipFile(f"Descarga corrupta de {fuente.dataset}")
+    registro = {'version': version, 'fecha': time.strftime("%Y-%m-%d %H:%M:%S"), 'bytes': os.path.getsize(ruta_zip)}
+    def escribir(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(registro, f, indent=2)
+    escribir_atomico(ruta_version, escribir)
+    print(f"✅ Descarga completada ({registro['bytes'] / 1e6:.1f} MB).")
+    return ruta_zip, version, True
+
+# --- LECTURA ---
+def elegir_miembro(ruta_zip, preferido):
+    """El miembro pedido (por nombre base, en cualquier carpeta del zip); si no está, el CSV de partidos
+    más corto de nombre que no sea de jugadores ni de detalle."""
+    with zipfile.ZipFile(ruta_zip) as z:
+        csvs = [n for n in z.namelist() if n.lower().endswith(".csv")]
+    exactos = [n for n in csvs if os.path.basename(n).lower() == preferido.lower()]
+    if exactos: return exactos[0]
+    candidatos = [n for n in csvs if 'games' in os.path.basename(n).lower()
+                  and not any(x in n.lower() for x in ('player', 'details'))]
+    if not candidatos: raise FileNotFoundError(f"No hay '{preferido}' ni otro CSV de partidos en {ruta_zip}: {csvs}")
+    return sorted(candidatos, key=len)[0]
+
+def leer_miembro(ruta_zip, preferido, **kwargs):
+    """CSV leído en streaming desde el zip (descompresión al vuelo, sin fichero intermedio)."""
+    miembro = elegir_miembro(ruta_zip, preferido)
+    print(f"📂 Procesando: {miembro} (desde {os.path.basename(ruta_zip)})")
+    with medir("lectura_zip"), zipfile.ZipFile(ruta_zip) as z, z.open(miembro) as f:
+        return pd.read_csv(f, **kwargs)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from pipeline import medir
+from artefactos import cargar, guardar_npy, escribir_atomico
+from simulador import prob_saque, curvas_tenis, LIMITES_SAQUE, MAX_DIFF
+from inferencia import SUPERFICIES, FORMATOS, indexar_jugadores, predecir_lote
+
+# ==============================================================================
+#           MATRIZ DE ENFRENTAMIENTOS PRECALCULADA (JUGADORES ACTIVOS)
+# ==============================================================================
+# Etapa nocturna tras el entrenamiento. Para cada pareja de jugadores activos, superficie y
+# formato guarda la prob. del modelo calibrado y un índice a la tabla de curvas del motor exacto.
+# Las curvas (P(gana), juegos esperados, supervivencias de totales y hándicaps) dependen solo
+# de las dos probabilidades de saque, así que se calculan una vez por celda de una rejilla
+# (paso 0.005) y las comparten todas las parejas que caen en esa celda.
+#
+#   matriz.npy       (N, N) estructurado: p_modelo (superficie, formato) + celda (superficie)
+#   curvas_bo3.npy   (celdas,) estructurado: p_win, media/std juegos, surv_total, surv_diff
+#   curvas_bo5.npy
+#   indice.json      jugadores (nombre -> fila), superficies, formatos, rejilla
+#
+# Todo se lee con mmap: una consulta son dos accesos a array (microsegundos).
+
+CARPETA = "matriz_enfrentamientos"
+ARCHIVO_INDICE = os.path.join(CARPETA, "indice.json")
+ARCHIVO_MATRIZ = os.path.join(CARPETA, "matriz.npy")
+DIAS_ACTIVO = 365
+MAX_JUGADORES = 400
+PASO_REJILLA = 0.005
+BLOQUE_PAREJAS = 20000
+
+def ruta_curvas(best_of): return os.path.join(CARPETA, f"curvas_bo{best_of}.npy")
+
+def rejilla():
+    return np.round(np.arange(LIMITES_SAQUE[0], LIMITES_SAQUE[1] + PASO_REJILLA / 2, PASO_REJILLA), 6)
+
+def celda_saque(p):
+    """Probabilidad de saque -> índice en la rejilla."""
+    return np.clip(np.rint((np.asarray(p) - LIMITES_SAQUE[0]) / PASO_REJILLA), 0, len(rejilla()) - 1).astype(np.int16)
+
+def jugadores_activos(db, dias=DIAS_ACTIVO, maximo=MAX_JUGADORES):
+    """Han jugado en el último año (respecto al último partido de la DB); los `maximo` mejor clasificados."""
+    fechas = pd.to_datetime(db['Date'])
+    activos = db[fechas >= fechas.max() - pd.Timedelta(days=dias)].copy()
+    activos['orden'] = activos['player_rank'].where(activos['player_rank'] > 0, np.inf) # Rank 0 = desconocido
+    return sorted(activos.sort_values('orden').head(maximo)['player_name'])
+
+# --- CONSTRUCCIÓN ---
+def tabla_curvas(best_of):
+    g = rejilla()
+    a, b = np.meshgrid(g, g, indexing='ij') # celda = i * len(g) + j (i: saque J1, j: saque J2)
+    c = curvas_tenis(a.ravel(), b.ravel(), best_of)
+    dtype = [('p_win', 'f4'), ('media_juegos', 'f4'), ('std_juegos', 'f4'),
+             ('surv_total', 'f4', c['surv_total'].shape[1]), ('surv_diff', 'f4', c['surv_diff'].shape[1])]
+    tabla = np.zeros(len(a.ravel()), dtype=dtype)
+    for campo, *_ in dtype: tabla[campo] = c[campo]
+    return tabla
+
+def generar_matriz(db=None):
+    """Etapa del pipeline: recibe la DB de jugadores del entrenamiento (o la lee de disco)."""
+    print("--- 🧮 MATRIZ DE ENFRENTAMIENTOS (JUGADORES ACTIVOS) ---")
+    start = time.time()
+    if db is None:
+        db = cargar('db_players.joblib', mmap=False)
+    db_idx = indexar_jugadores(db)
+    jugadores = jugadores_activos(db)
+    n, n_s, n_f = len(jugadores), len(SUPERFICIES), len(FORMATOS)
+    os.makedirs(CARPETA, exist_ok=True)
+
+    with medir("curvas"):
+        for bo in FORMATOS:
+            guardar_npy(tabla_curvas(bo), ruta_curvas(bo))
+
+    matriz = np.zeros((n, n), dtype=[('p_modelo', 'f2', (n_s, n_f)), ('celda', 'i2', (n_s,))])
+    matriz['p_modelo'] = np.nan
+
+    # Celdas de saque: (N, N, superficie) con el saque del jugador fila contra el resto del jugador columna
+    serve = db_idx.loc[jugadores, 'ewma_serve'].to_numpy(float)
+    ret = db_idx.loc[jugadores, 'ewma_return'].to_numpy(float)
+    n_g = len(rejilla())
+    for s, sup in enumerate(SUPERFICIES):
+        c1 = celda_saque(prob_saque(serve[:, None], ret[None, :], sup)).astype(np.int32)
+        matriz['celda'][:, :, s] = (c1 * n_g + c1.T).astype(np.int16)
+
+    # Modelo: solo i < j (predecir_lote promedia las dos orientaciones, así que p(j, i) = 1 - p(i, j))
+    if os.path.exists('modelo_calibrado.joblib') and os.path.exists('features.joblib'):
+        modelo, features = cargar('modelo_calibrado.joblib'), cargar('features.joblib', mmap=False)
+        ii, jj = np.triu_indices(n, k=1)
+        nombres = np.asarray(jugadores, dtype=object)
+        with medir("modelo"):
+            for k in range(0, len(ii), BLOQUE_PAREJAS):
+                a, b = ii[k:k+BLOQUE_PAREJAS], jj[k:k+BLOQUE_PAREJAS]
+                p = predecir_lote(modelo, features, db_idx, nombres[a], nombres[b])
+                matriz['p_modelo'][a, b] = p
+                matriz['p_modelo'][b, a] = 1 - p
+    else:
+        print("⚠️ Sin modelo calibrado: la matriz solo tendrá las curvas de simulación.")
+
+    guardar_npy(matriz, ARCHIVO_MATRIZ)
+    indice = {
+        'jugadores': jugadores, 'superficies': SUPERFICIES, 'formatos': FORMATOS,
+        'rejilla': {'min': LIMITES_SAQUE[0], 'max': LIMITES_SAQUE[1], 'paso': PASO_REJILLA, 'n': n_g},
+        'max_diff': {str(bo): MAX_DIFF[bo] for bo in FORMATOS},
+        'generado': pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+    def escribir(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(indice, f, ensure_ascii=False)
+    escribir_atomico(ARCHIVO_INDICE, escribir) # El último: marca la matriz nueva como completa
+
+    print(f"✅ Matriz {n}x{n} ({n*(n-1)} cruces x {n_s} superficies x {n_f} formatos) en {time.time()-start:.1f}s")
+    return matriz
+
+# --- CONSULTA ---
+def cargar_matriz(resolver=None):
+    """Índice + arrays mapeados en memoria. None si falta algo o no cuadra (se simula en vivo).
+    `resolver`: nombre lógico -> ruta real (p.ej. almacen_artefactos.ruta_artefacto)."""
+    resolver = resolver or (lambda r: r)
+    try:
+        with open(resolver(ARCHIVO_INDICE), encoding='utf-8') as f: indice = json.load(f)
+        matriz = np.load(resolver(ARCHIVO_MATRIZ), mmap_mode='r')
+        curvas = {bo: np.load(resolver(ruta_curvas(bo)), mmap_mode='r') for bo in indice['formatos']}
+    except (OSError, ValueError):
+        return None
+    if matriz.shape != (len(indice['jugadores']),) * 2: return None # Ficheros de noches distintas
+    indice['posicion'] = {j: i for i, j in enumerate(indice['jugadores'])}
+    return {'indice': indice, 'matriz': matriz, 'curvas': curvas}
+
+def consultar(m, p1, p2, superficie, best_of):
+    """Curvas de simulación + prob. del modelo para J1 vs J2. None si algún jugador no está."""
+    if m is None: return None
+    idx = m['indice']
+    i, j = idx['posicion'].get(p1), idx['posicion'].get(p2)
+    if i is None or j is None or i == j: return None
+    s = idx['superficies'].index(superficie)
+    fila = m['matriz'][i, j]
+    c = m['curvas'][best_of][fila['celda'][s]]
+    grid_modelo = fila['p_modelo'].astype(float)
+    return {
+        'p_win': float(c['p_win']), 'media_juegos': float(c['media_juegos']), 'std_juegos': float(c['std_juegos']),
+        'surv_total': c['surv_total'], 'surv_diff': c['surv_diff'],
+        'grid_modelo': None if np.isnan(grid_modelo).any() else grid_modelo, # (superficie, formato)
+    }
+
+if __name__ == "__main__":
+    generar_matriz()
@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import inspect
+import argparse
+import statistics
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import resource  # Solo Linux/macOS (GitHub Actions). En Windows no hay RSS pico.
+except ImportError:
+    resource = None
+
+# --- CONFIGURACIÓN ---
+# Huellas (hash de entradas + código) de la última ejecución correcta de cada etapa.
+# Se sube al repo junto con los artefactos para que la siguiente noche pueda saltar etapas.
+ARCHIVO_ESTADO = "pipeline_estado.json"
+# Log de telemetría: una línea JSON por etapa y ejecución
+ARCHIVO_RUNS = "pipeline_runs.jsonl"
+
+@dataclass
+class Etapa:
+    """Nodo del DAG. `funcion` recibe, en orden, el resultado en memoria de cada etapa de `depende`
+    (o None si esa etapa se saltó, en cuyo caso debe leer sus entradas de disco)."""
+    nombre: str
+    funcion: object
+    descripcion: str = ""
+    depende: list = field(default_factory=list)
+    entradas: list = field(default_factory=list)  # Ficheros que lee (definen la huella)
+    salidas: list = field(default_factory=list)   # Ficheros que escribe
+    siempre: bool = False                         # Fuentes externas (descargas): nunca se saltan
+
+# --- HUELLAS DE CONTENIDO ---
+def hash_archivo(ruta, bloque=1 << 20):
+    if not os.path.exists(ruta): return "AUSENTE"
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for trozo in iter(lambda: f.read(bloque), b''):
+            h.update(trozo)
+    return h.hexdigest()
+
+def huella_etapa(etapa):
+    # El código de la etapa también cuenta: si cambia el script, se re-ejecuta
+    h = hashlib.sha256()
+    codigo = inspect.getsourcefile(etapa.funcion)
+    for ruta in sorted(etapa.entradas) + [codigo]:
+        h.update(f"{os.path.basename(ruta)}:{hash_archivo(ruta)};".encode())
+    return h.hexdigest()
+
+def cargar_estado(ruta=ARCHIVO_ESTADO):
+    if not os.path.exists(ruta): return {}
+    try:
+        with open(ruta) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_estado(estado, ruta=ARCHIVO_ESTADO):
+    # Escritura atómica: nunca dejamos un JSON a medias si el job muere
+    tmp = ruta + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+    os.replace(tmp, ruta)
+
+def puede_saltarse(etapa, estado, huella):
+    if etapa.siempre: return False
+    if not all(os.path.exists(s) for s in etapa.salidas): return False
+    return estado.get(etapa.nombre) == huella
+
+# --- TELEMETRÍA ---
+_contexto = threading.local()
+
+def rss_pico_mb():
+    # Pico de memoria del PROCESO (con ramas en paralelo es compartido entre etapas)
+    if resource is None: return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)  # macOS da bytes, Linux KB
+
+@contextmanager
+def medir(nombre):
+    """Cronometra una sub-etapa (Elo, EWMA, fit, calibración...) de la etapa que corre en este hilo.
+    Fuera del pipeline (scripts lanzados a mano) no registra nada."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        subetapas = getattr(_contexto, 'subetapas', None)
+        if subetapas is not None:
+            subetapas[nombre] = round(subetapas.get(nombre, 0) + time.perf_counter() - start, 3)
+
+def contar_filas(obj):
+    return len(obj) if hasattr(obj, 'shape') else None  # DataFrame / ndarray
+
+def registrar_run(registros, ruta=ARCHIVO_RUNS):
+    with open(ruta, 'a', encoding='utf-8') as f:
+        for r in registros:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+# --- VALIDACIÓN DEL DAG ---
+def validar_dag(etapas):
+    nombres = [e.nombre for e in etapas]
+    if len(set(nombres)) != len(nombres):
+        raise ValueError("Nombres de etapa duplicados en el pipeline.")
+    por_nombre = {e.nombre: e for e in etapas}
+    for e in etapas:
+        for d in e.depende:
+            if d not in por_nombre:
+                raise ValueError(f"La etapa '{e.nombre}' depende de '{d}', que no existe.")
+
+    # Detección de ciclos (DFS con colores)
+    color = {}
+    def visitar(n):
+        color[n] = 1
+        for d in por_nombre[n].depende:
+            if color.get(d) == 1: raise ValueError(f"Ciclo detectado en el pipeline ({n} -> {d}).")
+            if d not in color: visitar(d)
+        color[n] = 2
+    for n in nombres:
+        if n not in color: visitar(n)
+    return por_nombre
+
+# --- EJECUCIÓN ---
+def ejecutar_pipeline(etapas, forzar=False, max_hilos=None, ruta_estado=ARCHIVO_ESTADO, ruta_runs=ARCHIVO_RUNS):
+    """Ejecuta el DAG. Las ramas independientes (Tenis / NBA) corren en paralelo en hilos
+    del mismo proceso, y los DataFrames viajan en memoria entre etapas.
+    Cada etapa deja en `ruta_runs` su tiempo, CPU, RSS pico, filas y tamaño de artefactos.
+    Devuelve {nombre: 'ok' | 'saltada' | 'error' | 'cancelada'}."""
+    por_nombre = validar_dag(etapas)
+    estado = cargar_estado(ruta_estado)
+    resultados, situacion = {}, {}
+    pendientes = [e.nombre for e in etapas]
+    en_curso = {}
+
+    run_id = time.strftime("%Y%m%dT%H%M%S")
+    registros = {}
+    wall_total, cpu_total = time.perf_counter(), time.process_time()
+
+    def lanzar(etapa, huella):
+        print(f"\n🚀 INICIANDO: {etapa.descripcion or etapa.nombre}...")
+        print("-" * 50)
+        args = [resultados.get(d) for d in etapa.depende]
+        filas_in = [contar_filas(a) for a in args if contar_filas(a) is not None]
+        _contexto.subetapas = {}
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        res, error = None, None
+        try:
+            res = etapa.funcion(*args)
+        except Exception as e:
+            error = e
+        metricas = {
+            'wall_s': round(time.perf_counter() - wall0, 3),
+            # CPU del hilo de la etapa (no incluye los hilos OpenMP internos de sklearn)
+            'cpu_s': round(time.thread_time() - cpu0, 3),
+            'rss_pico_mb': rss_pico_mb(),
+            'filas_entrada': sum(filas_in) if filas_in else None,
+            'filas_salida': contar_filas(res),
+            'bytes_salidas': {os.path.basename(s): os.path.getsize(s) for s in etapa.salidas if os.path.exists(s)},
+            'subetapas': _contexto.subetapas,
+        }
+        _contexto.subetapas = None
+        return res, huella, metricas, error
+
+    with ThreadPoolExecutor(max_workers=max_hilos or min(4, os.cpu_count() or 1)) as pool:
+        while pendientes or en_curso:
+            # 1. Lanzar todas las etapas cuyas dependencias ya terminaron
+            for nombre in list(pendientes):
+                etapa = por_nombre[nombre]
+                deps = [situacion.get(d) for d in etapa.depende]
+                if any(s in ('error', 'cancelada') for s in deps):
+                    situacion[nombre] = 'cancelada'
+                    registros[nombre] = {'etapa': nombre, 'estado': 'cancelada'}
+                    pendientes.remove(nombre)
+                    print(f"⏭️ {etapa.descripcion or nombre} CANCELADA (falló una dependencia)")
+                    continue
+                if not all(s in ('ok', 'saltada') for s in deps):
+                    continue
+
+                pendientes.remove(nombre)
+                huella = huella_etapa(etapa)
+                if not forzar and puede_saltarse(etapa, estado, huella):
+                    situacion[nombre] = 'saltada'
+                    registros[nombre] = {'etapa': nombre, 'estado': 'saltada'}
+                    print(f"⏭️ {etapa.descripcion or nombre} SIN CAMBIOS (entradas idénticas), se salta.")
+                    continue
+                en_curso[pool.submit(lanzar, etapa, huella)] = nombre
+
+            if not en_curso:
+                continue
+
+            # 2. Esperar a que acabe alguna y registrar su resultado
+            hechos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+            for fut in hechos:
+                nombre = en_curso.pop(fut)
+                etapa = por_nombre[nombre]
+                res, huella, metricas, error = fut.result()
+                if error is not None:
+                    situacion[nombre] = 'error'
+                    registros[nombre] = {'etapa': nombre, 'estado': 'error', 'error': str(error), **metricas}
+                    print(f"❌ ERROR CRÍTICO en {etapa.descripcion or nombre}: {error}")
+                    continue
+                resultados[nombre] = res
+                situacion[nombre] = 'ok'
+                registros[nombre] = {'etapa': nombre, 'estado': 'ok', **metricas}
+                # La huella se toma al lanzar: si una entrada cambió durante la etapa, se repetirá mañana
+                estado[nombre] = huella
+                guardar_estado(estado, ruta_estado)
+                print(f"✅ {etapa.descripcion or nombre} COMPLETADO ({metricas['wall_s']:.2f}s)")
+
+    registros['__total__'] = {
+        'etapa': '__total__', 'estado': 'ok',
+        'wall_s': round(time.perf_counter() - wall_total, 3),
+        'cpu_s': round(time.process_time() - cpu_total, 3),  # CPU de todo el proceso (todas las ramas)
+        'rss_pico_mb': rss_pico_mb(),
+    }
+    fecha = time.strftime("%Y-%m-%d %H:%M:%S")
+    orden = [e.nombre for e in etapas] + ['__total__']
+    registrar_run([{'run': run_id, 'fecha': fecha, **registros[n]} for n in orden if n in registros], ruta_runs)
+    return situacion
+
+# --- COMPARACIÓN CONTRA LÍNEA BASE ---
+def leer_runs(ruta=ARCHIVO_RUNS):
+    """Agrupa el log por ejecución, en orden cronológico: [(run_id, {etapa: registro})]."""
+    runs = {}
+    if not os.path.exists(ruta): return []
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            if not linea.strip(): continue
+            r = json.loads(linea)
+            runs.setdefault(r['run'], {})[r['etapa']] = r
+    return sorted(runs.items())
+
+def metricas_planas(registro):
+    planas = {k: registro.get(k) for k in ('wall_s', 'cpu_s', 'rss_pico_mb')}
+    for sub, seg in (registro.get('subetapas') or {}).items():
+        planas[f"{sub}_s"] = seg
+    return {k: v for k, v in planas.items() if v is not None}
+
+def comparar_runs(ruta=ARCHIVO_RUNS, ventana=7, umbral=1.5, min_segundos=1.0, min_mb=50.0):
+    """Compara la última ejecución contra la mediana de las `ventana` anteriores.
+    Marca regresión si una métrica supera `umbral` x la base y además crece un mínimo absoluto."""
+    runs = leer_runs(ruta)
+    if len(runs) < 2:
+        print("ℹ️ No hay suficientes ejecuciones para comparar.")
+        return []
+
+    run_id, ultimo = runs[-1]
+    previos = [r for _, r in runs[-1 - ventana:-1]]
+    regresiones = []
+    print(f"--- 📊 Run {run_id} vs mediana de {len(previos)} ejecuciones previas ---")
+    for etapa, reg in ultimo.items():
+        if reg.get('estado') != 'ok': continue
+        for metrica, valor in metricas_planas(reg).items():
+            base = [metricas_planas(p[etapa]).get(metrica) for p in previos
+                    if etapa in p and p[etapa].get('estado') == 'ok']
+            base = [b for b in base if b is not None]
+            if not base: continue
+            mediana = statistics.median(base)
+            minimo = min_mb if metrica == 'rss_pico_mb' else min_segundos
+            regresion = valor > mediana * umbral and valor - mediana >= minimo
+            marca = "🔴" if regresion else "  "
+            print(f"{marca} {etapa:<22} {metrica:<24} {valor:>10.2f}  (base {mediana:.2f})")
+            if regresion:
+                regresiones.append({'etapa': etapa, 'metrica': metrica, 'valor': valor, 'base': mediana})
+
+    if regresiones:
+        print(f"❌ {len(regresiones)} regresiones detectadas (umbral x{umbral}).")
+    else:
+        print("✅ Sin regresiones.")
+    return regresiones
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Herramientas del pipeline nocturno")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_cmp = sub.add_parser("comparar", help="Compara la última ejecución con la línea base")
+    p_cmp.add_argument("--ventana", type=int, default=7)
+    p_cmp.add_argument("--umbral", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if args.comando == "comparar":
+        sys.exit(1 if comparar_runs(ventana=args.ventana, umbral=args.umbral) else 0)
@@ -0,0 +1,138 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import cg
+
+from pipeline import medir
+from artefactos import cargar, guardar
+from crear_ia import preparar_stats, NOMBRE_ARCHIVO
+from inferencia import SUPERFICIES
+# Consulta (cargar_ratings, prob_saque_ajustada...) en consulta_ratings.py: la app no importa scipy
+from consulta_ratings import ARCHIVO_RATINGS, cargar_ratings, efectos, prob_saque_ajustada, tabla
+
+# ==============================================================================
+#        RATINGS DE SAQUE / RESTO AJUSTADOS POR RIVAL (MÍNIMOS CUADRADOS DISPERSOS)
+# ==============================================================================
+# El % de puntos ganados al saque de crear_ia.py no sabe contra quién se jugó: el 70% de un
+# habitual de Challenger vale lo mismo que el de un top 10. Aquí se ajustan todos los jugadores
+# a la vez sobre el grafo de partidos:
+#
+#   % saque de i contra j en superficie s  ≈  mu_s + saque_i + saque_i,s - resto_j - resto_j,s
+#
+# Cada (partido, jugador al saque) es una observación con peso = puntos de saque x decaimiento
+# temporal (vida media VIDA_MEDIA_DIAS). Ridge: los efectos generales encogen hacia 0 con
+# LAMBDA_JUGADOR y los de superficie (desviaciones sobre el general) con LAMBDA_SUPERFICIE, así
+# que un jugador con pocos puntos se queda cerca de la media. Ecuaciones normales dispersas
+# (5 no ceros por fila) + gradiente conjugado con precondicionador diagonal, arrancando de la
+# solución de la noche anterior: con un día más de partidos converge en pocas iteraciones.
+
+VIDA_MEDIA_DIAS = 365
+LAMBDA_JUGADOR = 150     # En puntos de saque: varianza por punto (~0.22) / varianza entre jugadores (~0.04²)
+LAMBDA_SUPERFICIE = 600  # Las desviaciones por superficie son más pequeñas (~0.02): encogen más
+TOLERANCIA = 1e-8
+MAX_ITER = 1000
+COLUMNAS = ['Date', 'Surface', 'Player_1', 'Player_2', 'P1_SvPt', 'P1_1stIn', 'P1_1stWon', 'P1_2ndWon',
+            'P2_SvPt', 'P2_1stIn', 'P2_1stWon', 'P2_2ndWon']
+
+# --- OBSERVACIONES ---
+def observaciones(df):
+    """Una fila por (partido, jugador al saque). Sin stats (0 puntos) o incoherentes: fuera."""
+    df = preparar_stats(df[[c for c in COLUMNAS if c in df.columns]].copy())
+    fechas = pd.to_datetime(df['Date']).to_numpy()
+    obs = pd.DataFrame({
+        'servidor': np.r_[df['Player_1'].to_numpy(), df['Player_2'].to_numpy()],
+        'restador': np.r_[df['Player_2'].to_numpy(), df['Player_1'].to_numpy()],
+        'superficie': np.tile(df['Surface'].to_numpy(), 2), 'fecha': np.tile(fechas, 2),
+        'ganados': np.r_[df['P1_SrvPtsWon'].to_numpy(), df['P2_SrvPtsWon'].to_numpy()],
+        'puntos': np.r_[df['P1_SvPt'].to_numpy(), df['P2_SvPt'].to_numpy()],
+    })
+    return obs[(obs['puntos'] > 0) & (obs['ganados'] <= obs['puntos'])].reset_index(drop=True)
+
+# --- SISTEMA ---
+# Vector de parámetros: [mu (S) | saque (P) | resto (P) | saque por superficie (P*S) | resto por superficie (P*S)]
+def sistema(obs, jugadores, fecha_ref, vida_media=VIDA_MEDIA_DIAS):
+    """Ecuaciones normales con ridge: A x = b (A dispersa, simétrica definida positiva)."""
+    P, S = len(jugadores), len(SUPERFICIES)
+    pos = pd.Index(jugadores)
+    i, j = pos.get_indexer(obs['servidor']), pos.get_indexer(obs['restador'])
+    s = pd.Index(SUPERFICIES).get_indexer(obs['superficie'])
+    s[s < 0] = 0 # Carpet y desconocidas -> Hard (mismo criterio que AJUSTE_SUPERFICIE)
+    edad = (pd.Timestamp(fecha_ref) - obs['fecha']).dt.days.to_numpy()
+    w = obs['puntos'].to_numpy(float) * 0.5 ** (np.maximum(edad, 0) / vida_media)
+    y = (obs['ganados'] / obs['puntos']).to_numpy(float)
+
+    n = len(obs)
+    columnas = np.c_[s, S + i, S + P + j, S + 2*P + i*S + s, S + 2*P + P*S + j*S + s].ravel()
+    X = sparse.csr_matrix((np.tile([1.0, 1.0, -1.0, 1.0, -1.0], n), (np.repeat(np.arange(n), 5), columnas)),
+                          shape=(n, S + 2*P + 2*P*S))
+    penal = np.r_[np.full(S, 1e-6), np.full(2*P, LAMBDA_JUGADOR), np.full(2*P*S, LAMBDA_SUPERFICIE)]
+    A = (X.T @ sparse.diags(w) @ X + sparse.diags(penal)).tocsr()
+    return A, X.T @ (w * y), np.bincount(i, weights=w, minlength=P)
+
+def arranque(previo, jugadores, tamano, mu_inicial):
+    """x0 con la solución anterior (por nombre de jugador); jugadores nuevos en 0."""
+    x0 = np.zeros(tamano)
+    S = len(SUPERFICIES)
+    x0[:S] = mu_inicial
+    if not previo or previo.get('superficies') != SUPERFICIES: return x0, 0
+    P = len(jugadores)
+    idx = pd.Index(previo['jugadores']).get_indexer(jugadores)
+    ok = idx >= 0
+    x0[:S] = previo['mu']
+    for k, clave in enumerate(['saque', 'resto']):
+        x0[S + k*P:S + (k+1)*P][ok] = previo[clave][idx[ok]]
+    for k, clave in enumerate(['saque_sup', 'resto_sup']):
+        bloque = x0[S + 2*P + k*P*S:S + 2*P + (k+1)*P*S].reshape(P, S)
+        bloque[ok] = previo[clave][idx[ok]]
+    return x0, int(ok.sum())
+
+# --- AJUSTE ---
+def ajustar(obs, previo=None, fecha_ref=None):
+    fecha_ref = pd.Timestamp(fecha_ref if fecha_ref is not None else obs['fecha'].max())
+    jugadores = np.unique(np.r_[obs['servidor'].to_numpy(), obs['restador'].to_numpy()]).astype(str)
+    P, S = len(jugadores), len(SUPERFICIES)
+    inicio = time.perf_counter()
+    with medir("sistema"):
+        A, b, puntos = sistema(obs, jugadores, fecha_ref)
+    x0, reusados = arranque(previo, jugadores, A.shape[0], float(np.average(obs['ganados'] / obs['puntos'], weights=obs['puntos'])))
+    iteraciones = [0]
+    def contar(_): iteraciones[0] += 1
+    with medir("cg"):
+        diag = A.diagonal()
+        x, info = cg(A, b, x0=x0, rtol=TOLERANCIA, maxiter=MAX_ITER, callback=contar,
+                     M=sparse.diags(1 / diag)) # Jacobi: los jugadores con muchos puntos no dominan el condicionamiento
+    if info > 0: print(f"⚠️ CG sin converger en {MAX_ITER} iteraciones (se guarda la última solución)")
+    return {
+        'fecha_ref': str(fecha_ref.date()), 'superficies': SUPERFICIES, 'jugadores': jugadores.tolist(),
+        'mu': x[:S], 'saque': x[S:S + P], 'resto': x[S + P:S + 2*P],
+        'saque_sup': x[S + 2*P:S + 2*P + P*S].reshape(P, S), 'resto_sup': x[S + 2*P + P*S:].reshape(P, S),
+        'puntos_efectivos': puntos, 'iteraciones': iteraciones[0], 'arranque_en_caliente': reusados,
+        'residuo': float(np.linalg.norm(A @ x - b) / np.linalg.norm(b)), 'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+def ajustar_ratings(df=None):
+    """Etapa del pipeline: recibe el CSV maestro de la descarga en memoria (o lo lee) y reutiliza los ratings de ayer."""
+    print("--- 🎯 Ratings de saque/resto ajustados por rival ---")
+    if df is None: df = pd.read_csv(NOMBRE_ARCHIVO, usecols=lambda c: c in COLUMNAS)
+    previo = cargar(ARCHIVO_RATINGS, mmap=False) if os.path.exists(ARCHIVO_RATINGS) else None
+    with medir("observaciones"):
+        obs = observaciones(df)
+    r = ajustar(obs, previo)
+    guardar(r, ARCHIVO_RATINGS)
+    print(f"✅ Ratings de {len(r['jugadores'])} jugadores ({len(obs)} observaciones): {r['iteraciones']} iteraciones CG, "
+          f"{r['segundos']:.2f}s, residuo {r['residuo']:.1e} (arranque desde {r['arranque_en_caliente']} jugadores de ayer)")
+    return r
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ratings de saque/resto ajustados por rival")
+    parser.add_argument("--top", type=int, default=15, help="Mejores jugadores (saque + resto) a mostrar")
+    parser.add_argument("--min-puntos", type=float, default=500, help="Puntos efectivos mínimos para el top")
+    args = parser.parse_args()
+
+    r = ajustar_ratings()
+    t = tabla(r)
+    t = t[t['puntos_efectivos'] >= args.min_puntos]
+    print(t.assign(total=t['saque'] + t['resto']).nlargest(args.top, 'total').round(4).to_string(index=False))
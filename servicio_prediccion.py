@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from artefactos import cargar, firma
+from inferencia import SUPERFICIES, FORMATOS, indexar_jugadores, predecir_lote, mezclar
+from simulador import curvas_tenis, prob_saque, TOUR_AVG
+from matriz_enfrentamientos import cargar_matriz, consultar, ARCHIVO_INDICE, ARCHIVO_MATRIZ
+from indice_h2h import cargar_h2h, consultar_h2h, ARCHIVO_H2H
+from compilador_modelos import cargar_modelo, COMPILADOS
+
+# ==============================================================================
+#                  SERVICIO LOCAL DE PREDICCIÓN (TENIS, EN LOTE)
+# ==============================================================================
+# Carga modelo, DB de jugadores, matriz de enfrentamientos e índice H2H UNA vez y responde
+# lotes de partidos por HTTP local:
+#
+#   python servicio_prediccion.py                 -> http://127.0.0.1:8765
+#   POST /predecir  {"partidos": [{"j1": "Alcaraz C.", "j2": "Sinner J.", "superficie": "Clay", "best_of": 5}]}
+#   GET  /salud
+#
+# Si el job nocturno reemplaza algún artefacto, se recarga en la siguiente petición.
+
+PUERTO = 8765
+ARCHIVOS = ['db_players.joblib', 'modelo_calibrado.joblib', COMPILADOS['modelo_calibrado.joblib'], 'features.joblib',
+            ARCHIVO_H2H, ARCHIVO_INDICE, ARCHIVO_MATRIZ]
+
+class Predictor:
+    # Todo lo cargado vive en un único dict (self.estado) que se sustituye de una vez: una petición
+    # lee la referencia al empezar y trabaja con ella, así nunca mezcla el modelo viejo con la DB nueva
+    # aunque el job nocturno recargue a mitad de lote (ThreadingHTTPServer: un hilo por petición).
+    def __init__(self):
+        self.estado = None
+        self.lock = threading.Lock()
+        self.recargar_si_cambia()
+
+    def recargar_si_cambia(self):
+        """Devuelve el estado vigente, recargándolo antes si algún artefacto cambió en disco."""
+        version = firma(*ARCHIVOS)
+        estado = self.estado
+        if estado is not None and estado['version'] == version: return estado
+        with self.lock:
+            estado = self.estado
+            if estado is not None and estado['version'] == version: return estado
+            start = time.time()
+            db = cargar('db_players.joblib', mmap=False)
+            nuevo = {'version': version, 'db_idx': indexar_jugadores(db)}
+            try:
+                # Peticiones de pocas filas: el modelo compilado evita el coste fijo de predict_proba
+                nuevo['modelo'], nuevo['features'] = cargar_modelo('modelo_calibrado.joblib'), cargar('features.joblib', mmap=False)
+            except FileNotFoundError:
+                nuevo['modelo'], nuevo['features'] = None, None
+            nuevo['h2h'] = cargar_h2h() if os.path.exists(ARCHIVO_H2H) else None
+            nuevo['matriz'] = cargar_matriz()
+            self.estado = nuevo # Una sola asignación: las peticiones en curso siguen con el anterior
+            print(f"♻️ Artefactos cargados en {time.time()-start:.2f}s ({len(nuevo['db_idx'])} jugadores)")
+            return nuevo
+
+    def predecir(self, partidos):
+        """Lista de {j1, j2, superficie, best_of} -> lista de resultados (mismo orden)."""
+        e = self.recargar_si_cambia()
+        db_idx = e['db_idx']
+        res, validos = [], []
+        for i, p in enumerate(partidos):
+            j1, j2 = p.get('j1'), p.get('j2')
+            sup, bo = p.get('superficie', 'Hard'), int(p.get('best_of', 3))
+            r = {'j1': j1, 'j2': j2, 'superficie': sup, 'best_of': bo}
+            if j1 not in db_idx.index or j2 not in db_idx.index: r['error'] = "Jugador desconocido"
+            elif j1 == j2: r['error'] = "Mismo jugador"
+            elif sup not in SUPERFICIES or bo not in FORMATOS: r['error'] = f"Superficie {SUPERFICIES} / best_of {FORMATOS}"
+            else: validos.append(i)
+            res.append(r)
+        if not validos: return res
+
+        # 1. Jugadores activos: modelo y simulación salen de la matriz precalculada (microsegundos)
+        sin_modelo, en_vivo = [], {bo: [] for bo in FORMATOS}
+        for i in validos:
+            r = res[i]
+            c = consultar(e['matriz'], r['j1'], r['j2'], r['superficie'], r['best_of'])
+            if c is None:
+                en_vivo[r['best_of']].append(i)
+                sin_modelo.append(i)
+                continue
+            r['p_simulacion'], r['juegos_esperados'] = c['p_win'], c['media_juegos']
+            if c['grid_modelo'] is not None:
+                r['p_modelo'] = float(c['grid_modelo'][SUPERFICIES.index(r['superficie']), FORMATOS.index(r['best_of'])])
+            else: sin_modelo.append(i)
+
+        # 2. Resto: una sola llamada al modelo para todas las parejas distintas del lote...
+        if e['modelo'] is not None and sin_modelo:
+            pares = sorted({(res[i]['j1'], res[i]['j2']) for i in sin_modelo})
+            grid = predecir_lote(e['modelo'], e['features'], db_idx, [a for a, _ in pares], [b for _, b in pares])
+            pos = {par: k for k, par in enumerate(pares)}
+            for i in sin_modelo:
+                r = res[i]
+                r['p_modelo'] = float(grid[pos[(r['j1'], r['j2'])], SUPERFICIES.index(r['superficie']), FORMATOS.index(r['best_of'])])
+
+        # ...y motor exacto vectorizado por formato
+        for bo, idx in en_vivo.items():
+            if not idx: continue
+            d1, d2 = db_idx.loc[[res[i]['j1'] for i in idx]], db_idx.loc[[res[i]['j2'] for i in idx]]
+            sups = [res[i]['superficie'] for i in idx]
+            ret1, ret2 = d1['ewma_return'].fillna(1-TOUR_AVG).to_numpy(), d2['ewma_return'].fillna(1-TOUR_AVG).to_numpy()
+            p1 = [prob_saque(s, r, sup) for s, r, sup in zip(d1['ewma_serve'], ret2, sups)]
+            p2 = [prob_saque(s, r, sup) for s, r, sup in zip(d2['ewma_serve'], ret1, sups)]
+            c = curvas_tenis(p1, p2, bo)
+            for k, i in enumerate(idx):
+                res[i]['p_simulacion'], res[i]['juegos_esperados'] = float(c['p_win'][k]), float(c['media_juegos'][k])
+
+        # 3. Mezcla + H2H
+        for i in validos:
+            r = res[i]
+            p = mezclar(r['p_modelo'], r['p_simulacion']) if 'p_modelo' in r else r['p_simulacion']
+            r['p_j1'] = float(p)
+            r['cuota_justa_j1'], r['cuota_justa_j2'] = 1/max(p, 1e-6), 1/max(1-p, 1e-6)
+            if e['h2h'] is not None: r['h2h'] = consultar_h2h(e['h2h'], r['j1'], r['j2'])
+        return res
+
+# --- HTTP ---
+def crear_manejador(predictor):
+    class Manejador(BaseHTTPRequestHandler):
+        def responder(self, codigo, datos):
+            cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            if self.path != '/salud': return self.responder(404, {'error': 'Ruta desconocida'})
+            e = predictor.recargar_si_cambia()
+            self.responder(200, {'ok': True, 'jugadores': len(e['db_idx']), 'modelo': e['modelo'] is not None,
+                                 'matriz': e['matriz'] is not None, 'h2h': e['h2h'] is not None})
+
+        def do_POST(self):
+            if self.path != '/predecir': return self.responder(404, {'error': 'Ruta desconocida'})
+            start = time.perf_counter()
+            try:
+                datos = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                resultados = predictor.predecir(datos.get('partidos', []))
+            except (ValueError, TypeError, AttributeError) as e:
+                return self.responder(400, {'error': f"Petición no válida: {e}"})
+            self.responder(200, {'resultados': resultados, 'ms': round((time.perf_counter() - start) * 1000, 2)})
+
+        def log_message(self, *args): pass # Sin una línea por petición en consola
+    return Manejador
+
+def predecir_remoto(partidos, puerto=PUERTO, timeout=5):
+    """Cliente: lanza el lote contra el servicio. None si no está levantado."""
+    import urllib.request, urllib.error
+    peticion = urllib.request.Request(f"http://127.0.0.1:{puerto}/predecir", method='POST',
+                                      data=json.dumps({'partidos': partidos}).encode('utf-8'),
+                                      headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as r:
+            return json.loads(r.read())['resultados']
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio local de predicción de tenis")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    args = parser.parse_args()
+
+    if not os.path.exists('db_players.joblib'):
+        print("❌ Faltan archivos. Ejecuta 'actualizar_todo.py' primero.")
+        sys.exit(1)
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.puerto), crear_manejador(Predictor()))
+    print(f"🚀 Servicio de predicción en http://127.0.0.1:{args.puerto} (POST /predecir, GET /salud)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Servicio detenido.")
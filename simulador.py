@@ -0,0 +1,302 @@
+import math
+import random
+import numpy as np
+
+# ==============================================================================
+#                      MOTORES MONTE CARLO (TENIS + NBA)
+# ==============================================================================
+# Extraídos de app.py para poder reutilizarlos (benchmarks, CLI, batch) sin Streamlit.
+
+# --- TENIS ---
+def sim_point(prob): return 1 if random.random() < prob else 0
+
+def sim_game(prob):
+    p1, p2 = 0, 0
+    while True:
+        if sim_point(prob): p1+=1
+        else: p2+=1
+        if p1>=4 and p1>=p2+2: return 1, p1+p2
+        if p2>=4 and p2>=p1+2: return 0, p1+p2
+
+def sim_tiebreak(pa, pb):
+    """A saca el primer punto; después cada jugador saca dos puntos seguidos (A, B, B, A, A...)."""
+    ta, tb = 0, 0
+    while True:
+        if ((ta+tb+1)//2) % 2 == 0:
+            if sim_point(pa): ta+=1
+            else: tb+=1
+        else:
+            if sim_point(pb): tb+=1
+            else: ta+=1
+        if ta>=7 and ta>=tb+2: return 1, ta+tb
+        if tb>=7 and tb>=ta+2: return 0, ta+tb
+
+def sim_set(p1_p, p2_p, saca_p1=True):
+    g1, g2, pts = 0, 0, 0
+    while True:
+        if ((g1+g2) % 2 == 0) == saca_p1:
+            w, p = sim_game(p1_p); pts+=p
+            if w: g1+=1
+            else: g2+=1
+        else:
+            w, p = sim_game(p2_p); pts+=p
+            if w: g2+=1
+            else: g1+=1
+        if max(g1, g2)>=6 and abs(g1-g2)>=2: return g1, g2, pts
+        if g1==6 and g2==6: break
+    # Tiebreak (lo abre quien abrió el set: se han jugado 12 juegos)
+    if saca_p1: w, p = sim_tiebreak(p1_p, p2_p)
+    else:
+        w, p = sim_tiebreak(p2_p, p1_p); w = 1 - w
+    return (7, 6, pts+p) if w else (6, 7, pts+p)
+
+# --- RESULTADO COMPACTO ---
+# Los Monte Carlo no devuelven una fila por muestra sino conteos enteros por cubeta + momentos:
+# el tamaño no depende de n (lo que viaja desde el pool de procesos y al navegador es fijo) y los
+# mercados salen de los conteos (exactos si la línea cae en un borde de cubeta, p.ej. x.5 con ancho 0.5).
+def histograma(valores, ancho=1.0, discreta=False):
+    """Conteos por cubeta [k·ancho, (k+1)·ancho) desde la primera ocupada. `discreta`: valores enteros."""
+    v = np.asarray(valores, dtype=float)
+    cubeta = np.floor(v / ancho).astype(np.int64)
+    inicio = int(cubeta.min())
+    return {'inicio': inicio, 'ancho': ancho, 'discreta': discreta, 'conteos': np.bincount(cubeta - inicio).astype(np.int32),
+            'n': int(v.size), 'media': float(v.mean()), 'std': float(v.std())}
+
+def prob_mayor(h, x):
+    """P(X > x) desde un histograma (x escalar o array)."""
+    bordes = (h['inicio'] + np.arange(len(h['conteos']))) * h['ancho']
+    x = np.asarray(x, dtype=float)[..., None]
+    dentro = bordes > x if h['discreta'] else bordes >= x # Continua: P(X = borde) = 0
+    return (dentro * h['conteos']).sum(axis=-1) / h['n']
+
+def reagrupar(h, ancho):
+    """(centros, probabilidades) con cubetas más anchas, para pintar: el gráfico recibe ~decenas de barras."""
+    k = max(1, int(round(ancho / h['ancho'])))
+    conteos = np.add.reduceat(h['conteos'], np.arange(0, len(h['conteos']), k))
+    izquierda = (h['inicio'] + np.arange(0, len(h['conteos']), k)) * h['ancho']
+    return izquierda + (k * h['ancho'] - (1 if h['discreta'] else 0)) / 2, conteos / h['n']
+
+def run_monte_carlo_tennis(p1_prob, p2_prob, best_of, n=1500):
+    ganador, total, diff = np.empty(n, np.int8), np.empty(n, np.int16), np.empty(n, np.int16)
+    target = 2 if best_of==3 else 3
+    for k in range(n):
+        s1, s2, tg, gp1, gp2 = 0, 0, 0, 0, 0
+        saca_p1 = True
+        while s1<target and s2<target:
+            g1, g2, _ = sim_set(p1_prob, p2_prob, saca_p1)
+            if g1>g2: s1+=1
+            else: s2+=1
+            tg += g1+g2; gp1+=g1; gp2+=g2
+            if (g1+g2) % 2: saca_p1 = not saca_p1 # Abre el set siguiente quien restó el último juego
+        ganador[k], total[k], diff[k] = 0 if s1>s2 else 1, tg, gp1-gp2
+    return {'n': n, 'victorias': np.bincount(ganador, minlength=2), # [J1, J2]
+            'total_games': histograma(total, discreta=True), 'diff_games': histograma(diff, discreta=True)}
+
+# --- TENIS EXACTO (PROGRAMACIÓN DINÁMICA, VECTORIZADO) ---
+# Mismo modelo que el Monte Carlo (puntos i.i.d. con la prob. de saque de cada jugador) pero
+# resuelto de forma exacta y para N parejas a la vez: p1 y p2 pueden ser arrays.
+TOUR_AVG = 0.64
+AJUSTE_SUPERFICIE = {'Clay': -0.04, 'Grass': 0.03, 'Hard': 0.01}
+LIMITES_SAQUE = (0.45, 0.85)
+MAX_JUEGOS = {3: 39, 5: 65}
+MAX_DIFF = {3: 12, 5: 18}
+# Marcadores finales de set desde el punto de vista de quien lo abre: primero los que gana
+RESULTADOS_SET = [(6, k) for k in range(5)] + [(7, 5), (7, 6)] + [(k, 6) for k in range(5)] + [(5, 7), (6, 7)]
+
+def prob_saque(serve, ret_rival, superficie, tour=TOUR_AVG, ajuste=None):
+    """Log5 ajustado: saque histórico - calidad al resto del rival + ajuste de superficie.
+    `tour` y `ajuste` solo cambian en el modo what-if de la app."""
+    ajuste = AJUSTE_SUPERFICIE.get(superficie, 0.01) if ajuste is None else ajuste
+    return np.clip(serve - (ret_rival - (1-tour)) + ajuste, *LIMITES_SAQUE)
+
+def prob_juego(p):
+    """P(el que saca gana el juego) con prob. p por punto."""
+    q = 1 - p
+    return p**4 * (1 + 4*q + 10*q**2) + 20 * p**3 * q**3 * p**2 / (1 - 2*p*q)
+
+def prob_tiebreak(pa, pb):
+    """P(A gana el tie-break) sacando A el primer punto (rotación A, B, B, A, A...)."""
+    P = np.zeros((8, 8) + np.shape(pa))
+    P[0, 0] = 1
+    for k in range(12):
+        saca_a = ((k+1)//2) % 2 == 0
+        pw = pa if saca_a else 1 - pb
+        for a in range(max(0, k-6), min(k, 6) + 1):
+            b = k - a
+            P[a+1, b] += P[a, b] * pw
+            P[a, b+1] += P[a, b] * (1 - pw)
+    # Desde 6-6 cada pareja de puntos tiene un saque de cada uno: gana quien se adelante 2
+    gana, pierde = pa * (1 - pb), (1 - pa) * pb
+    return P[7, :6].sum(axis=0) + P[6, 6] * gana / (gana + pierde)
+
+def distribucion_set(pa, pb):
+    """Probabilidad de cada marcador de RESULTADOS_SET (forma (14,) + shape), abriendo A el set."""
+    ha, hb = prob_juego(pa), prob_juego(pb)
+    G = np.zeros((8, 8) + np.shape(pa))
+    G[0, 0] = 1
+    for k in range(12):
+        pw = ha if k % 2 == 0 else 1 - hb
+        for i in range(max(0, k-6), min(k, 6) + 1):
+            j = k - i
+            if (i == 6 and j <= 4) or (j == 6 and i <= 4): continue # Set terminado
+            G[i+1, j] += G[i, j] * pw
+            G[i, j+1] += G[i, j] * (1 - pw)
+    tb = prob_tiebreak(pa, pb)
+    G[7, 6], G[6, 7] = G[6, 6] * tb, G[6, 6] * (1 - tb)
+    return np.stack([G[i, j] for i, j in RESULTADOS_SET])
+
+def distribucion_tenis(p1, p2, best_of):
+    """Distribución exacta del partido para N parejas: P(gana J1), pmf de juegos totales
+    (índice = nº de juegos) y pmf de la diferencia de juegos J1-J2 (índice = diff + MAX_DIFF)."""
+    p1, p2 = np.atleast_1d(np.asarray(p1, dtype=float)), np.atleast_1d(np.asarray(p2, dtype=float))
+    n, target = len(p1), (2 if best_of == 3 else 3)
+    n_t, off = MAX_JUEGOS[best_of] + 1, MAX_DIFF[best_of]
+    # Sets abiertos por J1 y por J2 (los marcadores de J2 se giran al punto de vista de J1)
+    por_saque = {True: distribucion_set(p1, p2), False: distribucion_set(p2, p1)}
+    marcadores = {True: RESULTADOS_SET, False: [(j, i) for i, j in RESULTADOS_SET]}
+
+    # Estado (sets J1, sets J2, abre J1) -> [masa por juegos totales, masa por diferencia]
+    estados = {(0, 0, True): [np.zeros((n, n_t)), np.zeros((n, 2*off + 1))]}
+    estados[(0, 0, True)][0][:, 0] = 1
+    estados[(0, 0, True)][1][:, off] = 1
+    p_win, pmf_t, pmf_d = np.zeros(n), np.zeros((n, n_t)), np.zeros((n, 2*off + 1))
+    for total_sets in range(2*target - 1):
+        siguientes = {}
+        for (s1, s2, abre), (mt, md) in estados.items():
+            if s1 + s2 != total_sets: continue
+            for (g1, g2), pr in zip(marcadores[abre], por_saque[abre]):
+                t, d = g1 + g2, g1 - g2
+                clave = (s1 + (g1 > g2), s2 + (g2 > g1), abre if t % 2 == 0 else not abre)
+                nt, nd = siguientes.setdefault(clave, [np.zeros((n, n_t)), np.zeros((n, 2*off + 1))])
+                nt[:, t:] += mt[:, :n_t-t] * pr[:, None]
+                if d >= 0: nd[:, d:] += md[:, :2*off+1-d] * pr[:, None]
+                else: nd[:, :d] += md[:, -d:] * pr[:, None]
+        for clave, (mt, md) in siguientes.items():
+            if max(clave[0], clave[1]) == target:
+                pmf_t += mt; pmf_d += md
+                if clave[0] == target: p_win += mt.sum(axis=1)
+            else:
+                estados[clave] = [mt, md]
+    return p_win, pmf_t, pmf_d
+
+def distribucion_conjunta_tenis(p1, p2, best_of):
+    """Igual que distribucion_tenis pero CONJUNTA: array (n, 2, juegos totales, diff J1-J2 + MAX_DIFF),
+    [:, 1] = gana J1. Sirve para combinar mercados del mismo partido (ganador + total + hándicap)."""
+    p1, p2 = np.atleast_1d(np.asarray(p1, dtype=float)), np.atleast_1d(np.asarray(p2, dtype=float))
+    n, target = len(p1), (2 if best_of == 3 else 3)
+    n_t, off = MAX_JUEGOS[best_of] + 1, MAX_DIFF[best_of]
+    n_d = 2*off + 1
+    por_saque = {True: distribucion_set(p1, p2), False: distribucion_set(p2, p1)}
+    marcadores = {True: RESULTADOS_SET, False: [(j, i) for i, j in RESULTADOS_SET]}
+
+    inicial = np.zeros((n, n_t, n_d))
+    inicial[:, 0, off] = 1
+    estados = {(0, 0, True): inicial}
+    conjunta = np.zeros((n, 2, n_t, n_d))
+    for total_sets in range(2*target - 1):
+        siguientes = {}
+        for (s1, s2, abre), m in estados.items():
+            if s1 + s2 != total_sets: continue
+            for (g1, g2), pr in zip(marcadores[abre], por_saque[abre]):
+                t, d = g1 + g2, g1 - g2
+                clave = (s1 + (g1 > g2), s2 + (g2 > g1), abre if t % 2 == 0 else not abre)
+                destino = siguientes.setdefault(clave, np.zeros((n, n_t, n_d)))
+                # Desplazar t juegos en el total y d en la diferencia
+                destino[:, t:, max(0, d):n_d-max(0, -d)] += m[:, :n_t-t, max(0, -d):n_d-max(0, d)] * pr[:, None, None]
+        for clave, m in siguientes.items():
+            if max(clave[0], clave[1]) == target: conjunta[:, int(clave[0] == target)] += m
+            else: estados[clave] = m
+    return conjunta
+
+def curvas_tenis(p1, p2, best_of):
+    """Resumen compacto del partido (lo mismo que guarda la matriz de enfrentamientos):
+    P(gana J1), media y desviación de juegos, P(juegos > k) y P(diff J1-J2 > d) con d = índice - MAX_DIFF."""
+    p_win, pmf_t, pmf_d = distribucion_tenis(p1, p2, best_of)
+    k = np.arange(pmf_t.shape[1])
+    media = pmf_t @ k
+    return {
+        'p_win': p_win, 'media_juegos': media, 'std_juegos': np.sqrt(np.maximum(pmf_t @ k**2 - media**2, 0)),
+        'surv_total': np.clip(1 - np.cumsum(pmf_t, axis=1), 0, 1), 'surv_diff': np.clip(1 - np.cumsum(pmf_d, axis=1), 0, 1),
+    }
+
+# --- BANDAS CREÍBLES (INCERTIDUMBRE DE LOS PARÁMETROS) ---
+# Las EWMA de saque/resto y de ritmo/ataque son estimaciones: crear_ia*.py exporta su desviación
+# típica (sd_serve, sd_return, SD_PACE, SD_OFF_RTG), que crece cuanto menos historia hay detrás.
+# Se sacan N_MUESTRAS juegos de parámetros y el motor exacto (vectorizado por filas) los evalúa
+# todos en UNA llamada junto con el punto central: en Bo5 ~30 ms frente a ~5 ms del partido suelto.
+N_MUESTRAS = 200
+CUANTILES = (0.05, 0.5, 0.95)  # intervalo creíble del 90% + mediana
+SEMILLA = 0                     # Muestras fijas: el mismo cruce da siempre las mismas bandas (cacheables)
+
+def sd_saque(sd_serve, sd_return_rival):
+    """Desviación de prob_saque: saque propio y resto del rival son independientes (se suman varianzas)."""
+    return float(np.hypot(sd_serve, sd_return_rival))
+
+def curvas_tenis_bandas(p1, sd1, p2, sd2, best_of, n=N_MUESTRAS, semilla=SEMILLA):
+    """curvas_tenis del punto (escalares) + 'bandas': cuantiles de P(gana J1) y de la media de juegos
+    sobre n muestras normales de las probabilidades de saque (recortadas igual que en prob_saque)."""
+    z = np.random.default_rng(semilla).standard_normal((2, n))
+    m1 = np.clip(p1 + sd1 * z[0], *LIMITES_SAQUE)
+    m2 = np.clip(p2 + sd2 * z[1], *LIMITES_SAQUE)
+    c = curvas_tenis(np.r_[p1, m1], np.r_[p2, m2], best_of)
+    res = {k: v[0] for k, v in c.items()}
+    res['bandas'] = {k: np.quantile(c[k][1:], CUANTILES) for k in ('p_win', 'media_juegos')}
+    return res
+
+# --- NBA ---
+VENTAJA_LOCAL = 3   # puntos
+RUIDO_NBA = 12      # desviación típica de los puntos de cada equipo
+
+ANCHO_NBA = 0.5     # cubeta de puntos: totales (x.5 / enteros) y hándicaps (x.5) caen en bordes -> exactos
+
+def run_monte_carlo_nba(t1_stats, t2_stats, n=2000):
+    pace = (t1_stats['EWMA_PACE'] + t2_stats['EWMA_PACE']) / 2
+    off1 = t1_stats['EWMA_OFF_RTG']
+    off2 = t2_stats['EWMA_OFF_RTG']
+    noise1, noise2 = np.random.normal(0, RUIDO_NBA, (2, n)) # Todas las muestras de una vez
+    pts1 = ((pace/100) * off1) + VENTAJA_LOCAL + noise1
+    pts2 = ((pace/100) * off2) + noise2
+    gana_local = int((pts1 > pts2).sum())
+    return {'n': n, 'victorias': np.array([gana_local, n - gana_local]), # [local, visitante]
+            'total_pts': histograma(pts1 + pts2, ANCHO_NBA), 'diff': histograma(pts1 - pts2, ANCHO_NBA)}
+
+def _surv(S, filas, k, offset):
+    """S[fila, k + offset] = P(X > k) con relleno fuera de rango (1 por debajo, 0 por encima)."""
+    idx = np.asarray(k, dtype=np.int64) + offset
+    dentro = np.clip(idx, 0, S.shape[1] - 1)
+    return np.where(idx < 0, 1.0, np.where(idx >= S.shape[1], 0.0, S[filas, dentro]))
+
+def probs_discretas(S, filas, x, offset):
+    """Variable entera con supervivencia S (una fila por partido, p.ej. surv_total / surv_diff de
+    curvas_tenis): P(X > x), P(X = x) (push si x es entero). Líneas fuera de rango: 1 / 0, sin error."""
+    x = np.asarray(x, dtype=float)
+    mayor = _surv(S, filas, np.floor(x), offset)
+    entero = x == np.round(x)
+    igual = np.where(entero, _surv(S, filas, np.round(x) - 1, offset) - _surv(S, filas, np.round(x), offset), 0.0)
+    return mayor, igual
+
+# --- NBA EXACTO ---
+# El Monte Carlo de arriba suma dos normales independientes: total y diferencia también son
+# normales (media exacta, desviación RUIDO_NBA * raíz de 2), así que no hace falta muestrear.
+def supervivencia_normal(x, media, std):
+    """P(X > x) con X ~ N(media, std). Vectorizado."""
+    z = (np.asarray(x, dtype=float) - media) / (std * np.sqrt(2))
+    return 0.5 * np.vectorize(math.erfc, otypes=[float])(z)
+
+def curvas_nba(pace1, off1, pace2, off2, ventaja=VENTAJA_LOCAL, ruido=RUIDO_NBA):
+    """Arrays por partido (local, visitante) -> medias y desviaciones de total y diferencia + P(gana local)."""
+    pace = (np.asarray(pace1, dtype=float) + np.asarray(pace2, dtype=float)) / 2
+    pts1 = pace / 100 * np.asarray(off1, dtype=float) + ventaja
+    pts2 = pace / 100 * np.asarray(off2, dtype=float)
+    std = np.full(pace.shape, ruido * np.sqrt(2))
+    media_diff = pts1 - pts2
+    return {'p_win': supervivencia_normal(0, media_diff, std), 'media_total': pts1 + pts2, 'std_total': std,
+            'media_diff': media_diff, 'std_diff': std}
+
+def bandas_nba(local, visitante, n=N_MUESTRAS, semilla=SEMILLA):
+    """Cuantiles de P(gana local), total y diferencia sobre n muestras del ritmo y el ataque de cada
+    equipo (una sola llamada a curvas_nba). Sin columnas SD_* (DB antigua) la banda es el punto."""
+    z = iter(np.random.default_rng(semilla).standard_normal((4, n)))
+    def muestra(d, col): return d[f'EWMA_{col}'] + d.get(f'SD_{col}', 0) * next(z)
+    c = curvas_nba(muestra(local, 'PACE'), muestra(local, 'OFF_RTG'), muestra(visitante, 'PACE'), muestra(visitante, 'OFF_RTG'))
+    return {k: np.quantile(c[k], CUANTILES) for k in ('p_win', 'media_total', 'media_diff')}
@@ -0,0 +1,313 @@
+import os
+import sys
+import time
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from artefactos import cargar, firma
+from simulador import prob_saque, curvas_tenis, curvas_nba, supervivencia_normal, probs_discretas, TOUR_AVG, MAX_DIFF
+from inferencia import SUPERFICIES, FORMATOS, indexar_jugadores, predecir_lote, mezclar
+from matriz_enfrentamientos import cargar_matriz, consultar
+from indice_nombres import cargar_indice, construir_indice, buscar
+from almacen_features import cargar_almacen, db_asof, consultar as consultar_asof
+
+# ==============================================================================
+#              TARIFICADOR DE CARTELERA (TODOS LOS PARTIDOS DEL DÍA)
+# ==============================================================================
+# Lee un fichero con los partidos del día y pone precio a todos de una vez:
+#
+#   python tarificar_cartelera.py cartelera.csv [--salida precios] [--n-jobs -1]
+#
+# Columnas de la cartelera (CSV o JSON con una lista de objetos):
+#   deporte         tenis | nba (opcional con --deporte)
+#   j1, j2          jugadores (tenis) o local, visitante (NBA). Vale el nombre aproximado
+#   superficie      Hard | Clay | Grass (tenis, por defecto Hard)
+#   best_of         3 | 5 (tenis, por defecto 3)
+#   linea_total, linea_handicap, cuota_j1, cuota_j2, cuota_over, cuota_under   (opcionales, de la casa)
+#   fecha           (opcional, o --fecha) partidos pasados: features a esa fecha del almacén as-of
+#
+# Salida columnar: <salida>.parquet (un partido por fila) y <salida>_escaleras.parquet (Over/Under y
+# hándicaps en formato largo). Sin pyarrow se escribe CSV.
+# Cada cruce distinto se calcula una sola vez: jugadores activos desde la matriz nocturna, el resto con
+# el motor exacto repartido entre procesos. El modelo se llama una vez para todas las parejas.
+
+COLUMNAS_CASA = ['linea_total', 'linea_handicap', 'cuota_j1', 'cuota_j2', 'cuota_over', 'cuota_under']
+# p_*_casa: probabilidades en las líneas de la casa; p_push_*: devolución en líneas enteras (tenis)
+COLUMNAS_PRECIO = ['p_modelo', 'p_simulacion', 'p_j1', 'media_total', 'std_total', 'p_over_casa', 'p_push_total_casa',
+                   'p_handicap_casa', 'p_push_handicap_casa']
+HANDICAPS_TENIS = np.arange(-5.5, 6, 1.0)
+PASOS_TOTAL = np.arange(-3, 4)          # líneas alrededor de la media (tenis: juegos, NBA: x3 puntos)
+PASOS_HANDICAP_NBA = np.arange(-3, 4) * 3
+MIN_POR_PROCESO = 256                   # por debajo, lanzar procesos cuesta más que el cálculo
+
+# --- LECTURA ---
+def leer_cartelera(ruta, deporte=None):
+    df = pd.read_json(ruta) if ruta.endswith('.json') else pd.read_csv(ruta)
+    df.columns = [c.strip().lower() for c in df.columns]
+    if 'deporte' not in df.columns:
+        if deporte is None: raise ValueError("La cartelera no tiene columna 'deporte': usa --deporte tenis|nba")
+        df['deporte'] = deporte
+    df['deporte'] = df['deporte'].str.lower().str.strip()
+    if 'superficie' not in df.columns: df['superficie'] = 'Hard'
+    if 'best_of' not in df.columns: df['best_of'] = 3
+    df['superficie'] = df['superficie'].fillna('Hard').astype(str).str.capitalize()
+    df['best_of'] = pd.to_numeric(df['best_of'], errors='coerce').fillna(3).astype(int)
+    for c in COLUMNAS_CASA:
+        df[c] = pd.to_numeric(df[c], errors='coerce') if c in df.columns else np.nan
+    # Sin fecha (NaT) = precio con las features de hoy
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce').dt.normalize() if 'fecha' in df.columns else pd.NaT
+    return df.reset_index(drop=True)
+
+def resolver_nombres(nombres, indice, conocidos):
+    """Nombre de la cartelera -> nombre canónico (exacto o el mejor de la búsqueda difusa). None si no hay."""
+    res, cache = [], {}
+    for n in nombres:
+        if n not in cache:
+            if n in conocidos: cache[n] = n
+            else:
+                cache[n] = next((c for c in buscar(indice, str(n), limite=5) if c in conocidos), None)
+                if cache[n]: print(f"   🔎 '{n}' -> {cache[n]}")
+        res.append(cache[n])
+    return res
+
+# --- TENIS ---
+def curvas_repartidas(p1, p2, best_of, n_jobs):
+    """curvas_tenis troceado entre procesos (solo si hay bastantes cruces)."""
+    n_trozos = max(1, min(len(p1) // MIN_POR_PROCESO, os.cpu_count() if n_jobs < 0 else n_jobs))
+    if n_trozos == 1: return curvas_tenis(p1, p2, best_of)
+    trozos = np.array_split(np.arange(len(p1)), n_trozos)
+    partes = Parallel(n_jobs=n_trozos)(delayed(curvas_tenis)(p1[t], p2[t], best_of) for t in trozos)
+    return {k: np.concatenate([c[k] for c in partes]) for k in partes[0]}
+
+@lru_cache(maxsize=1)
+def cargar_modelo(version):
+    """Modelo calibrado + features, una sola vez por proceso (version = firma de los ficheros)."""
+    if any(mtime is None for _, mtime, _ in version): return None, None
+    return cargar('modelo_calibrado.joblib'), cargar('features.joblib', mmap=False)
+
+def resolver_tenis(df):
+    """Nombres canónicos + columna 'error'. Devuelve también la DB de jugadores indexada."""
+    db_idx = indexar_jugadores(cargar('db_players.joblib', mmap=False))
+    conocidos = set(db_idx.index)
+    indice = cargar_indice()
+    df = df.assign(j1=resolver_nombres(df['j1'], indice, conocidos), j2=resolver_nombres(df['j2'], indice, conocidos))
+    df['error'] = np.where(df['j1'].isna() | df['j2'].isna(), "Jugador desconocido",
+                  np.where(df['j1'] == df['j2'], "Mismo jugador",
+                  np.where(~df['superficie'].isin(SUPERFICIES) | ~df['best_of'].isin(FORMATOS), "Superficie/formato no válido", None)))
+    return df, db_idx
+
+def tarificar_cruces_tenis(cruces, db_idx, n_jobs=-1, fecha=None):
+    """Cruces distintos (j1, j2, superficie, best_of) -> probabilidades + 'curva' (supervivencias del motor exacto).
+    Con `fecha`, db_idx es la DB a esa fecha y no se usa la matriz nocturna (es de hoy)."""
+    cruces = cruces.reset_index(drop=True)
+    d1, d2 = db_idx.loc[cruces['j1']], db_idx.loc[cruces['j2']]
+    ret1, ret2 = d1['ewma_return'].fillna(1-TOUR_AVG).to_numpy(), d2['ewma_return'].fillna(1-TOUR_AVG).to_numpy()
+    sups = cruces['superficie'].to_numpy()
+    saque1 = np.array([prob_saque(s, r, sup) for s, r, sup in zip(d1['ewma_serve'], ret2, sups)])
+    saque2 = np.array([prob_saque(s, r, sup) for s, r, sup in zip(d2['ewma_serve'], ret1, sups)])
+
+    # 1. Matriz nocturna (jugadores activos)
+    matriz = cargar_matriz() if fecha is None else None
+    curvas, p_modelo = [None] * len(cruces), np.full(len(cruces), np.nan)
+    for k, c in enumerate(cruces.itertuples(index=False)):
+        r = consultar(matriz, c.j1, c.j2, c.superficie, c.best_of)
+        if r is None: continue
+        curvas[k] = r
+        if r['grid_modelo'] is not None:
+            p_modelo[k] = r['grid_modelo'][SUPERFICIES.index(c.superficie), FORMATOS.index(c.best_of)]
+
+    # 2. Resto: motor exacto por formato, sin repetir parejas de probabilidades de saque
+    for bo in FORMATOS:
+        faltan = [k for k in range(len(cruces)) if curvas[k] is None and cruces['best_of'][k] == bo]
+        if not faltan: continue
+        pares, inversa = np.unique(np.round(np.c_[saque1[faltan], saque2[faltan]], 6), axis=0, return_inverse=True)
+        c = curvas_repartidas(pares[:, 0], pares[:, 1], bo, n_jobs)
+        for k, u in zip(faltan, inversa.ravel()):
+            curvas[k] = {campo: v[u] for campo, v in c.items()}
+
+    # 3. Modelo: una llamada para todas las parejas que no venían en la matriz
+    modelo, features = cargar_modelo(firma('modelo_calibrado.joblib', 'features.joblib'))
+    faltan = np.flatnonzero(np.isnan(p_modelo))
+    if modelo is not None and len(faltan):
+        pares = cruces.iloc[faltan][['j1', 'j2']].drop_duplicates()
+        grid = predecir_lote(modelo, features, db_idx, pares['j1'].to_numpy(), pares['j2'].to_numpy(), fecha=fecha)
+        pos = {par: i for i, par in enumerate(zip(pares['j1'], pares['j2']))}
+        for k in faltan:
+            c = cruces.iloc[k]
+            p_modelo[k] = grid[pos[(c['j1'], c['j2'])], SUPERFICIES.index(c['superficie']), FORMATOS.index(c['best_of'])]
+
+    p_sim = np.array([float(c['p_win']) for c in curvas])
+    cruces['saque1'], cruces['saque2'] = saque1, saque2 # Para recalcular distribuciones (combinadas)
+    cruces['p_modelo'] = p_modelo
+    cruces['p_simulacion'] = p_sim
+    cruces['p_j1'] = np.where(np.isnan(p_modelo), p_sim, mezclar(np.nan_to_num(p_modelo), p_sim))
+    cruces['media_total'] = [float(c['media_juegos']) for c in curvas]
+    cruces['std_total'] = [float(c['std_juegos']) for c in curvas]
+    cruces['curva'] = curvas
+    return cruces
+
+def tarificar_tenis(df, n_jobs=-1):
+    df, db_idx = resolver_tenis(df)
+    # Un cruce = (j1, j2, superficie, formato, fecha): los repetidos en la cartelera comparten cálculo
+    claves = ['j1', 'j2', 'superficie', 'best_of']
+    validos = df[df['error'].isna()]
+    partes = []
+    hoy = validos[validos['fecha'].isna()][claves].drop_duplicates()
+    if len(hoy):
+        partes.append(tarificar_cruces_tenis(hoy, db_idx, n_jobs).assign(fecha=pd.NaT))
+
+    # Partidos pasados: una DB as-of por fecha (búsqueda binaria en el almacén, no se re-ejecuta el pipeline)
+    if validos['fecha'].notna().any():
+        almacen = cargar_almacen('tenis')
+        for fecha, grupo in validos.groupby('fecha'):
+            db_fecha = indexar_jugadores(db_asof(almacen, fecha))
+            con_historia = grupo['j1'].isin(db_fecha.index) & grupo['j2'].isin(db_fecha.index)
+            df.loc[grupo.index[~con_historia], 'error'] = "Sin historial a esa fecha"
+            cruces = grupo.loc[con_historia, claves].drop_duplicates()
+            if len(cruces):
+                partes.append(tarificar_cruces_tenis(cruces, db_fecha, n_jobs, fecha=fecha).assign(fecha=fecha))
+
+    if not partes:
+        return df.assign(**{c: np.nan for c in COLUMNAS_PRECIO}), []
+    df = df.merge(pd.concat(partes, ignore_index=True), on=claves + ['fecha'], how='left')
+    escaleras, surv = [], []
+    for i, r in df.iterrows():
+        if not isinstance(r['curva'], dict):
+            surv.append((np.nan,) * 4); continue
+        c, bo = r['curva'], r['best_of']
+        # Cualquier línea (fuera de rango, enteras con push): P(juegos > l) y P(J1 - J2 > -h)
+        S_total, S_diff = np.asarray(c['surv_total'])[None], np.asarray(c['surv_diff'])[None]
+        p_over = lambda l: tuple(float(v) for v in probs_discretas(S_total, 0, l, 0))
+        p_cubre = lambda h: tuple(float(v) for v in probs_discretas(S_diff, 0, -h, MAX_DIFF[bo]))
+        for l in int(r['media_total']) + PASOS_TOTAL + 0.5:
+            escaleras.append({'partido': i, 'mercado': 'total', 'linea': l, 'p': p_over(l)[0]})
+        for h in HANDICAPS_TENIS:
+            escaleras.append({'partido': i, 'mercado': 'handicap_j1', 'linea': h, 'p': p_cubre(h)[0]})
+        surv.append((p_over(r['linea_total']) if pd.notna(r['linea_total']) else (np.nan, np.nan))
+                    + (p_cubre(r['linea_handicap']) if pd.notna(r['linea_handicap']) else (np.nan, np.nan)))
+    for k, col in enumerate(['p_over_casa', 'p_push_total_casa', 'p_handicap_casa', 'p_push_handicap_casa']):
+        df[col] = [s[k] for s in surv]
+    return df.drop(columns='curva'), escaleras
+
+# --- NBA ---
+def resolver_nba(df):
+    """Local/visitante canónicos + columna 'error'. Devuelve también la DB de equipos (índice = nombre)."""
+    db = cargar('nba_db_teams.joblib', mmap=False).set_index('TEAM_NAME')
+    conocidos = set(db.index)
+    indice = construir_indice(db.index)
+    df = df.assign(j1=resolver_nombres(df['j1'], indice, conocidos), j2=resolver_nombres(df['j2'], indice, conocidos))
+    df['error'] = np.where(df['j1'].isna() | df['j2'].isna(), "Equipo desconocido",
+                  np.where(df['j1'] == df['j2'], "Mismo equipo", None))
+    return df, db
+
+def estadisticas_nba(partidos, db):
+    """Local y visitante: las stats de hoy, o las del almacén as-of si el partido trae fecha."""
+    cols = ['EWMA_PACE', 'EWMA_OFF_RTG']
+    d1 = db.loc[partidos['j1'], cols].reset_index(drop=True)
+    d2 = db.loc[partidos['j2'], cols].reset_index(drop=True)
+    pasado = partidos['fecha'].notna().to_numpy()
+    if pasado.any():
+        almacen = cargar_almacen('nba')
+        for d, col in ((d1, 'j1'), (d2, 'j2')): # Una búsqueda binaria por lado, cada partido con su fecha
+            d.loc[pasado, cols] = consultar_asof(almacen, partidos.loc[pasado, col], partidos.loc[pasado, 'fecha'])[cols].to_numpy()
+    return d1, d2
+
+def tarificar_nba(df):
+    df, db = resolver_nba(df)
+    ok = df['error'].isna().to_numpy()
+    for c in COLUMNAS_PRECIO: df[c] = np.nan
+    if not ok.any(): return df, []
+
+    d1, d2 = estadisticas_nba(df.loc[ok], db)
+    sin_historia = (d1['EWMA_PACE'].isna() | d2['EWMA_PACE'].isna()).to_numpy()
+    if sin_historia.any():
+        df.loc[df.index[ok][sin_historia], 'error'] = "Sin historial a esa fecha"
+    c = curvas_nba(d1['EWMA_PACE'], d1['EWMA_OFF_RTG'], d2['EWMA_PACE'], d2['EWMA_OFF_RTG'])
+    df.loc[ok, 'p_simulacion'] = c['p_win']
+    df.loc[ok, 'p_j1'] = c['p_win']
+    df.loc[ok, 'media_total'], df.loc[ok, 'std_total'] = c['media_total'], c['std_total']
+    casa = df.loc[ok]
+    # Sin línea de la casa (NaN) la supervivencia sale NaN
+    df.loc[ok, 'p_over_casa'] = supervivencia_normal(casa['linea_total'], c['media_total'], c['std_total'])
+    df.loc[ok, 'p_handicap_casa'] = supervivencia_normal(-casa['linea_handicap'], c['media_diff'], c['std_diff'])
+    df.loc[ok, ['p_push_total_casa', 'p_push_handicap_casa']] = 0.0 # Normal: sin push
+
+    escaleras = []
+    for i, mt, st, md, sd in zip(np.flatnonzero(ok), c['media_total'], c['std_total'], c['media_diff'], c['std_diff']):
+        if np.isnan(mt): continue # Sin historial a esa fecha
+        lineas = np.round(mt) + PASOS_TOTAL * 3 + 0.5
+        for l, p in zip(lineas, supervivencia_normal(lineas, mt, st)):
+            escaleras.append({'partido': i, 'mercado': 'total', 'linea': l, 'p': float(p)})
+        hcs = np.round(-md) + PASOS_HANDICAP_NBA + 0.5
+        for h, p in zip(hcs, supervivencia_normal(-hcs, md, sd)):
+            escaleras.append({'partido': i, 'mercado': 'handicap_j1', 'linea': h, 'p': float(p)})
+    return df, escaleras
+
+# --- CARTELERA COMPLETA ---
+def tarificar(df, n_jobs=-1):
+    """Cartelera leída -> (precios: un partido por fila, escaleras: formato largo)."""
+    partes, escaleras = [], []
+    for deporte, grupo in df.groupby('deporte', sort=False):
+        if deporte == 'tenis': precios, esc = tarificar_tenis(grupo.copy(), n_jobs)
+        elif deporte == 'nba': precios, esc = tarificar_nba(grupo.copy())
+        else:
+            precios, esc = grupo.assign(error=f"Deporte '{deporte}' no soportado"), []
+        precios.index = grupo.index # Las escaleras apuntan al número de fila de la cartelera
+        esc = [{**e, 'partido': int(grupo.index[e['partido']])} for e in esc]
+        partes.append(precios); escaleras += esc
+
+    precios = pd.concat(partes).sort_index()
+    precios.insert(0, 'partido', precios.index)
+    precios['cuota_justa_j1'] = 1 / precios['p_j1'].clip(lower=1e-6)
+    precios['cuota_justa_j2'] = 1 / (1 - precios['p_j1']).clip(lower=1e-6)
+    # Valor frente a la casa (si trae cuotas): edge = prob * cuota - 1
+    precios['edge_j1'] = precios['p_j1'] * precios['cuota_j1'] - 1
+    precios['edge_j2'] = (1 - precios['p_j1']) * precios['cuota_j2'] - 1
+    # Con push (línea entera) se devuelve la apuesta: cuenta como cuota 1
+    push = precios['p_push_total_casa'].fillna(0)
+    precios['edge_over'] = precios['p_over_casa'] * precios['cuota_over'] + push - 1
+    precios['edge_under'] = (1 - precios['p_over_casa'] - push) * precios['cuota_under'] + push - 1
+
+    escaleras = pd.DataFrame(escaleras, columns=['partido', 'mercado', 'linea', 'p'])
+    escaleras['cuota_justa'] = 1 / escaleras['p'].clip(lower=1e-6)
+    escaleras['cuota_justa_contraria'] = 1 / (1 - escaleras['p']).clip(lower=1e-6)
+    return precios.reset_index(drop=True), escaleras.sort_values(['partido', 'mercado', 'linea'], kind='stable').reset_index(drop=True)
+
+def escribir(df, base):
+    """Parquet (columnar) si hay pyarrow; si no, CSV."""
+    try:
+        df.to_parquet(f"{base}.parquet", index=False)
+        return f"{base}.parquet"
+    except ImportError:
+        df.to_csv(f"{base}.csv", index=False)
+        return f"{base}.csv"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pone precio a una cartelera completa (tenis y NBA)")
+    parser.add_argument("cartelera", help="CSV o JSON con los partidos")
+    parser.add_argument("--deporte", choices=['tenis', 'nba'], help="Si la cartelera no trae columna 'deporte'")
+    parser.add_argument("--fecha", help="Cartelera pasada (YYYY-MM-DD): features a esa fecha")
+    parser.add_argument("--salida", default="precios_cartelera", help="Nombre base de los ficheros de salida")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.cartelera):
+        print(f"❌ No existe {args.cartelera}")
+        sys.exit(1)
+    start = time.time()
+    cartelera = leer_cartelera(args.cartelera, args.deporte)
+    if args.fecha: cartelera['fecha'] = pd.Timestamp(args.fecha)
+    print(f"--- 📋 CARTELERA: {len(cartelera)} partidos ({', '.join(f'{d}: {n}' for d, n in cartelera['deporte'].value_counts().items())}) ---")
+    precios, escaleras = tarificar(cartelera, args.n_jobs)
+
+    ok = precios['error'].isna()
+    resumen = precios.loc[ok, ['deporte', 'j1', 'j2', 'p_j1', 'cuota_justa_j1', 'cuota_justa_j2', 'media_total']]
+    print(resumen.head(20).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    if (~ok).any():
+        print(f"⚠️ {(~ok).sum()} partidos sin precio:")
+        print(precios.loc[~ok, ['partido', 'j1', 'j2', 'error']].to_string(index=False))
+    f1, f2 = escribir(precios, args.salida), escribir(escaleras, f"{args.salida}_escaleras")
+    print(f"✅ {ok.sum()} partidos tarificados en {time.time()-start:.2f}s -> {f1}, {f2}")
@@ -0,0 +1,132 @@
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# ==============================================================================
+#            TELEMETRÍA DE LA APP (TIEMPOS POR ETAPA + PERFIL BAJO DEMANDA)
+# ==============================================================================
+# Opcional (TELEMETRIA_APP=1 o la casilla del panel lateral). Con ella activa, cada ejecución del
+# script de Streamlit cronometra sus etapas y deja una línea en metricas_app.jsonl:
+#
+#   tel = Telemetria(activa, deporte, perfilar=...)
+#   with tel.etapa("carga"): ...          # carga de artefactos, búsquedas, simulación, tablas, Plotly...
+#   tel.terminar()                        # al final (o antes de un st.stop())
+#
+# resumen() agrega el log: p50/p95 e histograma por (deporte, etapa). "Perfilar" captura UNA
+# ejecución con cProfile (las funciones más caras + el .prof para snakeviz / pstats).
+# Desactivada, etapa() solo cuesta un if: se puede dejar el código instrumentado siempre.
+
+ARCHIVO_METRICAS = "metricas_app.jsonl"
+ACTIVA_POR_DEFECTO = os.environ.get("TELEMETRIA_APP", "0") == "1"
+CORTES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]  # Cubetas del histograma
+MAX_LINEAS_RESUMEN = 20000   # Ventana del resumen (las ejecuciones más recientes)
+TOP_FUNCIONES = 25
+
+_lock = threading.Lock() # Varias sesiones escriben el mismo log
+
+class Telemetria:
+    def __init__(self, activa, deporte, perfilar=False, ruta=ARCHIVO_METRICAS):
+        self.activa, self.deporte, self.ruta = activa or perfilar, deporte, ruta
+        self.etapas = {}
+        self.inicio = time.perf_counter()
+        self.registro, self.perfil = None, None
+        self._perfil = cProfile.Profile() if perfilar else None
+        if self._perfil: self._perfil.enable()
+
+    @contextmanager
+    def etapa(self, nombre):
+        if not self.activa:
+            yield
+            return
+        t = time.perf_counter()
+        try:
+            yield
+        finally: # Una etapa que se repite (p.ej. dos tablas) acumula
+            self.etapas[nombre] = self.etapas.get(nombre, 0) + (time.perf_counter() - t) * 1000
+
+    def terminar(self, estado="ok"):
+        """Cierra la ejecución (solo la primera vez): perfil si se pidió y una línea en el log."""
+        if not self.activa or self.registro is not None: return self.registro
+        total = (time.perf_counter() - self.inicio) * 1000
+        if self._perfil:
+            self._perfil.disable()
+            self.perfil = informe_perfil(self._perfil)
+        etapas = {k: round(v, 2) for k, v in self.etapas.items()}
+        etapas['otros'] = round(max(total - sum(self.etapas.values()), 0), 2) # Script, widgets, CSS...
+        self.registro = {'fecha': time.strftime("%Y-%m-%dT%H:%M:%S"), 'deporte': self.deporte, 'estado': estado,
+                         'total_ms': round(total, 2), 'etapas': etapas}
+        escribir(self.registro, self.ruta)
+        return self.registro
+
+def informe_perfil(perfil, top=TOP_FUNCIONES):
+    """Texto con las funciones más caras (tiempo acumulado) + el volcado binario para pstats / snakeviz."""
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).strip_dirs().sort_stats("cumulative").print_stats(top)
+    ruta = os.path.join(os.environ.get("TMPDIR", "/tmp"), f"perfil_app_{os.getpid()}_{threading.get_ident()}.prof")
+    perfil.dump_stats(ruta)
+    with open(ruta, 'rb') as f: binario = f.read()
+    os.remove(ruta)
+    return {'texto': salida.getvalue(), 'prof': binario}
+
+def escribir(registro, ruta=ARCHIVO_METRICAS):
+    linea = json.dumps(registro, ensure_ascii=False) + "\n"
+    with _lock, open(ruta, 'a', encoding='utf-8') as f:
+        f.write(linea)
+
+# --- AGREGADOS ---
+def leer(ruta=ARCHIVO_METRICAS, ultimas=MAX_LINEAS_RESUMEN):
+    try:
+        with open(ruta, encoding='utf-8') as f: lineas = f.readlines()[-ultimas:]
+    except OSError:
+        return []
+    registros = []
+    for l in lineas:
+        try: registros.append(json.loads(l))
+        except ValueError: continue # Línea a medias (escritura cortada)
+    return registros
+
+def resumen(registros, deporte=None):
+    """{deporte: {etapa: {'n', 'p50_ms', 'p95_ms', 'histograma'}}}; 'total' incluido. Solo ejecuciones completas."""
+    tiempos = {}
+    for r in registros:
+        if r.get('estado') != 'ok' or (deporte and r['deporte'] != deporte): continue
+        por_etapa = tiempos.setdefault(r['deporte'], {})
+        for etapa, ms in [('total', r['total_ms'])] + list(r['etapas'].items()):
+            por_etapa.setdefault(etapa, []).append(ms)
+    res = {}
+    for dep, por_etapa in tiempos.items():
+        res[dep] = {}
+        for etapa, v in por_etapa.items():
+            v = np.asarray(v)
+            res[dep][etapa] = {'n': len(v), 'p50_ms': round(float(np.percentile(v, 50)), 2),
+                               'p95_ms': round(float(np.percentile(v, 95)), 2),
+                               'histograma': np.bincount(np.searchsorted(CORTES_MS, v), minlength=len(CORTES_MS) + 1).tolist()}
+    return res
+
+def etiquetas_histograma():
+    bordes = [0] + CORTES_MS
+    return [f"{a}-{b}" for a, b in zip(bordes, bordes[1:])] + [f">{CORTES_MS[-1]}"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumen de la telemetría de la app (p50/p95 por etapa)")
+    parser.add_argument("--ruta", default=ARCHIVO_METRICAS)
+    parser.add_argument("--deporte")
+    parser.add_argument("--histograma", action="store_true", help="Muestra también las cubetas (ms)")
+    args = parser.parse_args()
+
+    res = resumen(leer(args.ruta), args.deporte)
+    if not res: print(f"ℹ️ Sin ejecuciones registradas en {args.ruta} (activa TELEMETRIA_APP=1).")
+    for dep, etapas in res.items():
+        print(f"\n--- {dep} ({etapas['total']['n']} ejecuciones) ---")
+        for etapa, m in sorted(etapas.items(), key=lambda x: -x[1]['p95_ms']):
+            print(f"  {etapa:<16} p50 {m['p50_ms']:>9.1f} ms   p95 {m['p95_ms']:>9.1f} ms")
+            if args.histograma:
+                print("    " + "  ".join(f"{e}:{n}" for e, n in zip(etiquetas_histograma(), m['histograma']) if n))